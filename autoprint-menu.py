@@ -1,14 +1,14 @@
 import os
-import sys
 import json
 import time
 import signal
 import subprocess
 import threading
-import requests
-import socket
-from concurrent.futures import ThreadPoolExecutor
-from pathlib import Path
+
+import logpipe
+import metrics
+import configstore
+import control
 
 # ANSI Colors
 RED = "\033[0;31m"
@@ -18,13 +18,14 @@ BLUE = "\033[0;34m"
 CYAN = "\033[0;36m"
 NC = "\033[0m"
 
-HOME = str(Path.home())
-CONFIG_FILE = os.path.join(HOME, ".autoprint_config.json")
+HOME = os.path.expanduser("~")
+CONFIG_FILE = configstore.CONFIG_FILE
 BACKUP_FILE = os.path.join(HOME, ".autoprint_config_backup.json")
 VERSION_FILE = os.path.join(HOME, ".autoprint_version")
-LOG_FILE = os.path.join(HOME, "autoprint.log")
+LOG_FILE = logpipe.LOG_FILE
 REPO_URL = "https://github.com/juniorsir/Client-AP"
 REMOTE_VERSION_URL = f"{REPO_URL}/raw/main/version.txt"
+UPDATE_TIMEOUT = 5      # Seconds; a dead network must not hold up the menu
 
 # Spinner
 def spinner(target_pid):
@@ -48,8 +49,7 @@ def is_process_running(pid):
 def set_config():
     if os.path.exists(CONFIG_FILE):
         print(f"{YELLOW}A saved configuration was found:{NC}")
-        with open(CONFIG_FILE, "r") as f:
-            print(json.dumps(json.load(f), indent=2))
+        print(json.dumps(configstore.load(), indent=2))
         use_saved = input(f"{YELLOW}Do you want to use this saved config? (y/n): {NC}")
         if use_saved.lower() == 'y':
             print(f"{GREEN}Using existing config.{NC}")
@@ -65,30 +65,57 @@ def set_config():
         "always_ask_pos": input(f"{YELLOW}Always ask for image position? (y/n): {NC}").lower() != 'n'
     }
 
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(config, f, indent=2)
+    # Merged: the saved printer and tuning keys survive a re-setup
+    try:
+        configstore.update(config)
+    except configstore.ConfigError as e:
+        print(f"{RED}Not saved: {e}{NC}")
+        return
     print(f"{GREEN}Configuration saved successfully.{NC}")
 
 # Live log viewer
-def view_live_log():
+LEVEL_COLORS = {"INFO": GREEN, "SUCCESS": GREEN, "ERROR": RED, "WARN": YELLOW,
+                "DEBUG": BLUE, "RESET": NC}
+
+def view_live_log(backlog=20):
+    """Last `backlog` matching records, then new ones as they are written (inotify, no polling)."""
+    flt = input(f"{YELLOW}Filter - Enter for all, a level (ERROR, SUCCESS...) or a job id: {NC}").strip()
+    level = flt.upper() if flt.upper() in LEVEL_COLORS else None
+    job = flt if flt and not level else None
     print(f"{CYAN}Press Ctrl+C to stop viewing and return to the menu.{NC}")
+
+    def show(line):
+        record = logpipe.parse(line)
+        if logpipe.matches(record, level, job):
+            print(logpipe.format_record(record, LEVEL_COLORS))
+
+    # Filtered views look further back for their opening lines
+    lines = logpipe.tail_lines(LOG_FILE, backlog if not flt else 50 * backlog)
+    records = [r for r in map(logpipe.parse, lines) if logpipe.matches(r, level, job)]
+    for record in records[-backlog:]:
+        print(logpipe.format_record(record, LEVEL_COLORS))
     try:
-        with open(LOG_FILE, "r") as f:
-            f.seek(0, os.SEEK_END)
-            while True:
-                line = f.readline()
-                if not line:
-                    time.sleep(0.5)
-                    continue
-                line = line.replace("INFO", f"{GREEN}[INFO]{NC}") \
-                           .replace("ERROR", f"{RED}[ERROR]{NC}") \
-                           .replace("OK", f"{GREEN}[OK]{NC}") \
-                           .replace("WARN", f"{YELLOW}[WARN]{NC}") \
-                           .replace("DEBUG", f"{BLUE}[DEBUG]{NC}")
-                print(line, end="")
+        for line in logpipe.follow(LOG_FILE):
+            show(line)
     except KeyboardInterrupt:
         print(f"\n{YELLOW}Returning to menu...{NC}")
 
+# Statistics
+def view_statistics():
+    """Per-stage latency, counters and queue depths from the running daemon's /metrics.json."""
+    port = configstore.get("preview_port", 8080)
+    try:
+        snap = json.loads(fetch_text(f"http://localhost:{port}/metrics.json", timeout=2))
+    except Exception:
+        print(f"{RED}No statistics: AutoPrint is not running (or its preview server is disabled).{NC}")
+        return
+    print(f"\n{BLUE}===== Statistics (uptime {snap['uptime'] / 60:.0f} min) ====={NC}")
+    if not (snap["histograms"] or snap["counters"]):
+        print(f"{YELLOW}Nothing printed yet.{NC}")
+    for line in metrics.format_table(snap):
+        print(line)
+    print(f"{CYAN}Prometheus: http://localhost:{port}/metrics{NC}")
+
 # Position Selector
 def ask_position_pref():
     print(f"\n{CYAN}[Choose image position]{NC}")
@@ -97,18 +124,40 @@ def ask_position_pref():
     pos_map = {'1': 'top-left', '2': 'center', '3': 'bottom-right'}
     pos_code = pos_map.get(choice, 'center')
 
-    with open(CONFIG_FILE, "r") as f:
-        config = json.load(f)
-    config["image_position"] = pos_code
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(config, f, indent=2)
+    configstore.update(image_position=pos_code)
     print(f"{GREEN}Image position set to: {pos_code}{NC}")
 
 # Update Check
-def check_update_notice():
-    try:
-        remote_ver = requests.get(REMOTE_VERSION_URL).text.strip()
-    except:
+_update = {"remote": None, "shown": False}     # Filled in by the start-up check
+
+def fetch_text(url, timeout):
+    """GET with urllib: requests takes longer to import than the rest of the menu."""
+    import urllib.request
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read().decode(errors="replace")
+
+def start_update_check():
+    """Fetches version.txt in the background, so the menu does not wait for the network."""
+    def fetch():
+        try:
+            _update["remote"] = fetch_text(REMOTE_VERSION_URL, UPDATE_TIMEOUT).strip()
+        except Exception:
+            _update["remote"] = ""      # Failed
+    threading.Thread(target=fetch, name="update-check", daemon=True).start()
+
+def show_pending_update():
+    """The start-up check's result, once, as soon as it has arrived."""
+    if _update["remote"] is not None and not _update["shown"]:
+        _update["shown"] = True
+        check_update_notice(_update["remote"])
+
+def check_update_notice(remote_ver=None):
+    if remote_ver is None:
+        try:
+            remote_ver = fetch_text(REMOTE_VERSION_URL, UPDATE_TIMEOUT).strip()
+        except Exception:
+            remote_ver = ""
+    if not remote_ver:
         print(f"{RED}Failed to check for updates.{NC}")
         return
     if not os.path.exists(VERSION_FILE):
@@ -131,9 +180,100 @@ def check_update_notice():
     else:
         print(f"{GREEN}You're using the latest version ({local_ver}).{NC}")
 
+# Daemon Control (via autoprint.py's control socket)
+def start_daemon():
+    if control.is_running():
+        print(f"{YELLOW}AutoPrint is already running.{NC}")
+        return
+    os.system("termux-wake-lock")
+    ask_position_pref()
+    print(f"{CYAN}Starting AutoPrint...{NC}")
+    # autoprint.py writes LOG_FILE itself (rotated JSON lines), never redirect into it
+    proc, ready = control.spawn(["nohup", "python", os.path.join(os.environ['PREFIX'], "bin", "autoprint.py")],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if ready:
+        print(f"{GREEN}AutoPrint started in background (pid {proc.pid}).{NC}")
+        return
+    if proc.poll() is None:
+        print(f"{YELLOW}AutoPrint is still starting up. Use 'Status & Control' to check on it.{NC}")
+        return
+    print(f"{RED}Failed to start (exit code {proc.returncode}). Check the log, or run autoprint.py directly to see the error.{NC}")
+    os.system("termux-wake-unlock")
+
+def stop_daemon(timeout=300):
+    """Graceful: the daemon finishes every spooled job, then exits."""
+    try:
+        status = control.request("stop")
+    except OSError:
+        # Nothing on the control socket: an older version, or not running at all
+        if subprocess.getoutput("pgrep -f autoprint.py"):
+            os.system("pkill -f autoprint.py")
+            print(f"{RED}AutoPrint stopped.{NC}")
+        else:
+            print(f"{YELLOW}AutoPrint is not running.{NC}")
+        os.system("termux-wake-unlock")
+        return
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline:
+            left = status["queue"]["total"] + status["batch_pending"]
+            print(f"{CYAN}Finishing {left} job(s) before stopping... (Ctrl+C to stop now){NC}", end="\r")
+            time.sleep(0.5)
+            status = control.request("status", timeout=2)
+    except (OSError, ValueError, control.ControlError):
+        # Socket gone: the daemon has exited
+        print(" " * 70, end="\r")
+        print(f"{RED}AutoPrint stopped.{NC}")
+        os.system("termux-wake-unlock")
+        return
+    except KeyboardInterrupt:
+        pass
+    print()
+    # Already draining, so only SIGKILL cuts it short; spooled jobs resume on the next start
+    os.kill(status["pid"], signal.SIGKILL)
+    print(f"{RED}AutoPrint stopped. Unfinished jobs stay spooled for the next start.{NC}")
+    os.system("termux-wake-unlock")
+
+def show_status(status):
+    uptime = int(status["uptime"])
+    print(f"\n{BLUE}===== AutoPrint: {status['state'].upper()} ====={NC}")
+    print(f"PID {status['pid']} | up {uptime // 3600}h {uptime % 3600 // 60}m | printer {status['printer_ip'] or '-'}")
+    q = status["queue"]
+    print(f"Queue: {q['total']} job(s) (convert {q['convert']}, send {q['send']}) | "
+          f"batching {status['batch_pending']} | arriving {status['in_flight']} | retry {status['retry_pending']}")
+    for printer in status.get("printers", []):
+        state = f"{GREEN}ok{NC}" if printer["healthy"] else f"{RED}out for {printer['down_for']:.0f}s{NC}"
+        print(f"  {printer['ip']:<15} {state} | {printer['in_flight']} sending, {printer['sent']} sent"
+              f"{' | ' + printer['status'] if printer['status'] else ''}")
+    for job in status["current"]:
+        print(f"  {CYAN}{job['stage']:<8}{NC} {job['job']} ({time.time() - job['started']:.0f}s)")
+    if status["preview"]:
+        print(f"Preview: {status['preview']}")
+
+def control_daemon():
+    try:
+        status = control.request("status")
+    except OSError:
+        print(f"{YELLOW}AutoPrint is not running.{NC}")
+        return
+    show_status(status)
+    toggle = "Resume" if status["state"] == "paused" else "Pause"
+    sub = input(f"{YELLOW}1.{NC} {toggle}  {YELLOW}2.{NC} Reload config  {YELLOW}3.{NC} Back\n{CYAN}Choose: {NC}")
+    try:
+        if sub == '1':
+            show_status(control.request(toggle.lower()))
+        elif sub == '2':
+            reply = control.request("reload")
+            for key, reason in reply["errors"].items():
+                print(f"{RED}Invalid {key}: {reason}{NC}")
+            print(f"{GREEN}Configuration reloaded.{NC}")
+    except (OSError, control.ControlError) as e:
+        print(f"{RED}Control request failed: {e}{NC}")
+
 # Menu
 def show_menu():
     while True:
+        show_pending_update()
         print(f"\n{BLUE}======= AutoPrint Menu ======={NC}")
         print(f"{YELLOW}1.{NC} Start AutoPrint")
         print(f"{YELLOW}2.{NC} Stop AutoPrint")
@@ -143,25 +283,15 @@ def show_menu():
         print(f"{YELLOW}6.{NC} Check for Updates")
         print(f"{YELLOW}7.{NC} View Live Log")
         print(f"{YELLOW}8.{NC} Developer Info")
+        print(f"{YELLOW}9.{NC} Statistics")
+        print(f"{YELLOW}10.{NC} Status & Control")
         print(f"{BLUE}==============================={NC}")
 
         choice = input(f"{CYAN}Choose an option: {NC}")
         if choice == '1':
-            open(LOG_FILE, 'w').close()
-            os.system("termux-wake-lock")
-            ask_position_pref()
-            subprocess.Popen(["nohup", "python", os.path.join(os.environ['PREFIX'], "bin", "autoprint.py")],
-                             stdout=open(LOG_FILE, "a"), stderr=subprocess.STDOUT)
-            time.sleep(2)
-            if subprocess.getoutput("pgrep -f autoprint.py"):
-                print(f"{GREEN}AutoPrint started in background.{NC}")
-            else:
-                print(f"{RED}Failed to start. Check log file.{NC}")
-                os.system("termux-wake-unlock")
+            start_daemon()
         elif choice == '2':
-            os.system("pkill -f autoprint.py")
-            os.system("termux-wake-unlock")
-            print(f"{RED}AutoPrint stopped.{NC}")
+            stop_daemon()
         elif choice == '3':
             set_config()
         elif choice == '4':
@@ -182,13 +312,17 @@ def show_menu():
                 os.system("termux-open-url https://github.com/juniorsir")
             elif sub == '2':
                 os.system("termux-open-url https://t.me/Junior_sir")
+        elif choice == '9':
+            view_statistics()
+        elif choice == '10':
+            control_daemon()
         else:
             print(f"{RED}Invalid option.{NC}")
 
 # Run
 if __name__ == "__main__":
     os.system("clear")
-    check_update_notice()
+    start_update_check()
     set_config()
     show_menu()
     
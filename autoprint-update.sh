@@ -12,7 +12,7 @@
 REPO_OWNER="juniorsir"
 REPO_NAME="Client-AP"
 BRANCH="main"
-FILES_TO_INSTALL=("autoprint-menu.py" "autoprint.py" "scanprinter.py")
+FILES_TO_INSTALL=("autoprint-menu.py" "autoprint.py" "scanprinter.py" "discovery.py" "scan_engine.py" "snmp.py" "devicecache.py" "spool.py" "transport.py" "retry.py" "rendercache.py" "ipp.py" "completion.py" "preview.py" "logpipe.py" "metrics.py" "configstore.py" "control.py" "printerpool.py")
 
 # --- Paths ---
 VERSION_URL="https://raw.githubusercontent.com/$REPO_OWNER/$REPO_NAME/$BRANCH/version.txt"
@@ -134,7 +134,7 @@ perform_update() {
     # Download files in parallel
     pids=()
     for file in "${FILES_TO_INSTALL[@]}"; do
-        (curl -sL -o "$file" "$BASE_RAW_URL/$file") & pids+=($!)
+        (curl -fsL -o "$file" "$BASE_RAW_URL/$file") & pids+=($!)
     done
 
     # Wait for each download and check for failures
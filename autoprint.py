@@ -1,30 +1,43 @@
 import os
 import time
-import json
 import subprocess
 import threading
-import itertools
 import sys
-import re
-import socket
+import signal
 from datetime import datetime
-from PIL import Image
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from watchdog.observers import Observer
+from io import BytesIO
 from watchdog.events import FileSystemEventHandler
-import http.server
-import socketserver
+from spool import Spool, Coalescer, MAX_DEPTH
+import transport
+import ipp
+from devicecache import DeviceCache
+from printerpool import PrinterPool
+from retry import RetryScheduler, MAX_ATTEMPTS, EXPIRE_AFTER
+import rendercache
+from completion import CompletionTracker, real_name
+import logpipe
+import metrics
+import configstore
+import control
 
 # Constants
 FAILED_DIR = os.path.expanduser("~/autoprint_failed")
-CONFIG_FILE = os.path.expanduser("~/.autoprint_config.json")
+CONFIG_FILE = configstore.CONFIG_FILE
+OUTPUT_DIR = "/data/data/com.termux/files/home"
 A4_WIDTH_PX = 2480
 A4_HEIGHT_PX = 3508
+PRINT_DPI = 300         # Pixels beyond this never reach the paper
+JPEG_QUALITY = 85
+BATCH_WINDOW = 2        # Seconds of quiet that close a burst of photos
+BATCH_MAX = 30          # Images per coalesced job
+PAGE_MARGIN = 50        # Points
+PENDING_WAIT = 20       # Seconds a ".pending-" file gets to become the real photo
+DRAIN_TIMEOUT = 300     # Seconds a graceful stop waits for the spool to empty
 os.makedirs(FAILED_DIR, exist_ok=True)
 
 # Logging
-def log_message(message, level="INFO"):
+def log_message(message, level="INFO", **fields):
+    """Console line now, JSON record via the background log writer (never blocks on disk)."""
     colors = {
         "INFO": "\033[94m", "SUCCESS": "\033[92m",
         "ERROR": "\033[91m", "RESET": "\033[0m"
@@ -32,8 +45,15 @@ def log_message(message, level="INFO"):
     color = colors.get(level, "")
     reset = colors["RESET"]
     print(f"{color}[{level}]{reset} {message}")
-    with open("autoprint.log", "a") as log_file:
-        log_file.write(f"[{level}] {message}\n")
+    logpipe.log(message, level, **fields)
+
+def log_exception(exc_type, exc, tb):
+    """Crashes end up in the log too, not only on a console nobody watches."""
+    import traceback
+    log_message("Unhandled error: " + "".join(traceback.format_exception(exc_type, exc, tb)).strip(), "ERROR")
+
+sys.excepthook = log_exception
+threading.excepthook = lambda args: log_exception(args.exc_type, args.exc_value, args.exc_traceback)
 
 # Notification (Termux)
 def notify_process(title, message):
@@ -47,145 +67,566 @@ def notify_process(title, message):
 
 # Config
 def load_config():
-    return json.load(open(CONFIG_FILE)) if os.path.exists(CONFIG_FILE) else {}
+    """In-memory copy, refreshed when the file changes (see configstore)."""
+    return configstore.load()
 
 def save_config(config):
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(config, f, indent=4)
+    configstore.update(config)
+
+def ask_value(key, prompt):
+    """input() until the answer fits the config schema (see configstore)."""
+    while True:
+        clean, errors = configstore.validate({key: input(prompt).strip()})
+        if not errors:
+            return clean[key]
+        print(f"Invalid {key} {errors[key]}, try again.")
 
 def ask_config():
     config = load_config()
     print("\n[Configuring for first time use...]")
     config.update({
-        "pc_ip": config.get("pc_ip") or input("Enter PC IP: ").strip(),
-        "pc_user": config.get("pc_user") or input("Enter PC username: ").strip(),
-        "remote_folder": config.get("remote_folder") or input("Enter remote folder: ").strip(),
-        "image_width": config.get("image_width") or input("Image width (mm): ").strip(),
+        "pc_ip": config.get("pc_ip") or ask_value("pc_ip", "Enter PC IP: "),
+        "pc_user": config.get("pc_user") or ask_value("pc_user", "Enter PC username: "),
+        "remote_folder": config.get("remote_folder") or ask_value("remote_folder", "Enter remote folder: "),
+        "image_width": config.get("image_width") or ask_value("image_width", "Image width (mm): "),
         "always_ask_pos": config.get("always_ask_pos", True)
     })
-    save_config(config)
-    return config
+    while True:
+        try:
+            save_config(config)
+            return config
+        except configstore.ConfigError as e:
+            print(f"Invalid configuration: {e}")
+            for key in list(configstore.validate(config)[1]):
+                config[key] = ask_value(key, f"{key}: ")
 
 def ask_position():
     print("\nChoose image position:\n1. Top-Left\n2. Center\n3. Bottom-Right")
     choice = input("Enter choice (1/2/3): ").strip()
     return {"1": "+50+50", "2": "-gravity center", "3": "-gravity southeast"}.get(choice, "-gravity center")
 
+# Render Stage
+def render_image(image_path, width_mm, dpi=PRINT_DPI, quality=JPEG_QUALITY):
+    """
+    Decodes only as many pixels as `width_mm` at `dpi` needs, applies the
+    EXIF orientation and re-encodes as JPEG.
+    Returns (jpeg_bytes, (width, height), (source_width, source_height)).
+    """
+    from PIL import Image, ImageOps     # Deferred: only the render stage needs Pillow
+    target_w = max(1, round(int(width_mm) / 25.4 * int(dpi)))
+    img = Image.open(image_path)
+    source_size = img.size
+    # Orientations 5-8 are stored rotated by 90 degrees
+    rotated = img.getexif().get(0x0112, 1) in (5, 6, 7, 8)
+    shown_w = source_size[1] if rotated else source_size[0]
+    if shown_w > target_w:
+        scale = target_w / shown_w
+        wanted = (max(1, int(source_size[0] * scale) + 1), max(1, int(source_size[1] * scale) + 1))
+        # JPEG: the decoder itself downscales by 1/2, 1/4 or 1/8 (DCT scaling)
+        img.draft("RGB", wanted)
+    img = ImageOps.exif_transpose(img)
+    if img.width > target_w:
+        # Cheap integer box reduce first, then one high-quality resample
+        factor = img.width // target_w
+        if factor >= 2:
+            img = img.reduce(factor)
+        if img.width > target_w:
+            img = img.resize((target_w, max(1, round(img.height * target_w / img.width))), Image.LANCZOS)
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, "white")
+        background.paste(img, mask=img.split()[-1])
+        img = background
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+    out = BytesIO()
+    img.save(out, "JPEG", quality=int(quality), optimize=True)
+    return out.getvalue(), img.size, (source_size[1], source_size[0]) if rotated else source_size
+
 # PDF Conversion
-def convert_to_pdf(image_path, output_pdf, width_mm, position_args, default_aspect=False):
-    threading.Thread(target=start_server, args=(output_pdf,)).start()
+def grid_for(nup):
+    """N-up tile grid (cols, rows) for portrait A4: 2 -> 1x2, 4 -> 2x2, 6 -> 2x3."""
+    nup = max(1, int(nup))
+    cols = max(1, int(nup ** 0.5))
+    return cols, -(-nup // cols)
+
+def place(box, width_pt, height_pt, position_args, margin):
+    """Position inside `box` (x, y, w, h), same rules as the full page."""
+    bx, by, bw, bh = box
+    return {
+        "-gravity center": (bx + (bw - width_pt) / 2, by + (bh - height_pt) / 2),
+        "-gravity southeast": (bx + bw - width_pt - margin, by + margin)
+    }.get(position_args, (bx + margin, by + bh - height_pt - margin))
+
+def convert_to_pdf(image_paths, output_pdf, width_mm, position_args, default_aspect=False,
+                   dpi=PRINT_DPI, quality=JPEG_QUALITY, layout="pages", nup=4):
+    """
+    One PDF for one or more images: a page per image (layout="pages") or
+    `nup` tiles per A4 page (layout="nup"). Width and position apply per
+    image, inside its tile for N-up.
+    """
+    # Deferred: reportlab is the slowest import and only the convert stage needs it
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.utils import ImageReader
+    if isinstance(image_paths, str):
+        image_paths = [image_paths]
     try:
-        width_mm = int(width_mm)
-        width_pt = width_mm * 2.83465
+        started = time.monotonic()
         a4_w, a4_h = A4
-        img = Image.open(image_path)
-        aspect = 3 / 4 if default_aspect else img.height / img.width
-        height_pt = width_pt * aspect
-
-        x, y = {
-            "-gravity center": ((a4_w - width_pt) / 2, (a4_h - height_pt) / 2),
-            "-gravity southeast": (a4_w - width_pt - 50, 50)
-        }.get(position_args, (50, a4_h - height_pt - 50))
+        if layout == "nup" and len(image_paths) > 1:
+            cols, rows = grid_for(nup)
+            margin = PAGE_MARGIN / max(cols, rows)
+            # Tiles share the page below the date line
+            cell_w, cell_h = a4_w / cols, (a4_h - 40) / rows
+            boxes = [(col * cell_w, a4_h - 40 - (row + 1) * cell_h, cell_w, cell_h)
+                     for row in range(rows) for col in range(cols)]
+        else:
+            margin = PAGE_MARGIN
+            boxes = [(0, 0, a4_w, a4_h)]
 
         c = canvas.Canvas(output_pdf, pagesize=A4)
-        c.drawImage(image_path, x, y, width=width_pt, height=height_pt)
-        c.setFont("Helvetica", 12)
-        c.drawString(50, a4_h - 30, datetime.now().strftime("%A, %d %B %Y"))
+        # Source names in the document info: which photos a printed job carried
+        c.setTitle(", ".join(os.path.basename(p) for p in image_paths))
+        source_bytes = 0
+        for i, image_path in enumerate(image_paths):
+            slot = i % len(boxes)
+            if slot == 0:
+                if i:
+                    c.showPage()
+                c.setFont("Helvetica", 12)
+                c.drawString(50, a4_h - 30, datetime.now().strftime("%A, %d %B %Y"))
+            box = boxes[slot]
+            width_pt = min(int(width_mm) * 2.83465, box[2] - 2 * margin)
+            # Render for the width actually printed, not the configured one
+            with metrics.timer("autoprint_render_seconds"):
+                jpeg, size, source_size = render_image(image_path, width_pt / 2.83465, dpi, quality)
+            aspect = 3 / 4 if default_aspect else size[1] / size[0]
+            height_pt = width_pt * aspect
+            if height_pt > box[3] - 2 * margin:
+                height_pt = box[3] - 2 * margin
+                width_pt = height_pt / aspect
+            x, y = place(box, width_pt, height_pt, position_args, margin)
+            # JPEG data is embedded as-is (DCTDecode), no second re-encode
+            c.drawImage(ImageReader(BytesIO(jpeg)), x, y, width=width_pt, height=height_pt)
+            source_bytes += os.path.getsize(image_path)
+            log_message(f"Render: {source_size[0]}x{source_size[1]} -> {size[0]}x{size[1]} px ({dpi} dpi)", "INFO")
         c.save()
+        metrics.observe("autoprint_convert_seconds", time.monotonic() - started, layout=layout)
+        metrics.inc("autoprint_images_converted_total", len(image_paths))
         log_message(f"Image converted to PDF: {output_pdf}", "SUCCESS")
+        log_message(f"{len(image_paths)} image(s), source {source_bytes / 1e6:.1f} MB -> "
+                    f"PDF {os.path.getsize(output_pdf) / 1e6:.2f} MB | {time.monotonic() - started:.2f}s", "INFO")
+        return True
     except Exception as e:
+        metrics.inc("autoprint_convert_failures_total")
         log_message(f"Conversion failed: {e}", "ERROR")
+        return False
 
 # Print & Fallback
 def get_saved_printer_ip():
-    try:
-        return json.load(open(CONFIG_FILE)).get("printer_ip")
-    except Exception:
-        return None
+    return configstore.get("printer_ip")
+
+def pool_members():
+    """The "printers" list, or just the saved printer_ip when there is no pool."""
+    saved = get_saved_printer_ip()
+    return configstore.get("printers") or ([saved] if saved else [])
+
+printer_pool = PrinterPool(pool_members, lambda: configstore.get("printer_affinity", {}), log=log_message)
+
+_protocols = {}     # printer ip -> "ipp" / "raw", decided once per run
+_resources = {}     # printer ip -> IPP resource path ("rp") from the device cache
 
-def send_to_printer(pdf_path):
-    printer_ip = get_saved_printer_ip()
-    if not printer_ip:
+def printer_protocol(ip):
+    """IPP when configured, or ("auto") when port 631 answers; raw 9100 otherwise."""
+    choice = configstore.get("printer_protocol", "auto")
+    if choice in ("ipp", "raw"):
+        return choice
+    if ip not in _protocols:
+        _protocols[ip] = "ipp" if ipp.is_open(ip) else "raw"
+    return _protocols[ip]
+
+def send_ipp(printer_ip, pdf_path):
+    """Print-Job + completion tracking. Raises on a failed job."""
+    if printer_ip not in _resources:
+        _resources[printer_ip] = DeviceCache().by_ip().get(printer_ip, {}).get("rp")
+    resource = _resources[printer_ip]
+    result = ipp.print_file(printer_ip, pdf_path, resource=resource,
+                            wait_timeout=configstore.get("ipp_wait", 120))
+    metrics.observe("autoprint_transfer_seconds", result["upload"], protocol="ipp")
+    if result["state"] is not None:
+        # Upload done to final job state: time spent in the printer itself
+        metrics.observe("autoprint_printer_seconds", result["completion"] - result["upload"], protocol="ipp")
+    metrics.inc("autoprint_bytes_sent_total", result["bytes"], protocol="ipp")
+    summary = (f"job {result['job_id']} {result['state_name']} | upload {result['upload']:.1f}s, "
+               f"completion {result['completion']:.1f}s")
+    if result["state"] in (7, 8):
+        raise ipp.JobFailed(f"{summary} ({', '.join(result['reasons'])})")
+    log_message(f"Sent to printer: {printer_ip} via IPP | {summary}", "SUCCESS")
+
+def send_raw(printer_ip, pdf_path):
+    stats = transport.send_file(printer_ip, pdf_path)
+    metrics.observe("autoprint_transfer_seconds", stats["seconds"], protocol="raw")
+    metrics.observe("autoprint_printer_ttfb_seconds", stats["ttfb"], protocol="raw")
+    metrics.inc("autoprint_bytes_sent_total", stats["bytes"], protocol="raw")
+    log_message(f"Sent to printer: {printer_ip} | {transport.format_stats(stats)}", "SUCCESS")
+
+def send_one(printer_ip, pdf_path):
+    """IPP (job tracking) or the raw 9100 channel. Raises on failure."""
+    if printer_protocol(printer_ip) == "ipp":
+        try:
+            send_ipp(printer_ip, pdf_path)
+            return
+        except ipp.JobFailed:
+            raise
+        except ipp.IppError as e:
+            # Only a refused connection or a Print-Job error status prove nothing
+            # was accepted; anything else may have printed and goes to the retry queue
+            if not isinstance(e, ipp.Unreachable) and e.status is None:
+                raise
+            log_message(f"IPP unavailable ({e}), using port 9100", "INFO")
+            _protocols[printer_ip] = "raw"
+    send_raw(printer_ip, pdf_path)
+
+def send_to_printer(pdf_path, source_dir=None):
+    """
+    Sends the PDF to the least-busy healthy printer of the pool (printers
+    preferred for `source_dir` first), failing over to the next one.
+    Returns True on success.
+    """
+    if not pool_members():
         log_message("No printer IP configured.", "ERROR")
-        return
+        return False
     if not os.path.exists(pdf_path):
         log_message(f"File not found: {pdf_path}", "ERROR")
-        return
+        return False
+    tried = []
+    while True:
+        printer_ip = printer_pool.choose(source_dir, exclude=tried)
+        if printer_ip is None:
+            break
+        tried.append(printer_ip)
+        printer_pool.acquire(printer_ip)
+        ok = False
+        try:
+            send_one(printer_ip, pdf_path)
+            ok = True
+            return True
+        except Exception as e:
+            metrics.inc("autoprint_send_failures_total")
+            log_message(f"Print failed on {printer_ip}: {e}", "ERROR")
+        finally:
+            printer_pool.release(printer_ip, ok)
+            metrics.inc("autoprint_printer_jobs_total", printer=printer_ip, result="printed" if ok else "failed")
+    if not tried:
+        log_message("No healthy printer in the pool, holding the job for retry", "ERROR")
     try:
-        with open(pdf_path, "rb") as f:
-            data = f.read()
-        with socket.create_connection((printer_ip, 9100), timeout=5) as sock:
-            sock.sendall(data)
-        log_message(f"Sent to printer: {printer_ip}", "SUCCESS")
-    except Exception as e:
-        log_message(f"Print failed: {e}", "ERROR")
+        fallback_path = os.path.join(FAILED_DIR, os.path.basename(pdf_path))
+        os.rename(pdf_path, fallback_path)
+        log_message(f"Saved to: {fallback_path}", "INFO")
+    except Exception as move_error:
+        log_message(f"Fallback save failed: {move_error}", "ERROR")
+    return False
+
+# Spool Stages (run on the spool's worker threads, never on the observer)
+def resolve_pending(file_path):
+    """
+    Jobs spooled by older versions may still name the ".pending-" file;
+    new jobs only ever hold complete files (see CompletionTracker).
+    """
+    final = real_name(os.path.basename(file_path))
+    if final is None:
+        return file_path
+    final_path = os.path.join(os.path.dirname(file_path), final)
+    for _ in range(PENDING_WAIT):
+        if os.path.exists(final_path):
+            return final_path
+        time.sleep(1)
+    return None
+
+# Set up by make_spool() / start_preview() from the config
+render_cache = None
+recent_images = None
+preview_server = None
+
+def add_preview(output_pdf, file_paths):
+    if preview_server is not None:
+        preview_server.add_job(output_pdf, file_paths)
+        log_message(f"Preview at: {preview_server.url(output_pdf)}", "INFO")
+
+def convert_job(job):
+    started = time.monotonic()
+    with logpipe.context(job=job["id"], stage="convert"):
+        pdf = _convert_job(job)
+        metrics.observe("autoprint_stage_seconds", time.monotonic() - started, stage="convert")
+        log_message(f"Convert stage {'done' if pdf else 'dropped the job'}", "INFO",
+                    duration_ms=round((time.monotonic() - started) * 1000))
+    return pdf
+
+def _convert_job(job):
+    file_paths = []
+    hashes = []
+    for src in job["srcs"]:
+        file_path = resolve_pending(src)
+        if not file_path:
+            log_message(f"Pending file never completed: {src}", "ERROR")
+            continue
         try:
-            fallback_path = os.path.join(FAILED_DIR, os.path.basename(pdf_path))
-            os.rename(pdf_path, fallback_path)
-            log_message(f"Saved to: {fallback_path}", "INFO")
-        except Exception as move_error:
-            log_message(f"Fallback save failed: {move_error}", "ERROR")
+            digest = rendercache.hash_file(file_path)
+        except OSError as e:
+            log_message(f"Cannot read {file_path}: {e}", "ERROR")
+            continue
+        # Same photo via both folders, or a repeated create event
+        if recent_images is not None and recent_images.seen(digest):
+            metrics.inc("autoprint_duplicates_total")
+            log_message(f"Duplicate suppressed: {file_path}", "INFO")
+            continue
+        file_paths.append(file_path)
+        hashes.append(digest)
+    if not file_paths:
+        return None
+    # Job id in the name: parallel converts within one second must not collide
+    pdf_name = f"photo_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{job['id'][-4:]}.pdf"
+    output_pdf = os.path.join(OUTPUT_DIR, pdf_name)
+    params = job["params"]
+    # The page header carries the date, so it is part of the key
+    key = rendercache.cache_key(hashes, dict(params, date=datetime.now().strftime("%Y-%m-%d")))
+    hit = render_cache is not None and render_cache.get(key, output_pdf)
+    metrics.inc("autoprint_render_cache_total", result="hit" if hit else "miss")
+    if hit:
+        log_message(f"Render cache hit, conversion skipped: {output_pdf}", "SUCCESS")
+        add_preview(output_pdf, file_paths)
+        return output_pdf
+    if convert_to_pdf(file_paths, output_pdf, params["width"], params["position"],
+                      dpi=params.get("dpi", PRINT_DPI), quality=params.get("quality", JPEG_QUALITY),
+                      layout=params.get("layout", "pages"), nup=params.get("nup", 4)):
+        if render_cache is not None:
+            render_cache.put(key, output_pdf)
+        add_preview(output_pdf, file_paths)
+        return output_pdf
+    return None
+
+def send_job(pdf_path, job):
+    started = time.monotonic()
+    with logpipe.context(job=job["id"], stage="send"):
+        # The watched folder picks the printer when printer_affinity says so
+        ok = send_to_printer(pdf_path, os.path.dirname(job["srcs"][0]))
+        metrics.observe("autoprint_stage_seconds", time.monotonic() - started, stage="send")
+        metrics.inc("autoprint_jobs_total", result="printed" if ok else "failed")
+        if preview_server is not None:
+            preview_server.set_status(pdf_path, "printed" if ok else "failed")
+        log_message(f"Send stage {'done' if ok else 'failed'}", "INFO",
+                    duration_ms=round((time.monotonic() - started) * 1000))
+        if ok:
+            metrics.observe("autoprint_end_to_end_seconds", time.time() - job["created"])
+            log_message(f"End-to-end: {time.time() - job['created']:.1f}s from detection to printer", "INFO",
+                        duration_ms=round((time.time() - job["created"]) * 1000))
+
+def make_spool(config):
+    global render_cache, recent_images
+    render_cache = rendercache.RenderCache(max_bytes=config.get("render_cache_mb", 200) * 1000 * 1000)
+    recent_images = rendercache.Deduper(config.get("dedup_window", rendercache.DEDUP_WINDOW))
+    return Spool(convert_job, send_job,
+                 convert_workers=config.get("convert_workers", 1),
+                 # One sender per pool printer, so they all print at the same time
+                 send_workers=config.get("send_workers", max(1, len(pool_members()))),
+                 max_depth=config.get("spool_max_depth", MAX_DEPTH),
+                 log=log_message)
+
+def make_retry_scheduler(config):
+    return RetryScheduler(FAILED_DIR, send_to_printer, printer_pool.choose, OUTPUT_DIR,
+                          log=log_message,
+                          max_attempts=config.get("retry_max_attempts", MAX_ATTEMPTS),
+                          expire_after=config.get("retry_expire_hours", EXPIRE_AFTER / 3600) * 3600)
 
 # File Watcher
 class PhotoHandler(FileSystemEventHandler):
-    def __init__(self, config): self.config = config
+    def __init__(self, config, spool, close_events=False):
+        self.config = config
+        self.spool = spool
+        # Photos arriving together (Bluetooth share, burst) become one job
+        self.batch = Coalescer(self.submit, config.get("batch_window", BATCH_WINDOW),
+                               config.get("batch_max", BATCH_MAX))
+
+        # Dispatches each photo the moment it is completely written
+        self.tracker = CompletionTracker(self.ready, log=log_message, close_events=close_events)
 
+    # Event callbacks only record state; they never wait on the file
     def on_created(self, event):
         if event.is_directory: return
-        file_path = event.src_path
-
-        if ".pending-" in os.path.basename(file_path):
-            real_name = os.path.basename(file_path).split('-')[-1]
-            final_path = os.path.join(os.path.dirname(file_path), real_name)
-            for _ in range(20):
-                if os.path.exists(final_path):
-                    file_path = final_path
-                    break
-                time.sleep(1)
-            else:
-                return
-
-        if not file_path.lower().endswith((".jpg", ".jpeg", ".png")):
-            return
+        metrics.inc("autoprint_watch_events_total", event="created")
+        self.tracker.created(event.src_path)
+
+    def on_modified(self, event):
+        if event.is_directory: return
+        metrics.inc("autoprint_watch_events_total", event="modified")
+        self.tracker.modified(event.src_path)
+
+    def on_closed(self, event):
+        if event.is_directory: return
+        metrics.inc("autoprint_watch_events_total", event="closed")
+        self.tracker.closed(event.src_path)
+
+    def on_moved(self, event):
+        if event.is_directory: return
+        metrics.inc("autoprint_watch_events_total", event="moved")
+        self.tracker.moved(event.src_path, event.dest_path)
 
+    def ready(self, file_path):
         log_message(f"New image detected: {file_path}", "INFO")
-        pdf_name = f"photo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        output_pdf = os.path.join("/data/data/com.termux/files/home", pdf_name)
+        self.batch.add(file_path)
+
+    def submit(self, file_paths):
         pos_map = {"top-left": "+50+50", "center": "-gravity center", "bottom-right": "-gravity southeast"}
         position = pos_map.get(self.config.get("image_position", "center"), "-gravity center")
-
-        convert_to_pdf(file_path, output_pdf, self.config["image_width"], position)
-        send_to_printer(output_pdf)
+        # Blocks while the spool is full (backpressure)
+        self.spool.put(file_paths, {"width": self.config["image_width"], "position": position,
+                                    "dpi": self.config.get("print_dpi", PRINT_DPI),
+                                    "quality": self.config.get("jpeg_quality", JPEG_QUALITY),
+                                    "layout": self.config.get("batch_layout", "pages"),
+                                    "nup": self.config.get("batch_nup", 4)})
 
 # Watcher Start
-def start_watcher(paths, config):
+def start_watcher(paths, config, stop=None):
+    """
+    Runs until Ctrl+C, SIGTERM, the control socket's "stop", or until
+    `stop` (a threading.Event) is set. SIGTERM and "stop" drain the spool
+    first; Ctrl+C leaves unfinished jobs spooled for the next start.
+    """
+    from watchdog.observers import Observer     # Picks the inotify backend, not needed to import us
+    stop = stop or threading.Event()
+    drain = threading.Event()
+    if control.is_running():
+        log_message("AutoPrint is already running, not starting a second watcher.", "ERROR")
+        return
+    started = time.time()
+    start_preview(config)
+    spool = make_spool(config).start()
+    retry = make_retry_scheduler(config).start()
     observer = Observer()
-    handler = PhotoHandler(config)
+    # inotify reports IN_CLOSE_WRITE; the polling observers do not
+    handler = PhotoHandler(config, spool, close_events="inotify" in Observer.__module__)
     for path in paths:
         if os.path.exists(path):
             observer.schedule(handler, path, recursive=False)
             log_message(f"Watching: {path}", "INFO")
         else:
             log_message(f"Path not found: {path}", "ERROR")
+    register_gauges(spool, retry, handler)
+    # Menu edits (position, printer) apply to the next job, no restart
+    store = configstore.get_store()
+    store.on_change(lambda new: config_changed(handler, new))
+    store.watch()
     observer.start()
+    server = None
+    try:
+        server = control.ControlServer(control_commands(spool, retry, handler, stop, drain, started)).start()
+    except OSError as e:
+        log_message(f"Control socket disabled: {e}", "ERROR")
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda *_: (drain.set(), stop.set()))
+    log_message("AutoPrint ready", "SUCCESS")
+    control.notify_ready()
     try:
-        while True:
-            time.sleep(1)
+        while not stop.wait(1):
+            pass
     except KeyboardInterrupt:
-        observer.stop()
+        pass
+    observer.stop()
     observer.join()
+    handler.tracker.stop()
+    handler.batch.flush()
+    if drain.is_set():
+        spool.unpause()
+        log_message(f"Draining before stop | {spool.describe_depth()}", "INFO")
+        if not spool.wait_idle(DRAIN_TIMEOUT):
+            log_message(f"Drain timed out, left in the spool | {spool.describe_depth()}", "ERROR")
+    stats = handler.tracker.latency_stats()
+    if stats["count"]:
+        log_message(f"Detect-to-dispatch: {stats['count']} photo(s), avg {stats['avg']:.0f} ms, "
+                    f"max {stats['max']:.0f} ms", "INFO")
+    # Unfinished jobs stay in the spool and resume on the next start
+    store.stop()
+    retry.stop()
+    spool.stop()
+    transport.close_all()
+    if preview_server is not None:
+        preview_server.stop()
+    if server is not None:
+        server.stop()
+    log_message("AutoPrint stopped", "INFO")
+
+def config_changed(handler, new):
+    # Replaced, not merged: keys removed from the file (or rejected) must not linger
+    width = handler.config.get("image_width")
+    handler.config.clear()
+    handler.config.update(new)
+    if "image_width" not in new and width:
+        # Every job needs one: keep the running value rather than fail them all
+        handler.config["image_width"] = width
+        log_message("No valid image_width in the config, keeping the current one", "ERROR")
+    _protocols.clear()
+    _resources.clear()
+    log_message("Configuration reloaded", "INFO")
+    for key, reason in configstore.get_store().errors.items():
+        log_message(f"Ignoring invalid config value {key}: {reason}", "ERROR")
+
+# Control Socket
+def control_commands(spool, retry, handler, stop, drain, started):
+    """Commands served on control.SOCKET_PATH (see control.py)."""
+    def status():
+        state = "draining" if stop.is_set() else "paused" if spool.paused else "running"
+        return {"state": state, "pid": os.getpid(), "uptime": time.time() - started,
+                "queue": spool.depth(), "current": spool.current(),
+                "batch_pending": len(handler.batch.items), "in_flight": handler.tracker.in_flight(),
+                "retry_pending": retry.count(), "printer_ip": get_saved_printer_ip(),
+                "printers": printer_pool.snapshot(),
+                "preview": preview_server.url() if preview_server is not None else None}
+
+    def pause():
+        spool.pause()
+        log_message(f"Paused by control request | {spool.describe_depth()}", "INFO")
+        return status()
+
+    def resume():
+        spool.unpause()
+        log_message("Resumed by control request", "INFO")
+        return status()
+
+    def reload():
+        store = configstore.get_store()
+        return {"reloaded": store.reload(), "errors": store.errors}
+
+    def stop_daemon(drain_first=True):
+        if drain_first:
+            drain.set()
+        stop.set()
+        return status()
+
+    return {"status": status, "pause": pause, "resume": resume, "reload": reload, "stop": stop_daemon}
+
+# Metrics
+def register_gauges(spool, retry, handler):
+    """Queue depths, read whenever /metrics is scraped."""
+    for stage in ("convert", "send"):
+        metrics.gauge("autoprint_spool_depth", lambda stage=stage: spool.depth()[stage], stage=stage)
+    metrics.gauge("autoprint_batch_pending", lambda: len(handler.batch.items))
+    metrics.gauge("autoprint_files_in_flight", handler.tracker.in_flight)
+    metrics.gauge("autoprint_retry_pending", retry.count)
+    for ip in pool_members():
+        metrics.gauge("autoprint_printer_in_flight", lambda ip=ip: printer_pool.in_flight(ip), printer=ip)
 
 # Preview Server
-def start_server(file_path, port=8080):
-    os.chdir(os.path.dirname(file_path))
-    handler = http.server.SimpleHTTPRequestHandler
+def start_preview(config):
+    """One server for the whole run; a busy port only disables previews."""
+    global preview_server
+    from preview import PreviewServer, PREVIEW_PORT     # http.server: only the daemon serves previews
     try:
-        log_message(f"Preview at: http://localhost:{port}/{os.path.basename(file_path)}", "INFO")
-        print("Press Ctrl+C to stop server.")
-        with socketserver.TCPServer(("", port), handler) as httpd:
-            httpd.serve_forever()
-    except KeyboardInterrupt:
-        log_message("Server stopped", "INFO")
+        preview_server = PreviewServer(OUTPUT_DIR, port=config.get("preview_port", PREVIEW_PORT)).start()
+        log_message(f"Preview server: {preview_server.url()}", "INFO")
+    except OSError as e:
+        preview_server = None
+        log_message(f"Preview server disabled: {e}", "ERROR")
 
 # Main
 if __name__ == "__main__":
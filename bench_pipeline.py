@@ -0,0 +1,246 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+
+from PIL import Image, ImageDraw
+
+import metrics
+from fakefleet import Fleet
+
+# ==========================================
+# PRINT PIPELINE LOAD GENERATOR
+# ==========================================
+# Drops synthetic photos into a scratch watched directory at a fixed
+# rate, the way the camera (".pending-" file renamed when done) or a
+# Bluetooth transfer (file written, then closed) would. It runs
+# autoprint.start_watcher in-process against a fake 9100 printer.
+# Reported:
+#   - drop -> printer latency per photo, matched through the PDF title
+#   - per-stage percentiles (detect, convert, send) from metrics
+#   - sustained photos/minute, peak RSS, and photos never printed or
+#     printed twice
+# HOME points at the scratch directory for the whole run, so the real
+# spool, config, caches and log are never touched.
+
+SINK_NET = "127.77.1.0/24"
+DRAIN_TIMEOUT = 120     # Seconds after the last drop before missing photos count as dropped
+
+
+def parse_size(text):
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+
+def make_photos(staging, count, size, formats, seed=1):
+    """`count` distinct images (unique content, so deduplication never kicks in)."""
+    rng = random.Random(seed)
+    base = Image.linear_gradient("L").resize(size).convert("RGB")
+    names = []
+    for i in range(count):
+        ext = formats[i % len(formats)]
+        img = base.copy()
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):
+            x, y = rng.randrange(size[0] - 64), rng.randrange(size[1] - 64)
+            draw.rectangle((x, y, x + 64, y + 64), fill=tuple(rng.randrange(256) for _ in range(3)))
+        draw.text((20, 20), f"load test photo {i}", fill=(255, 255, 255))
+        name = f"LOAD_{i:04d}.{ext}"
+        img.save(os.path.join(staging, name), "JPEG" if ext == "jpg" else "PNG", quality=90)
+        names.append(name)
+    return names
+
+
+def drop(staging, watch, name, pattern):
+    """Writes one photo into the watched folder; returns when it is complete."""
+    src = os.path.join(staging, name)
+    if pattern == "pending":
+        # Android camera: write under a hidden name, rename when done
+        tmp = os.path.join(watch, f".pending-{int(time.time())}-{name}")
+        shutil.copyfile(src, tmp)
+        os.rename(tmp, os.path.join(watch, name))
+    else:
+        shutil.copyfile(src, os.path.join(watch, name))
+
+
+class RssSampler:
+    """Peak resident set size of this process, sampled from /proc every `interval` seconds."""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak = 0
+        self.stop_event = threading.Event()
+        self.page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def current(self):
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self.page
+        except (OSError, ValueError, IndexError):
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.peak = max(self.peak, self.current())
+
+    def start(self):
+        self.peak = self.current()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        return max(self.peak, self.current())
+
+
+def percentiles(values):
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"count": len(ordered), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": ordered[-1]}
+
+
+def run(args, scratch, out):
+    staging, watch, output = (os.path.join(scratch, d) for d in ("staging", "watch", "output"))
+    for d in (staging, watch, output):
+        os.makedirs(d)
+    size = parse_size(args.size)
+    formats = [f.strip().lower().replace("jpeg", "jpg") for f in args.formats.split(",")]
+    print(f"Generating {args.photos} photo(s) of {size[0]}x{size[1]} ({', '.join(formats)})...")
+    names = make_photos(staging, args.photos, size, formats)
+
+    with Fleet(1, SINK_NET, args.latency / 1000, profiles=("raw",)) as sink:
+        printer = sink.printers[0]
+        config = {"image_width": args.width, "image_position": "center", "always_ask_pos": False,
+                  "printer_ip": printer.ip, "printer_protocol": "raw", "preview_port": 0,
+                  "batch_window": args.batch_window, "convert_workers": args.convert_workers,
+                  "send_workers": args.send_workers}
+        with open(os.path.join(scratch, ".autoprint_config.json"), "w") as f:
+            json.dump(config, f, indent=4)
+
+        with contextlib.redirect_stdout(out):
+            import autoprint
+        autoprint.OUTPUT_DIR = output
+        metrics.registry.reset()
+        rss = RssSampler().start()
+        stop = threading.Event()
+
+        def watcher():
+            with contextlib.redirect_stdout(out):
+                autoprint.start_watcher([watch], config, stop)
+
+        thread = threading.Thread(target=watcher, name="watcher")
+        thread.start()
+        time.sleep(1.0)     # Observer, spool and preview server up
+
+        print(f"Dropping at {args.rate:g} photo(s)/s ({args.pattern})...")
+        dropped_at = {}
+        started = time.time()
+        for i, name in enumerate(names):
+            pattern = args.pattern if args.pattern != "mixed" else ("pending", "direct")[i % 2]
+            delay = started + i / args.rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            drop(staging, watch, name, pattern)
+            dropped_at[name] = time.time()
+
+        deadline = time.time() + args.timeout
+        while time.time() < deadline:
+            printed = {n for doc in printer.documents for n in (doc["title"] or "").split(", ")}
+            if printed >= set(names):
+                break
+            time.sleep(0.2)
+        time.sleep(0.5)     # Late duplicates still count
+        stop.set()
+        thread.join()
+        peak_rss = rss.stop()
+        documents = list(printer.documents)
+
+    return names, dropped_at, documents, started, peak_rss
+
+
+def report(args, names, dropped_at, documents, started, peak_rss):
+    first_print = {}
+    copies = {name: 0 for name in names}
+    for doc in documents:
+        for name in (doc["title"] or "").split(", "):
+            if name in copies:
+                copies[name] += 1
+                first_print.setdefault(name, doc["at"])
+    latencies = [first_print[n] - dropped_at[n] for n in names if n in first_print]
+    missing = [n for n in names if not copies[n]]
+    duplicated = [n for n in names if copies[n] > 1]
+    span = (max(first_print.values()) - started) if first_print else 0
+    result = {"photos": len(names), "printed": len(first_print), "documents": len(documents),
+              "missing": missing, "duplicated": duplicated,
+              "photos_per_min": 60 * len(first_print) / span if span else 0.0,
+              "offered_per_min": 60 * args.rate, "peak_rss_mb": peak_rss / 1e6,
+              "drop_to_print": percentiles(latencies), "stages": {}}
+    for h in metrics.snapshot()["histograms"]:
+        if h["name"] in ("autoprint_detect_seconds", "autoprint_stage_seconds", "autoprint_end_to_end_seconds",
+                         "autoprint_render_seconds", "autoprint_transfer_seconds"):
+            label = " ".join(f"{k}={v}" for k, v in h["labels"].items())
+            result["stages"][f"{h['name']} {label}".strip()] = {k: h[k] for k in ("count", "p50", "p95", "p99", "max")}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the AutoPrint pipeline with synthetic photos.")
+    parser.add_argument("--photos", type=int, default=30, help="photos to drop (default: 30)")
+    parser.add_argument("--rate", type=float, default=1.0, help="photos per second (default: 1)")
+    parser.add_argument("--size", default="2000x1500", help="image size WxH (default: 2000x1500)")
+    parser.add_argument("--formats", default="jpg,png", help="rotation of formats, jpg and/or png (default: jpg,png)")
+    parser.add_argument("--pattern", choices=("direct", "pending", "mixed"), default="mixed",
+                        help="direct write, Android .pending- rename, or alternating (default: mixed)")
+    parser.add_argument("--width", type=int, default=100, help="printed image width in mm (default: 100)")
+    parser.add_argument("--batch-window", type=float, default=0,
+                        help="coalescing window in seconds, 0 = one job per photo (default: 0)")
+    parser.add_argument("--convert-workers", type=int, default=1)
+    parser.add_argument("--send-workers", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="fake printer reply latency in ms")
+    parser.add_argument("--timeout", type=float, default=DRAIN_TIMEOUT,
+                        help=f"seconds to wait for the last prints (default: {DRAIN_TIMEOUT})")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show AutoPrint's own output")
+    args = parser.parse_args()
+    if args.rate <= 0 or args.photos <= 0:
+        parser.error("--rate and --photos must be positive")
+
+    scratch = tempfile.mkdtemp(prefix="autoprint-load-")
+    os.environ["HOME"] = scratch
+    out = sys.stdout if args.verbose else io.StringIO()
+    try:
+        result = report(args, *run(args, scratch, out))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    lat = result["drop_to_print"]
+    print(f"\nPrinted {result['printed']}/{result['photos']} photo(s) in {result['documents']} job(s) | "
+          f"{result['photos_per_min']:.1f} photos/min sustained (offered {result['offered_per_min']:.0f})")
+    print(f"Drop -> printer: p50 {lat['p50']:.2f}s  p95 {lat['p95']:.2f}s  p99 {lat['p99']:.2f}s  "
+          f"max {lat['max']:.2f}s")
+    for name, h in result["stages"].items():
+        print(f"  {name:<44} n={h['count']:<5} p50 {h['p50'] * 1000:8.1f}ms  p95 {h['p95'] * 1000:8.1f}ms  "
+              f"p99 {h['p99'] * 1000:8.1f}ms")
+    print(f"Peak RSS: {result['peak_rss_mb']:.0f} MB")
+    print(f"Dropped (never printed): {len(result['missing'])} {' '.join(result['missing'][:10])}")
+    print(f"Duplicated (printed twice): {len(result['duplicated'])} {' '.join(result['duplicated'][:10])}")
+    sys.exit(1 if result["missing"] or result["duplicated"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import ipaddress
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime
+
+import metrics
+from fakefleet import Fleet, FLEET_NET
+
+# ==========================================
+# SCANNER BENCHMARK (Simulated fleet)
+# ==========================================
+# Starts a fake printer fleet on loopback, runs each scanner against it
+# and reports hosts/s, total time and how many printers were found and
+# correctly identified. Results are appended to RESULTS_FILE; a run that
+# is clearly slower or less accurate than the recent runs with the same
+# settings is flagged as a regression (exit status 1).
+#
+# The scanners run with HOME pointed at a scratch directory, so the real
+# device cache and config are never touched and every run starts cold.
+
+RESULTS_FILE = os.path.expanduser("~/.autoprint_bench/scan.jsonl")
+BASELINE_RUNS = 5       # Recent results that form the baseline
+TOLERANCE = 0.20        # Allowed hosts/s drop before it counts as a regression
+ACCURACY_DROP = 0.05    # Allowed recall / identification drop
+
+# ANSI Colors
+RED = "\033[0;31m"
+GREEN = "\033[0;32m"
+YELLOW = "\033[1;33m"
+CYAN = "\033[0;36m"
+NC = "\033[0m"
+
+
+# --- SCANNERS UNDER TEST ---
+# Imported lazily: their module-level paths must see the scratch HOME.
+
+def run_scan(net, use_async):
+    import scan
+    scanner = scan.PrinterScanner()
+    scanner.run(use_async=use_async, use_cache=False, cidr=str(net))
+    return {d["ip"]: d.get("name") or "" for d in scanner.found_devices}
+
+
+def run_findlocal(net):
+    import Findlocalprinter
+    base = ".".join(str(net.network_address).split(".")[:3])
+    return {ip: None for ip in Findlocalprinter.scan_network(base)}
+
+
+def run_scanprinter(net):
+    import scanprinter
+    base = ".".join(str(net.network_address).split(".")[:3])
+    return {ip: None for ip in scanprinter.scan_printers(base)}
+
+
+# name -> (runner, port the scanner looks for (None: any printer port), identifies models)
+SCANNERS = {
+    "scan.async": (lambda net: run_scan(net, True), None, True),
+    "scan.threads": (lambda net: run_scan(net, False), None, True),
+    "findlocal": (run_findlocal, 9100, False),
+    "scanprinter": (run_scanprinter, 9100, False),
+}
+
+
+def measure(name, fleet, net, scratch, verbose=False):
+    """One cold run of scanner `name` -> result dict."""
+    runner, port, identifies = SCANNERS[name]
+    for leftover in os.listdir(scratch):
+        path = os.path.join(scratch, leftover)
+        shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+    metrics.registry.reset()
+    out = sys.stdout if verbose else io.StringIO()
+    start = time.monotonic()
+    with contextlib.redirect_stdout(out):
+        found = runner(net)
+    seconds = time.monotonic() - start
+
+    expected = fleet.expected(port)
+    hits = [ip for ip in found if ip in expected]
+    result = {"seconds": seconds,
+              "hosts_per_sec": (net.num_addresses - 2) / max(seconds, 1e-6),
+              "found": len(found), "expected": len(expected),
+              "recall": len(hits) / len(expected) if expected else 1.0,
+              "precision": len(hits) / len(found) if found else 1.0,
+              "identified": None}
+    if identifies and expected:
+        named = [ip for ip in hits if expected[ip].lower() in (found[ip] or "").lower()]
+        result["identified"] = len(named) / len(expected)
+    for h in metrics.snapshot()["histograms"]:
+        if h["name"] == "autoprint_probe_rtt_seconds":
+            result["probe_p95_ms"] = round(h["p95"] * 1000, 2)
+    return result
+
+
+def summarize(runs):
+    """Median time of repeated runs; accuracy of the worst run."""
+    seconds = statistics.median(r["seconds"] for r in runs)
+    out = dict(runs[0], seconds=seconds, hosts_per_sec=statistics.median(r["hosts_per_sec"] for r in runs),
+               runs=len(runs))
+    for key in ("recall", "precision", "identified"):
+        values = [r[key] for r in runs if r[key] is not None]
+        out[key] = min(values) if values else None
+    return out
+
+
+# --- RESULT HISTORY ---
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    try:
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError):
+        return []
+
+
+def regressions(result, history):
+    """Reasons `result` is worse than the recent runs with the same scanner and settings."""
+    same = [r for r in history if r["scanner"] == result["scanner"] and r["config"] == result["config"]]
+    recent = same[-BASELINE_RUNS:]
+    if not recent:
+        return []
+    reasons = []
+    baseline = statistics.median(r["hosts_per_sec"] for r in recent)
+    if result["hosts_per_sec"] < (1 - TOLERANCE) * baseline:
+        reasons.append(f"hosts/s {result['hosts_per_sec']:.0f} vs baseline {baseline:.0f}")
+    for key in ("recall", "identified"):
+        values = [r[key] for r in recent if r.get(key) is not None]
+        if result.get(key) is not None and values and result[key] < statistics.median(values) - ACCURACY_DROP:
+            reasons.append(f"{key} {result[key]:.0%} vs baseline {statistics.median(values):.0%}")
+    return reasons
+
+
+def save_result(path, result):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(result) + "\n")
+
+
+def fmt(value):
+    return "-" if value is None else f"{value:.0%}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the printer scanners against a simulated fleet.")
+    parser.add_argument("--fleet", type=int, default=20, help="number of fake printers (default: 20)")
+    parser.add_argument("--network", default=FLEET_NET, help=f"loopback /24 for the fleet (default: {FLEET_NET})")
+    parser.add_argument("--latency", type=float, default=0.0, help="reply latency in ms (default: 0)")
+    parser.add_argument("--loss", type=float, default=0.0, help="share of replies dropped, 0-1 (default: 0)")
+    parser.add_argument("--seed", type=int, default=1, help="fleet layout seed (default: 1)")
+    parser.add_argument("--runs", type=int, default=3, help="runs per scanner, the median is reported (default: 3)")
+    parser.add_argument("--scanners", default=",".join(SCANNERS),
+                        help=f"comma-separated subset of: {', '.join(SCANNERS)}")
+    parser.add_argument("--results", default=RESULTS_FILE, help=f"result history (default: {RESULTS_FILE})")
+    parser.add_argument("--no-save", action="store_true", help="compare against the history but do not append")
+    parser.add_argument("--verbose", action="store_true", help="show the scanners' own output")
+    args = parser.parse_args()
+
+    net = ipaddress.ip_network(args.network)
+    if net.prefixlen != 24 or not net.is_loopback:
+        parser.error("--network must be a loopback /24 (Findlocalprinter and scanprinter scan a /24)")
+    names = [n.strip() for n in args.scanners.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCANNERS]
+    if unknown:
+        parser.error(f"unknown scanner(s): {', '.join(unknown)}")
+
+    config = {"fleet": args.fleet, "network": str(net), "latency_ms": args.latency,
+              "loss": args.loss, "seed": args.seed}
+    history = load_history(args.results)
+    scratch = tempfile.mkdtemp(prefix="autoprint-bench-")
+    os.environ["HOME"] = scratch
+    failed = False
+    try:
+        with Fleet(args.fleet, str(net), args.latency / 1000, args.loss, args.seed) as fleet:
+            for ip, port, error in fleet.skipped:
+                print(f"{YELLOW}[SKIP]{NC} {ip}:{port} ({error})")
+            print(f"{CYAN}Fleet: {len(fleet.printers)} printers in {net}, latency {args.latency:g} ms, "
+                  f"loss {args.loss:.0%}{NC}\n")
+            print(f"{'scanner':<14} {'time':>8} {'hosts/s':>9} {'found':>7} {'recall':>7} "
+                  f"{'precision':>9} {'ident.':>7}")
+            for name in names:
+                runs = [measure(name, fleet, net, scratch, args.verbose) for _ in range(max(1, args.runs))]
+                result = dict(summarize(runs), scanner=name, config=config,
+                              ts=datetime.now().isoformat(timespec="seconds"), revision=git_revision())
+                reasons = regressions(result, history)
+                failed = failed or bool(reasons)
+                print(f"{name:<14} {result['seconds']:>7.2f}s {result['hosts_per_sec']:>9.0f} "
+                      f"{result['found']:>3}/{result['expected']:<3} {fmt(result['recall']):>7} "
+                      f"{fmt(result['precision']):>9} {fmt(result['identified']):>7}")
+                for reason in reasons:
+                    print(f"  {RED}[REGRESSION]{NC} {reason}")
+                if not args.no_save:
+                    save_result(args.results, result)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    if not args.no_save:
+        print(f"\n{GREEN}Results appended to {args.results}{NC}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+# ==========================================
+# COLD-START BUDGET (python -X importtime)
+# ==========================================
+# Loads each CLI entry point the way `python <file>` would, in a fresh
+# interpreter with -X importtime. The __main__ block itself cannot run
+# here (it prompts, scans or starts the daemon). Instead, the deferred
+# imports its start-up path makes before the first prompt (or "AutoPrint
+# ready") are listed in STARTUP and imported after the module. Keep that
+# list in sync when a lazy import moves onto or off the start-up path.
+#
+# Reported per entry point: the import time (interpreter start-up
+# excluded) and the heaviest imports. Going over the budget exits with
+# status 1, so a new top-level `import requests` shows up before it ships.
+#
+# Budgets are milliseconds on a desktop CPU; --scale stretches them for
+# slower machines (a phone under Termux is roughly 4x).
+
+BUDGETS = {
+    "autoprint-menu.py": 110,
+    "autoprint.py": 180,
+    "scan.py": 160,
+    "Findlocalprinter.py": 140,
+    "scanprinter.py": 140,
+}
+
+# Deferred imports that still run at start-up
+STARTUP = {
+    "autoprint-menu.py": ["urllib.request"],                # Update check (background thread)
+    "autoprint.py": ["watchdog.observers", "preview"],      # start_watcher, before "ready"
+    "scan.py": ["argparse", "concurrent.futures"],          # main(), identification pool
+    "Findlocalprinter.py": [],
+    "scanprinter.py": [],
+}
+MARKER = "--- entry point ---"
+
+# Runs in the child: everything imported after MARKER belongs to the entry point
+LOADER = f"""
+import sys, importlib, importlib.util
+path = sys.argv[1]
+sys.path.insert(0, sys.argv[2])
+sys.stderr.write({MARKER!r} + "\\n")
+sys.stderr.flush()
+spec = importlib.util.spec_from_file_location("__entry__", path)
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+for name in sys.argv[3:]:
+    importlib.import_module(name)
+"""
+
+# ANSI Colors
+RED = "\033[0;31m"
+GREEN = "\033[0;32m"
+CYAN = "\033[0;36m"
+NC = "\033[0m"
+
+
+def parse_importtime(stderr):
+    """-> (total_us, [(cumulative_us, module)]) for the top-level imports after MARKER."""
+    lines = stderr.splitlines()
+    if MARKER in lines:
+        lines = lines[lines.index(MARKER) + 1:]
+    top = []
+    for line in lines:
+        if not line.startswith("import time:"):
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            cumulative = int(cumulative)
+        except ValueError:
+            continue        # The header line
+        # Nesting is shown by two spaces per level; only direct imports add up
+        if not name[1:].startswith(" "):
+            top.append((cumulative, name.strip()))
+    return sum(us for us, _ in top), top
+
+
+def measure(path, scratch, startup=()):
+    """One cold load of `path` plus `startup` -> (total_us, top-level imports) or raises RuntimeError."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, HOME=scratch)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", LOADER, path, here, *startup],
+                          capture_output=True, text=True, env=env, cwd=scratch, timeout=60)
+    if proc.returncode:
+        error = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(error[-1] if error else f"exit status {proc.returncode}")
+    return parse_importtime(proc.stderr)
+
+
+def run(name, runs, scratch):
+    """Median total over `runs` loads (after one warm-up that fills __pycache__)."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    measure(path, scratch, STARTUP[name])
+    samples = [measure(path, scratch, STARTUP[name]) for _ in range(max(1, runs))]
+    total = statistics.median(us for us, _ in samples)
+    # Breakdown from the run closest to the median
+    _, top = min(samples, key=lambda s: abs(s[0] - total))
+    return {"ms": total / 1000, "heaviest": [(us / 1000, module) for us, module in sorted(top, reverse=True)]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the CLI entry points against a budget.")
+    parser.add_argument("--runs", type=int, default=5, help="loads per entry point, the median counts (default: 5)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget, e.g. 4 on a phone")
+    parser.add_argument("--top", type=int, default=5, help="heaviest imports shown per entry point (default: 5)")
+    parser.add_argument("--entries", default=",".join(BUDGETS),
+                        help=f"comma-separated subset of: {', '.join(BUDGETS)}")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args()
+    names = [n.strip() for n in args.entries.split(",") if n.strip()]
+    unknown = [n for n in names if n not in BUDGETS]
+    if unknown:
+        parser.error(f"unknown entry point(s): {', '.join(unknown)}")
+
+    scratch = tempfile.mkdtemp(prefix="autoprint-startup-")
+    results = {}
+    try:
+        for name in names:
+            budget = BUDGETS[name] * args.scale
+            try:
+                result = run(name, args.runs, scratch)
+            except (RuntimeError, subprocess.TimeoutExpired) as e:
+                results[name] = {"error": str(e), "budget_ms": budget, "over": True}
+                continue
+            results[name] = dict(result, budget_ms=budget, over=result["ms"] > budget)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    failed = any(r["over"] for r in results.values())
+    if args.json:
+        print(json.dumps(results, indent=2))
+        sys.exit(1 if failed else 0)
+    for name, r in results.items():
+        if "error" in r:
+            print(f"{RED}[FAIL]{NC} {name:<20} does not load: {r['error']}")
+            continue
+        tag = f"{RED}[OVER]{NC}" if r["over"] else f"{GREEN}[ OK ]{NC}"
+        print(f"{tag} {name:<20} {r['ms']:7.1f} ms  (budget {r['budget_ms']:.0f} ms)")
+        for ms, module in r["heaviest"][:args.top]:
+            print(f"         {CYAN}{ms:7.1f} ms{NC}  {module}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
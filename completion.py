@@ -0,0 +1,201 @@
+import os
+import re
+import time
+import queue
+import threading
+
+import metrics
+
+# ==========================================
+# FILE COMPLETION DETECTION
+# ==========================================
+# Decides when a new photo is fully written, from watcher events instead
+# of sleep loops:
+#   - Android camera: ".pending-<ts>-<name>" is renamed to <name> -> on_moved
+#   - Bluetooth / copies: the writer closes the file -> on_closed (inotify
+#     IN_CLOSE_WRITE)
+#   - Platforms without close events: the size stops changing for
+#     STABLE_FOR seconds (one checker thread for every file in flight).
+#     With close events a stalled writer is not "done": the size check
+#     only dispatches after CLOSE_FALLBACK seconds without a close.
+# dispatch() runs on a thread of its own: it may block (spool
+# backpressure) without holding up the watcher's event thread.
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+STABLE_FOR = 0.5        # Seconds of unchanged size that count as "complete"
+CLOSE_FALLBACK = 30     # Same, when close events exist but none arrived
+PENDING_TIMEOUT = 20    # A pending file that is never renamed is given up
+DISPATCH_MEMORY = 30    # Seconds a dispatched path ignores further events
+
+PENDING_RE = re.compile(r"^\.pending-\d+-(.+)$")
+
+
+def real_name(name):
+    """".pending-1700000000-IMG_1.jpg" -> "IMG_1.jpg" (None if not a pending name)."""
+    match = PENDING_RE.match(name)
+    if match:
+        return match.group(1)
+    if ".pending-" in name:
+        return name.split('-')[-1]
+    return None
+
+
+def is_image(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+class CompletionTracker:
+    """
+    Feed it watcher events; `dispatch(path)` is called exactly once per
+    photo, as soon as it is complete. Never blocks the caller.
+    """
+
+    def __init__(self, dispatch, stable_for=STABLE_FOR, pending_timeout=PENDING_TIMEOUT, log=None,
+                 close_events=False):
+        self.dispatch = dispatch
+        self.stable_for = stable_for
+        # True when the watcher reports IN_CLOSE_WRITE; also learnt from the first close
+        self.close_events = close_events
+        self.pending_timeout = pending_timeout
+        self.log = log or (lambda message, level="INFO": print(f"[{level}] {message}"))
+        self.files = {}         # final path -> {"detected", "size", "changed", "pending"}
+        self.dispatched = {}    # final path -> time (ignore late duplicate events)
+        self.latencies = []
+        self.cond = threading.Condition()
+        self.stopped = False
+        self.ready = queue.Queue()      # Complete paths waiting for dispatch(); None stops
+        self.thread = threading.Thread(target=self._check_loop, name="completion", daemon=True)
+        self.thread.start()
+        self.dispatcher = threading.Thread(target=self._dispatch_loop, name="completion-dispatch", daemon=True)
+        self.dispatcher.start()
+
+    # --- EVENTS ---
+
+    def created(self, path):
+        name = os.path.basename(path)
+        final = real_name(name)
+        now = time.monotonic()
+        with self.cond:
+            if final is not None:
+                # Only the rename tells us the pending file is done
+                target = os.path.join(os.path.dirname(path), final)
+                if is_image(target) and target not in self.dispatched:
+                    self.files.setdefault(target, {"detected": now, "size": -1, "changed": now, "pending": True})
+                    self.cond.notify()      # Starts the clock on PENDING_TIMEOUT
+                return
+            if is_image(path) and path not in self.dispatched:
+                self.files.setdefault(path, {"detected": now, "size": -1, "changed": now, "pending": False})
+                self.cond.notify()
+
+    def modified(self, path):
+        with self.cond:
+            entry = self.files.get(path)
+            if entry is not None:
+                entry["changed"] = time.monotonic()
+
+    def closed(self, path):
+        """Close after write: the writer is done with the file."""
+        with self.cond:
+            self.close_events = True
+            entry = self.files.get(path)
+            if entry is None or entry["pending"]:
+                return
+        self._complete(path, "close-write")
+
+    def moved(self, src, dest):
+        """A rename into the final name is atomic: the file is complete now."""
+        if not is_image(dest):
+            return
+        with self.cond:
+            entry = self.files.pop(src, None) or self.files.get(dest)
+            if entry is None:
+                if dest in self.dispatched:
+                    return
+                entry = {"detected": time.monotonic(), "pending": False}
+            self.files[dest] = entry
+        self._complete(dest, "rename")
+
+    # --- DISPATCH ---
+
+    def _complete(self, path, how):
+        with self.cond:
+            entry = self.files.pop(path, None)
+            if entry is None or path in self.dispatched:
+                return
+            now = time.monotonic()
+            self.dispatched[path] = now
+            latency = now - entry["detected"]
+            self.latencies.append(latency)
+            del self.latencies[:-1000]
+        metrics.observe("autoprint_detect_seconds", latency, trigger=how)
+        self.log(f"Ready: {os.path.basename(path)} after {latency * 1000:.0f} ms ({how})", "INFO")
+        self.ready.put(path)
+
+    def _dispatch_loop(self):
+        while True:
+            path = self.ready.get()
+            if path is None:
+                return
+            try:
+                self.dispatch(path)
+            except Exception as e:
+                self.log(f"Dispatch failed for {path}: {e}", "ERROR")
+
+    def _check_loop(self):
+        """Size-stability fallback and pending timeouts for every file in flight."""
+        while True:
+            with self.cond:
+                if self.stopped:
+                    return
+                if not self.files:
+                    self.cond.wait()
+                    continue
+            time.sleep(self.stable_for / 2)
+            now = time.monotonic()
+            ready = []
+            with self.cond:
+                stable_for = CLOSE_FALLBACK if self.close_events else self.stable_for
+                for path, entry in list(self.files.items()):
+                    if entry["pending"]:
+                        if now - entry["detected"] > self.pending_timeout:
+                            del self.files[path]
+                            self.log(f"Pending file never completed: {path}", "ERROR")
+                        continue
+                    try:
+                        size = os.path.getsize(path)
+                    except OSError:
+                        del self.files[path]    # Deleted or moved away before it was complete
+                        continue
+                    if size != entry["size"]:
+                        entry["size"] = size
+                        entry["changed"] = now
+                    elif size > 0 and now - entry["changed"] >= stable_for:
+                        ready.append(path)
+                for path, at in list(self.dispatched.items()):
+                    if now - at > DISPATCH_MEMORY:
+                        del self.dispatched[path]
+            for path in ready:
+                self._complete(path, "size stable")
+
+    # --- STATS ---
+
+    def in_flight(self):
+        with self.cond:
+            return len(self.files)
+
+    def latency_stats(self):
+        """Detect-to-dispatch latency summary in ms: {"count", "avg", "max"}."""
+        with self.cond:
+            values = list(self.latencies)
+        if not values:
+            return {"count": 0, "avg": 0, "max": 0}
+        return {"count": len(values), "avg": 1000 * sum(values) / len(values), "max": 1000 * max(values)}
+
+    def stop(self):
+        """Stops the checker, then waits for the photos already complete to be dispatched."""
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+        self.thread.join()
+        self.ready.put(None)
+        self.dispatcher.join()
@@ -0,0 +1,334 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import ipaddress
+import contextlib
+
+try:
+    import fcntl
+except ImportError:     # Windows: scan.py still works, just without the lock
+    fcntl = None
+
+# ==========================================
+# SHARED CONFIG STORE
+# ==========================================
+# ~/.autoprint_config.json is shared by the daemon, the menu and the
+# scanners. Reads come from an in-memory copy that is refreshed when the
+# file changes: on watchdog (inotify) events once watch() runs, otherwise
+# after a cheap stat at most every CHECK_INTERVAL seconds. Every write is
+# read-modify-write under an advisory lock, then temp file + os.replace,
+# so concurrent writers never lose each other's keys or leave a
+# half-written file.
+
+CONFIG_FILE = os.path.expanduser("~/.autoprint_config.json")
+CHECK_INTERVAL = 1.0
+
+
+class ConfigError(ValueError):
+    """A value that does not fit the schema."""
+
+
+# --- SCHEMA ---
+
+def _number(value):
+    if isinstance(value, bool):
+        raise ValueError("not a number")
+    if isinstance(value, str):
+        value = float(value.strip())
+    if not isinstance(value, (int, float)):
+        raise ValueError("not a number")
+    return int(value) if float(value).is_integer() else float(value)
+
+
+def _text(value):
+    if not isinstance(value, str):
+        raise ValueError("not a string")
+    return value.strip()
+
+
+def _flag(value):
+    if isinstance(value, str) and value.strip().lower() in ("y", "yes", "true", "1", "n", "no", "false", "0"):
+        return value.strip().lower() in ("y", "yes", "true", "1")
+    if not isinstance(value, bool):
+        raise ValueError("not true/false")
+    return value
+
+
+def _ip(value):
+    return str(ipaddress.IPv4Address(_text(value)))
+
+
+def _choice(*options):
+    def check(value):
+        value = _text(value).lower()
+        if value not in options:
+            raise ValueError(f"not one of {', '.join(options)}")
+        return value
+    return check
+
+
+def _range(low, high=None, integer=True):
+    def check(value):
+        value = _number(value)
+        if integer and not isinstance(value, int):
+            raise ValueError("not a whole number")
+        if value < low or (high is not None and value > high):
+            raise ValueError(f"must be {low}..{high}" if high is not None else f"must be at least {low}")
+        return value
+    return check
+
+
+def _device(value):
+    if not isinstance(value, dict):
+        raise ValueError("not a device entry")
+    return value
+
+
+def _ip_list(value):
+    if isinstance(value, str):
+        value = [v for v in value.replace(",", " ").split() if v]
+    if not isinstance(value, (list, tuple)):
+        raise ValueError("not a list of IPs")
+    return list(dict.fromkeys(_ip(v) for v in value))
+
+
+def _affinity(value):
+    if not isinstance(value, dict):
+        raise ValueError("not a {folder: printers} map")
+    return {_text(folder): _ip_list(ips) for folder, ips in value.items()}
+
+
+SCHEMA = {
+    "printer_ip": _ip,
+    "printers": _ip_list,
+    "printer_affinity": _affinity,
+    "printer": _device,
+    "pc_ip": _text,
+    "pc_user": _text,
+    "remote_folder": _text,
+    "image_width": _range(1, 210, integer=False),
+    "image_position": _choice("top-left", "center", "bottom-right"),
+    "always_ask_pos": _flag,
+    "printer_protocol": _choice("auto", "ipp", "raw"),
+    "ipp_wait": _range(0, integer=False),
+    "convert_workers": _range(1, 16),
+    "send_workers": _range(1, 16),
+    "spool_max_depth": _range(1),
+    "retry_max_attempts": _range(1),
+    "retry_expire_hours": _range(0, integer=False),
+    "print_dpi": _range(72, 1200),
+    "jpeg_quality": _range(1, 100),
+    "batch_window": _range(0, integer=False),
+    "batch_max": _range(1),
+    "batch_layout": _choice("pages", "nup"),
+    "batch_nup": _range(1, 16),
+    "dedup_window": _range(0, integer=False),
+    "render_cache_mb": _range(0, integer=False),
+    "preview_port": _range(0, 65535),
+}
+
+
+def validate(config):
+    """
+    Returns (clean, errors): known keys normalised ("100" -> 100), unknown
+    keys passed through untouched, errors as {key: reason}.
+    """
+    clean, errors = {}, {}
+    for key, value in config.items():
+        check = SCHEMA.get(key)
+        if check is None:
+            clean[key] = value
+            continue
+        try:
+            clean[key] = check(value)
+        except (ValueError, TypeError) as e:
+            errors[key] = f"{value!r}: {e}"
+    return clean, errors
+
+
+# --- STORE ---
+
+class ConfigStore:
+    def __init__(self, path=CONFIG_FILE):
+        self.path = path
+        self.lock = threading.RLock()
+        self.data = None
+        self.signature = None
+        self.checked = 0
+        self.errors = {}
+        self.listeners = []
+        self.observer = None
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_ino, st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _read(self):
+        """Fresh parse of the file; a missing file is an empty config."""
+        try:
+            with open(self.path) as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return {}
+        if not isinstance(raw, dict):
+            raise ValueError("config is not a JSON object")
+        return raw
+
+    def reload(self):
+        """Re-reads the file now. An unreadable file keeps the last good copy."""
+        with self.lock:
+            signature = self._signature()
+            try:
+                raw = self._read()
+            except (OSError, ValueError):
+                if self.data is None:
+                    self.data = {}
+                return False
+            old = self.data
+            self.data, self.errors = validate(raw)
+            self.signature = signature
+            self.checked = time.monotonic()
+            changed = old is not None and old != self.data
+            listeners = list(self.listeners)
+            data = dict(self.data)
+        if changed:
+            for listener in listeners:
+                listener(data)
+        return True
+
+    def _fresh(self):
+        with self.lock:
+            if self.data is None:
+                self.reload()
+            elif self.observer is None and time.monotonic() - self.checked >= CHECK_INTERVAL:
+                self.checked = time.monotonic()
+                if self._signature() != self.signature:
+                    self.reload()
+            return self.data
+
+    def load(self):
+        """The whole config (a copy, safe to modify)."""
+        return dict(self._fresh())
+
+    def get(self, key, default=None):
+        return self._fresh().get(key, default)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Advisory lock on a side file: os.replace swaps the config's inode, so it cannot be locked itself."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def update(self, changes=None, **kwargs):
+        """
+        Merges `changes` into the file and returns the new config. A value
+        of None removes the key. Raises ConfigError for invalid values
+        (nothing is written then).
+        """
+        changes = dict(changes or {}, **kwargs)
+        clean, errors = validate({k: v for k, v in changes.items() if v is not None})
+        if errors:
+            raise ConfigError("; ".join(f"{k} {reason}" for k, reason in errors.items()))
+        with self.lock, self._locked():
+            try:
+                current = self._read()
+            except ValueError:
+                current = {}    # Corrupt file: rewritten from the changes below
+            for key, value in changes.items():
+                if value is None:
+                    current.pop(key, None)
+                else:
+                    current[key] = clean[key]
+            self._write(current)
+        self.reload()
+        return self.load()
+
+    def _write(self, config):
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp = tempfile.mkstemp(prefix=".autoprint_config.", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(config, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp)
+            raise
+
+    # --- HOT RELOAD ---
+
+    def on_change(self, listener):
+        """`listener(config)` is called after the file changed on disk."""
+        with self.lock:
+            self.listeners.append(listener)
+
+    def watch(self):
+        """Reload on inotify events (via watchdog). Returns False if watchdog is missing."""
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return False
+        store = self
+        path = os.path.abspath(self.path)
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if path in (event.src_path, getattr(event, "dest_path", None)) and event.event_type != "opened":
+                    store.reload()
+
+        with self.lock:
+            if self.observer is not None:
+                return True
+            observer = Observer()
+            observer.schedule(Handler(), os.path.dirname(path) or ".", recursive=False)
+            observer.daemon = True
+            observer.start()
+            self.observer = observer
+        self.reload()
+        return True
+
+    def stop(self):
+        with self.lock:
+            observer, self.observer = self.observer, None
+        if observer is not None:
+            observer.stop()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The process-wide store for CONFIG_FILE."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConfigStore()
+        return _store
+
+
+def load():
+    return get_store().load()
+
+
+def get(key, default=None):
+    return get_store().get(key, default)
+
+
+def update(changes=None, **kwargs):
+    return get_store().update(changes, **kwargs)
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import select
+import socket
+import threading
+import subprocess
+import socketserver
+
+# ==========================================
+# DAEMON CONTROL SOCKET
+# ==========================================
+# autoprint.py listens on a Unix socket; the menu talks to it instead of
+# grepping the process table. One JSON object per line each way:
+#   {"cmd": "status"}  ->  {"ok": true, "state": "running", ...}
+# Commands: ping, status, pause, resume, reload, stop (drain, then exit).
+# Readiness is signalled sd_notify-style: spawn() hands the daemon the
+# write end of a pipe (AUTOPRINT_READY_FD); the daemon writes "ready"
+# once it is watching, and a daemon that dies first closes the pipe, so
+# the menu learns either outcome immediately.
+
+SOCKET_PATH = os.path.expanduser("~/.autoprint.sock")
+READY_ENV = "AUTOPRINT_READY_FD"
+TIMEOUT = 5
+
+
+class ControlError(Exception):
+    """The daemon answered with ok=false."""
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                handler = self.server.commands.get(request.pop("cmd", None))
+                if handler is None:
+                    reply = {"ok": False, "error": "unknown command"}
+                else:
+                    reply = dict({"ok": True}, **(handler(**request) or {}))
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            self.wfile.write((json.dumps(reply, default=str) + "\n").encode())
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ControlServer:
+    """`commands` maps a command name to a function(**args) -> dict."""
+
+    def __init__(self, commands, path=SOCKET_PATH):
+        self.commands = dict(commands, ping=lambda: {"pid": os.getpid()})
+        self.path = path
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        """Raises OSError if another daemon is already listening on `path`."""
+        if os.path.exists(self.path):
+            if is_running(self.path):
+                raise OSError(f"another AutoPrint is already running ({self.path})")
+            os.remove(self.path)    # Left behind by a crash
+        self.server = _Server(self.path, _Handler)
+        os.chmod(self.path, 0o600)
+        self.server.commands = self.commands
+        self.thread = threading.Thread(target=self.server.serve_forever, name="control", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+# --- CLIENT ---
+
+def request(cmd, path=SOCKET_PATH, timeout=TIMEOUT, **args):
+    """
+    Sends one command, returns the reply dict. Raises OSError when no
+    daemon is listening, ControlError when it refuses the command.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(path)
+        s.sendall((json.dumps(dict(args, cmd=cmd)) + "\n").encode())
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = s.recv(4096)
+            if not chunk:
+                raise ConnectionError("control socket closed")
+            data += chunk
+    reply = json.loads(data)
+    if not reply.get("ok"):
+        raise ControlError(reply.get("error", "failed"))
+    return reply
+
+
+def is_running(path=SOCKET_PATH):
+    try:
+        request("ping", path, timeout=1)
+        return True
+    except (OSError, ValueError, ControlError):
+        return False
+
+
+def spawn(argv, timeout=30, **popen_args):
+    """
+    Starts the daemon and waits for its ready notification.
+    Returns (process, ready): ready is False if it exited or timed out first.
+    """
+    r, w = os.pipe()
+    env = dict(popen_args.pop("env", os.environ), **{READY_ENV: str(w)})
+    try:
+        proc = subprocess.Popen(argv, pass_fds=(w,), env=env, **popen_args)
+    finally:
+        os.close(w)
+    try:
+        deadline = time.monotonic() + timeout
+        data = b""
+        while b"\n" not in data:
+            left = deadline - time.monotonic()
+            if left <= 0 or not select.select([r], [], [], left)[0]:
+                return proc, False
+            chunk = os.read(r, 64)
+            if not chunk:
+                return proc, False      # Pipe closed: the daemon exited before ready
+            data += chunk
+        return proc, data.startswith(b"ready")
+    finally:
+        os.close(r)
+
+
+def notify_ready():
+    """Daemon side of spawn(): no-op when started any other way."""
+    fd = os.environ.pop(READY_ENV, None)
+    if fd is None:
+        return
+    try:
+        os.write(int(fd), b"ready\n")
+        os.close(int(fd))
+    except (OSError, ValueError):
+        pass
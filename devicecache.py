@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import ipaddress
+
+# ==========================================
+# PERSISTENT DISCOVERY CACHE
+# ==========================================
+# Remembers every printer we have seen so scans can probe known devices
+# first and only rescan the rest of the address space.
+
+CACHE_FILE = os.path.expanduser("~/.autoprint_devices.json")
+DEFAULT_TTL = 24 * 3600     # Entries older than this get fully re-identified
+
+# Fields that make up a cache entry (everything else in a device dict is dropped)
+FIELDS = ("ip", "mac", "name", "ports", "protocols", "serial", "model", "pdl", "rp", "last_seen")
+# Fields whose change is reported in a diff
+TRACKED = ("ip", "mac", "name", "ports")
+
+
+def identity(dev):
+    """Stable key for a device: MAC, then serial, then IP (DHCP can move a printer)."""
+    mac = (dev.get("mac") or "").split(" ")[0]
+    return mac or dev.get("serial") or dev["ip"]
+
+
+class DeviceCache:
+    def __init__(self, path=CACHE_FILE, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.devices = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                self.devices = json.load(f).get("devices", {})
+        except (OSError, ValueError, AttributeError):
+            self.devices = {}
+
+    def save(self):
+        """Atomic write: readers never see a half-written file."""
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"version": 1, "devices": self.devices}, f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def is_fresh(self, entry, now=None):
+        return ((now or time.time()) - entry.get("last_seen", 0)) < self.ttl
+
+    def by_ip(self, network=None):
+        """Known entries keyed by IP, most recently seen first, optionally limited to `network`."""
+        entries = sorted(self.devices.values(), key=lambda e: e.get("last_seen", 0), reverse=True)
+        result = {}
+        for entry in entries:
+            try:
+                if network is None or ipaddress.IPv4Address(entry["ip"]) in network:
+                    result.setdefault(entry["ip"], entry)
+            except (KeyError, ValueError):
+                continue
+        return result
+
+    def order_known_first(self, ips):
+        """Reorders an IP list so cached printers are probed first."""
+        known = self.by_ip()
+        return sorted(ips, key=lambda ip: str(ip) not in known)
+
+    def merge(self, found, scope=None, ports=None):
+        """
+        Records a scan result and returns the diff against the cache:
+        {"added": [...], "removed": [...], "changed": [(old, new), ...]}.
+
+        `scope` is the network (or set of IPs) that was actually scanned and
+        `ports` the ports that were probed (None = all). Cached devices
+        outside that scope are left alone, devices inside it that did not
+        answer are removed.
+        """
+        now = time.time()
+        diff = {"added": [], "removed": [], "changed": []}
+        seen = set()
+        for dev in found:
+            key = identity(dev)
+            old_key = key if key in self.devices else self._key_for_ip(dev["ip"], seen)
+            old = self.devices.pop(old_key, None) if old_key else None
+            if old is not None and key == dev["ip"]:
+                # This scan knows less (no MAC/serial), keep the richer key
+                key = old_key
+            # Port-only scanners do not identify: keep what we already know
+            entry = {k: v for k, v in (old or {}).items() if k in FIELDS}
+            entry.update({k: dev[k] for k in FIELDS if dev.get(k) is not None})
+            if old is not None and ports is not None:
+                # Only the probed ports are news, the others keep their cached state
+                kept = [p for p in old.get("ports", []) if p not in ports]
+                entry["ports"] = [p for p in old.get("ports", []) if p in kept or p in dev.get("ports", [])]
+                entry["ports"] += [p for p in dev.get("ports", []) if p not in entry["ports"]]
+            entry["last_seen"] = now
+            if old is None:
+                diff["added"].append(entry)
+            elif any(old.get(k) != entry.get(k) for k in TRACKED):
+                diff["changed"].append((old, entry))
+            self.devices[key] = entry
+            seen.add(key)
+
+        for key, entry in list(self.devices.items()):
+            if key in seen or not self._in_scope(entry, scope):
+                continue
+            if ports is not None and not set(entry.get("ports", [])) & set(ports):
+                continue
+            diff["removed"].append(self.devices.pop(key))
+        return diff
+
+    def _key_for_ip(self, ip, exclude):
+        for key, entry in self.devices.items():
+            if entry.get("ip") == ip and key not in exclude:
+                return key
+        return None
+
+    @staticmethod
+    def _in_scope(entry, scope):
+        if scope is None:
+            return True
+        try:
+            if isinstance(scope, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
+                return ipaddress.IPv4Address(entry["ip"]) in scope
+            return entry["ip"] in scope
+        except (KeyError, ValueError):
+            return False
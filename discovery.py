@@ -0,0 +1,278 @@
+import re
+import socket
+import struct
+import asyncio
+import ipaddress
+import itertools
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import metrics
+import configstore
+import scan_engine
+from devicecache import DeviceCache
+
+# ==========================================
+# SHARED PRINTER DISCOVERY
+# ==========================================
+# One library for scan.py, scanprinter.py and Findlocalprinter.py.
+# Results are streamed as they arrive, known printers are probed first
+# and callers can stop at the first match.
+
+CONFIG_FILE = configstore.CONFIG_FILE
+RAW_PORTS = (9100,)
+
+# Linux ioctls for reading interface address / netmask (no root needed)
+SIOCGIFADDR = 0x8915
+SIOCGIFNETMASK = 0x891b
+
+
+# --- LOCAL NETWORK ---
+
+def get_local_ip():
+    """
+    Robustly finds local IP.
+    Works online (via Google DNS) and offline (via Hostname).
+    """
+    try:
+        # Method 1: Connect to external DNS (Preferred)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+    except OSError:
+        # Method 2: Offline Fallback
+        try:
+            local_ip = socket.gethostbyname(socket.gethostname())
+            if not local_ip.startswith("127."): return local_ip
+        except OSError:
+            pass
+    return None
+
+
+def get_prefix_len(local_ip):
+    """Reads the real prefix length of the interface holding `local_ip`."""
+    # Method 1: SIOCGIFNETMASK ioctl (Linux / Android, no root)
+    try:
+        import fcntl
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            for _, name in socket.if_nameindex():
+                req = struct.pack("256s", name.encode()[:15])
+                try:
+                    addr = socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFADDR, req)[20:24])
+                    if addr != local_ip:
+                        continue
+                    mask = socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFNETMASK, req)[20:24])
+                    return ipaddress.IPv4Network(f"0.0.0.0/{mask}").prefixlen
+                except OSError:
+                    continue
+    except (ImportError, OSError, AttributeError):
+        pass
+
+    # Method 2: iproute2 ("inet 192.168.4.23/22 ...")
+    try:
+        out = subprocess.check_output(["ip", "-o", "-f", "inet", "addr", "show"],
+                                      stderr=subprocess.DEVNULL, timeout=2).decode()
+        match = re.search(rf"inet {re.escape(local_ip)}/(\d+)", out)
+        if match: return int(match.group(1))
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return None
+
+
+def get_local_network(cidr=None):
+    """
+    Network to scan: explicit `cidr`, else the interface's real prefix.
+    Falls back to /24 when the prefix cannot be read; auto-detected
+    networks larger than /16 are narrowed to the /16 around us.
+    """
+    if cidr:
+        return ipaddress.IPv4Network(cidr, strict=False)
+
+    local_ip = get_local_ip()
+    if not local_ip:
+        return None
+    prefix = get_prefix_len(local_ip) or 24
+    return ipaddress.IPv4Network(f"{local_ip}/{max(prefix, 16)}", strict=False)
+
+
+# --- CONFIG ---
+
+def get_saved_printer_ip():
+    return configstore.get("printer_ip")
+
+
+def save_printer_ip(ip):
+    configstore.update(printer_ip=ip)
+
+
+# --- PROBES ---
+
+def is_printer(ip, port=9100, timeout=1):
+    try:
+        with socket.create_connection((ip, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+# --- EARLY EXIT PREDICATES ---
+
+def first_printer(dev):
+    """stop= predicate: the first printer found ends the scan."""
+    return True
+
+
+def match(ip=None, mac=None):
+    """stop= predicate: ends the scan once the printer with this IP or MAC is seen."""
+    mac = (mac or "").upper()
+
+    def stop(dev):
+        if ip and dev["ip"] == ip:
+            return True
+        return bool(mac) and (dev.get("mac") or "").upper().startswith(mac)
+    return stop
+
+
+# --- STREAMING DISCOVERY ---
+
+def _iterate_async(agen):
+    """Drives an async generator from sync code; closing the generator cancels its sockets."""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                item = loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        loop.run_until_complete(agen.aclose())
+        loop.close()
+
+
+def _sweep_threads(hosts, ports, workers=15):
+    """Thread-pool fallback with the same result shape as scan_engine.sweep."""
+    def one(ip):
+        ip = str(ip)
+        rtt = scan_engine.tcp_ping(ip)
+        if rtt is None:
+            return {"ip": ip, "alive": False, "rtt": None, "ports": [], "snmp": None}
+        open_ports = [p for p in ports if is_printer(ip, p, timeout=0.4)]
+        return {"ip": ip, "alive": True, "rtt": rtt, "ports": open_ports, "snmp": None}
+
+    # ThreadPool with LOW workers for Termux stability. Hosts are
+    # submitted in a bounded window instead of materialising every future.
+    hosts = iter(hosts)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = set()
+        try:
+            while True:
+                for ip in hosts:
+                    running.add(executor.submit(one, ip))
+                    if len(running) >= 4 * workers:
+                        break
+                if not running:
+                    return
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for f in done:
+                    yield f.result()
+        finally:
+            for f in running:
+                f.cancel()
+
+
+def _measured(results, engine):
+    """Probe metrics per host: liveness RTT and alive/dead counts."""
+    for host in results:
+        metrics.inc("autoprint_hosts_probed_total", engine=engine, alive=str(host["alive"]).lower())
+        if host["rtt"] is not None:
+            metrics.observe("autoprint_probe_rtt_seconds", host["rtt"], engine=engine)
+        yield host
+
+
+def sweep(hosts, ports=RAW_PORTS, use_async=True, concurrency=scan_engine.MAX_IN_FLIGHT, snmp=True):
+    """
+    Sync generator over scan_engine.sweep (one result dict per host). Falls
+    back to the thread pool when the event loop or its sockets cannot be
+    set up.
+    """
+    if use_async:
+        try:
+            agen = scan_engine.sweep(hosts, ports, concurrency, use_udp=snmp)
+            stream = _iterate_async(agen)
+            first = next(stream, None)
+        except (OSError, RuntimeError):
+            pass
+        else:
+            if first is not None:
+                try:
+                    yield from _measured(itertools.chain([first], stream), "async")
+                finally:
+                    # Closing early must still cancel the engine's sockets
+                    stream.close()
+            return
+    threads = _sweep_threads(hosts, ports)
+    try:
+        yield from _measured(threads, "threads")
+    finally:
+        threads.close()
+
+
+def discover(network=None, hosts=None, ports=RAW_PORTS, known=None, stop=None,
+             on_progress=None, use_async=True, concurrency=scan_engine.MAX_IN_FLIGHT,
+             snmp=True, record=False, on_diff=None):
+    """
+    Generator: yields a device dict ({"ip", "ports", "rtt", "snmp"} plus
+    "mac"/"name" when cached) for every host with one of `ports` open.
+
+    - `network` (CIDR string or IPv4Network, default: the local network) or
+      an explicit `hosts` iterable selects what is scanned.
+    - `known` IPs are probed first as their own batch; by default these are
+      the cached printers and the saved printer_ip.
+    - `stop(dev)` returning True ends the scan right after yielding `dev`
+      (see first_printer / match). Breaking out of the loop works too.
+    - `on_progress(ip)` is called for every host probed, dead or alive.
+    - `record=True` stores the result in the device cache and passes the
+      added/removed/changed diff to `on_diff`.
+    """
+    cache = DeviceCache()
+    cached = cache.by_ip()
+    if hosts is None:
+        if network is None or isinstance(network, str):
+            network = get_local_network(network)
+        if network is None:
+            return
+        if known is None:
+            known = list(cache.by_ip(network))
+            saved = get_saved_printer_ip()
+            if saved and saved not in known:
+                known.insert(0, saved)
+        known = [ip for ip in known if ipaddress.IPv4Address(ip) in network]
+        batches = [known, scan_engine.Hosts(network, exclude=known)]
+    else:
+        batches = [hosts]
+
+    found = []
+    complete = False
+    try:
+        for batch in batches:
+            for host in sweep(batch, ports, use_async, concurrency, snmp):
+                if on_progress:
+                    on_progress(host["ip"])
+                if not host["ports"]:
+                    continue
+                entry = cached.get(host["ip"], {})
+                dev = dict(host, mac=entry.get("mac", ""), name=entry.get("name"))
+                found.append(dev)
+                yield dev
+                if stop and stop(dev):
+                    return
+        complete = True
+    finally:
+        if record:
+            # A partial scan only refreshes what it saw, it never removes anything
+            scope = (network if complete and network is not None else {d["ip"] for d in found})
+            diff = cache.merge([{"ip": d["ip"], "ports": d["ports"]} for d in found], scope=scope, ports=list(ports))
+            cache.save()
+            if on_diff:
+                on_diff(diff)
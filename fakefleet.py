@@ -0,0 +1,298 @@
+import re
+import time
+import random
+import struct
+import asyncio
+import threading
+import ipaddress
+
+import ipp
+import snmp
+from transport import UEL
+
+# ==========================================
+# SIMULATED PRINTER FLEET (Benchmarks only)
+# ==========================================
+# Fake printers on loopback addresses (127.x.y.z all route to lo on
+# Linux; other systems need `ifconfig lo0 alias` per address). Each one
+# speaks just enough of its protocols for the scanners to identify it:
+#   9100  raw / PJL INFO ID       631  IPP (printer attributes, Print-Job)
+#   161   SNMP GetRequest (udp)   80   HTTP with a <title>
+# `latency` delays every reply, `loss` drops that share of replies.
+# Ports below 1024 need root (or CAP_NET_BIND_SERVICE); services that
+# cannot bind are skipped and reported in Fleet.skipped.
+
+FLEET_NET = "127.77.0.0/24"
+MODELS = ("HP LaserJet Pro M404dn", "Brother HL-L2350DW series", "EPSON WF-2850 Series",
+          "Canon i-SENSYS LBP6030", "KYOCERA ECOSYS P2040dn", "Samsung Xpress M2020W")
+
+# Service mixes seen in real offices: everything, raw-only JetDirect,
+# driverless IPP without 9100
+PROFILES = {
+    "full": (9100, 631, 161, 80),
+    "raw": (9100,),
+    "ipp": (631, 161, 80),
+}
+PROFILE_MIX = ("full", "full", "full", "raw", "ipp")
+
+PDF_TITLE_RE = re.compile(rb"/Title \((.*?)\)")
+
+
+class FakePrinter:
+    def __init__(self, ip, model, ports, latency=0.0, loss=0.0, rng=None):
+        self.ip = ip
+        self.model = model
+        self.ports = tuple(ports)
+        self.latency = latency
+        self.loss = loss
+        self.rng = rng or random.Random()
+        self.serial = f"SN{int(ipaddress.IPv4Address(ip)) & 0xFFFF:05d}"
+        self.jobs = {}          # IPP job id -> bytes received
+        self.documents = []     # Raw 9100 PDFs: {"at", "bytes", "title"}
+
+    def describe(self):
+        return {"ip": self.ip, "model": self.model, "ports": list(self.ports)}
+
+    async def delay(self):
+        """Reply latency with +-50 % jitter. False means: drop this reply."""
+        if self.latency:
+            await asyncio.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+        return self.rng.random() >= self.loss
+
+    # --- 9100 RAW / PJL ---
+
+    async def handle_raw(self, reader, writer):
+        buf = b""
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                if b"@PJL INFO ID" in data and await self.delay():
+                    writer.write(f'@PJL INFO ID\r\n"{self.model}"\r\n\x0c'.encode())
+                    await writer.drain()
+                buf = self.split_jobs(buf + data)
+        except ConnectionError:
+            pass
+        finally:
+            self.split_jobs(buf + UEL)      # A job without its closing UEL ends at EOF
+            writer.close()
+
+    def split_jobs(self, buf):
+        """Records every complete UEL-framed PDF in `buf`; returns the unfinished rest."""
+        while True:
+            start = buf.find(UEL)
+            if start < 0:
+                return buf
+            end = buf.find(UEL, start + len(UEL))
+            if end < 0:
+                return buf[start:]
+            job = buf[start + len(UEL):end]
+            buf = buf[end + len(UEL):]
+            if job.startswith(b"%PDF"):
+                title = PDF_TITLE_RE.search(job)
+                self.documents.append({"at": time.time(), "bytes": len(job),
+                                       "title": title.group(1).decode(errors="replace") if title else None})
+
+    # --- 631 IPP ---
+
+    async def read_http(self, reader):
+        """-> (request line, headers, body) of one HTTP/1.1 request, or None on EOF."""
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode(errors="replace").split("\r\n")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if not size:
+                    await reader.readuntil(b"\r\n")
+                    break
+                body += await reader.readexactly(size)
+                await reader.readexactly(2)
+            body = bytes(body)
+        else:
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+        return lines[0], headers, body
+
+    def ipp_response(self, request):
+        _, _, operation, request_id = struct.unpack("!BBHI", request[:8])
+        attrs = [(ipp.CHARSET, "attributes-charset", "utf-8"),
+                 (ipp.LANGUAGE, "attributes-natural-language", "en")]
+        groups = [(ipp.OPERATION_ATTRIBUTES, attrs)]
+        if operation == ipp.GET_PRINTER_ATTRIBUTES:
+            groups.append((ipp.PRINTER_ATTRIBUTES, [
+                (ipp.TEXT, "printer-make-and-model", self.model),
+                (ipp.NAME, "printer-name", self.model.split()[0]),
+                (ipp.ENUM, "printer-state", 3)]))
+        elif operation == ipp.PRINT_JOB:
+            job_id = len(self.jobs) + 1
+            self.jobs[job_id] = len(request)
+            groups.append((ipp.JOB_ATTRIBUTES, [(ipp.INTEGER, "job-id", job_id),
+                                                (ipp.URI, "job-uri", f"ipp://{self.ip}/jobs/{job_id}"),
+                                                (ipp.ENUM, "job-state", 3)]))
+        elif operation == ipp.GET_JOB_ATTRIBUTES:
+            groups.append((ipp.JOB_ATTRIBUTES, [(ipp.ENUM, "job-state", ipp.COMPLETED),
+                                                (ipp.KEYWORD, "job-state-reasons", "job-completed-successfully")]))
+        else:
+            # server-error-operation-not-supported
+            return ipp.encode_request(0x0501, request_id, groups)
+        return ipp.encode_request(0x0000, request_id, groups)
+
+    async def handle_ipp(self, reader, writer):
+        try:
+            while True:
+                try:
+                    _, headers, body = await self.read_http(reader)
+                except (asyncio.IncompleteReadError, ValueError):
+                    break
+                if len(body) < 8 or not await self.delay():
+                    break
+                payload = self.ipp_response(body)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/ipp\r\n"
+                             b"Content-Length: %d\r\n\r\n" % len(payload) + payload)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # --- 80 HTTP ---
+
+    async def handle_http(self, reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            if await self.delay():
+                body = f"<html><head><title>{self.model} - Web Config</title></head><body></body></html>".encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n"
+                             b"Content-Length: %d\r\nConnection: close\r\n\r\n" % len(body) + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    # --- 161 SNMP ---
+
+    def snmp_values(self):
+        return {snmp.PRINTER_OIDS["sysDescr"]: (snmp.OCTET_STRING, self.model.encode()),
+                snmp.PRINTER_OIDS["hrPrinterStatus"]: (snmp.INTEGER, 3),
+                snmp.PRINTER_OIDS["hrDeviceStatus"]: (snmp.INTEGER, 2),
+                snmp.PRINTER_OIDS["supplyLevel"]: (snmp.INTEGER, 80),
+                snmp.PRINTER_OIDS["serial"]: (snmp.OCTET_STRING, self.serial.encode())}
+
+    def snmp_response(self, data):
+        """GetRequest -> GetResponse, None for anything we do not answer."""
+        try:
+            _, body, _ = snmp.decode_tlv(data)
+            version, community, pdu = snmp.decode_sequence(body)[:3]
+            if pdu[0] != snmp.GET_REQUEST or community[1] != snmp.COMMUNITY.encode():
+                return None
+            rid, _, _, varbinds = snmp.decode_sequence(pdu[1])[:4]
+            oids = [snmp.decode_oid(snmp.decode_sequence(vb)[0][1]) for _, vb in snmp.decode_sequence(varbinds[1])]
+        except (snmp.BerError, ValueError, IndexError):
+            return None
+        known = self.snmp_values()
+        out = b""
+        for oid in oids:
+            tag, value = known.get(oid, (snmp.NO_SUCH_OBJECT, b""))
+            encoded = snmp.encode_int(value) if tag == snmp.INTEGER else snmp.encode_tlv(tag, value)
+            out += snmp.encode_tlv(snmp.SEQUENCE, snmp.encode_oid(oid) + encoded)
+        pdu = snmp.encode_tlv(snmp.GET_RESPONSE, snmp.encode_tlv(*rid) + snmp.encode_int(0) +
+                              snmp.encode_int(0) + snmp.encode_tlv(snmp.SEQUENCE, out))
+        return snmp.encode_tlv(snmp.SEQUENCE, snmp.encode_tlv(*version) + snmp.encode_tlv(*community) + pdu)
+
+
+class SnmpAgent(asyncio.DatagramProtocol):
+    def __init__(self, printer):
+        self.printer = printer
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        reply = self.printer.snmp_response(data)
+        if reply is not None:
+            asyncio.ensure_future(self.answer(reply, addr))
+
+    async def answer(self, reply, addr):
+        if await self.printer.delay():
+            self.transport.sendto(reply, addr)
+
+
+class Fleet:
+    """
+    `size` fake printers in `network`, started on a private event loop
+    thread. Profiles and models are drawn from `seed`, so a given
+    (size, seed) is the same fleet on every run.
+    """
+
+    def __init__(self, size=20, network=FLEET_NET, latency=0.0, loss=0.0, seed=1, profiles=PROFILE_MIX):
+        self.network = ipaddress.ip_network(network)
+        rng = random.Random(seed)
+        hosts = list(self.network.hosts())
+        picked = sorted(rng.sample(hosts, min(size, len(hosts))))
+        self.printers = [FakePrinter(str(ip), rng.choice(MODELS), PROFILES[rng.choice(profiles)],
+                                     latency, loss, random.Random(rng.random())) for ip in picked]
+        self.loop = None
+        self.thread = None
+        self.servers = []
+        self.skipped = []       # (ip, port, error) that could not be bound
+
+    async def _start(self):
+        handlers = {9100: "handle_raw", 631: "handle_ipp", 80: "handle_http"}
+        for printer in self.printers:
+            for port in printer.ports:
+                try:
+                    if port == 161:
+                        transport, _ = await self.loop.create_datagram_endpoint(
+                            lambda p=printer: SnmpAgent(p), local_addr=(printer.ip, port))
+                        self.servers.append(transport)
+                    else:
+                        self.servers.append(await asyncio.start_server(
+                            getattr(printer, handlers[port]), printer.ip, port, backlog=128))
+                except OSError as e:
+                    self.skipped.append((printer.ip, port, str(e)))
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self._start())
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="fake-fleet", daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        async def close():
+            for server in self.servers:
+                server.close()
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(close(), self.loop).result(5)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(5)
+            self.loop.close()
+
+    def expected(self, port=None):
+        """{ip: model} of the printers a scan for `port` (None: any port) should find."""
+        return {p.ip: p.model for p in self.printers
+                if (port is None or port in p.ports) and not any(s[0] == p.ip and s[1] == port for s in self.skipped)}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
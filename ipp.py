@@ -0,0 +1,300 @@
+import os
+import time
+import socket
+import struct
+
+# ==========================================
+# MINIMAL IPP/1.1 CLIENT (No external libs)
+# ==========================================
+# Print-Job with a chunked, streamed document upload, then
+# Get-Job-Attributes polling for the real job state. Unlike raw 9100
+# this gives a job id and a completion signal.
+
+IPP_PORT = 631
+DEFAULT_PATH = "ipp/print"      # Overridden by the DNS-SD "rp" TXT key
+CHUNK = 64 * 1024
+TIMEOUT = 30
+
+# Operations
+PRINT_JOB = 0x0002
+GET_JOB_ATTRIBUTES = 0x0009
+GET_PRINTER_ATTRIBUTES = 0x000B
+
+# Delimiter tags
+OPERATION_ATTRIBUTES = 0x01
+JOB_ATTRIBUTES = 0x02
+END_OF_ATTRIBUTES = 0x03
+PRINTER_ATTRIBUTES = 0x04
+UNSUPPORTED_ATTRIBUTES = 0x05
+GROUPS = {OPERATION_ATTRIBUTES: "operation", JOB_ATTRIBUTES: "job",
+          PRINTER_ATTRIBUTES: "printer", UNSUPPORTED_ATTRIBUTES: "unsupported"}
+
+# Value tags
+INTEGER = 0x21
+BOOLEAN = 0x22
+ENUM = 0x23
+TEXT = 0x41
+NAME = 0x42
+KEYWORD = 0x44
+URI = 0x45
+CHARSET = 0x47
+LANGUAGE = 0x48
+MIME_TYPE = 0x49
+
+# job-state enum
+JOB_STATES = {3: "pending", 4: "pending-held", 5: "processing", 6: "processing-stopped",
+              7: "canceled", 8: "aborted", 9: "completed"}
+FINAL_STATES = (7, 8, 9)
+COMPLETED = 9
+
+
+class IppError(Exception):
+    """Non-successful IPP status (or an HTTP error in front of it)."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class JobFailed(IppError):
+    """The printer accepted the job, then aborted or canceled it."""
+
+
+class Unreachable(IppError):
+    """No connection to the IPP port: nothing was sent."""
+
+
+# --- ENCODER ---
+
+def encode_value(tag, value):
+    if tag in (INTEGER, ENUM):
+        return struct.pack("!i", value)
+    if tag == BOOLEAN:
+        return b"\x01" if value else b"\x00"
+    return value.encode() if isinstance(value, str) else value
+
+
+def encode_attribute(tag, name, value):
+    raw = encode_value(tag, value)
+    return struct.pack("!BH", tag, len(name)) + name.encode() + struct.pack("!H", len(raw)) + raw
+
+
+def encode_request(operation, request_id, groups):
+    """groups: [(delimiter_tag, [(value_tag, name, value), ...]), ...]"""
+    out = bytearray(struct.pack("!BBHI", 1, 1, operation, request_id))
+    for group_tag, attributes in groups:
+        out.append(group_tag)
+        for tag, name, value in attributes:
+            out += encode_attribute(tag, name, value)
+    out.append(END_OF_ATTRIBUTES)
+    return bytes(out)
+
+
+def operation_attributes(printer_uri, extra=()):
+    return [(CHARSET, "attributes-charset", "utf-8"),
+            (LANGUAGE, "attributes-natural-language", "en"),
+            (URI, "printer-uri", printer_uri)] + list(extra)
+
+
+# --- DECODER ---
+
+def decode_value(tag, raw):
+    if tag in (INTEGER, ENUM) and len(raw) == 4:
+        return struct.unpack("!i", raw)[0]
+    if tag == BOOLEAN:
+        return raw != b"\x00"
+    if 0x40 <= tag <= 0x4F:
+        return raw.decode(errors="replace")
+    return raw
+
+
+def decode_response(data):
+    """
+    Returns (status, request_id, {"operation": {...}, "job": {...}, ...}).
+    Multi-valued attributes become lists. Only the first group of each
+    kind is kept (enough for the single-job responses we ask for).
+    """
+    if len(data) < 9:
+        raise IppError("Short IPP response")
+    _, _, status, request_id = struct.unpack("!BBHI", data[:8])
+    groups = {}
+    current = None
+    last = None
+    pos = 8
+    try:
+        while pos < len(data):
+            tag = data[pos]
+            pos += 1
+            if tag == END_OF_ATTRIBUTES:
+                break
+            if tag < 0x10:
+                name = GROUPS.get(tag, str(tag))
+                current = {} if name in groups else groups.setdefault(name, {})
+                continue
+            name_len = struct.unpack("!H", data[pos:pos + 2])[0]
+            name = data[pos + 2:pos + 2 + name_len].decode(errors="replace")
+            pos += 2 + name_len
+            value_len = struct.unpack("!H", data[pos:pos + 2])[0]
+            value = decode_value(tag, data[pos + 2:pos + 2 + value_len])
+            pos += 2 + value_len
+            if current is None:
+                continue
+            if name:
+                current[name] = value
+                last = name
+            elif last is not None:
+                # Empty name: additional value of the previous attribute
+                if not isinstance(current[last], list):
+                    current[last] = [current[last]]
+                current[last].append(value)
+    except struct.error:
+        raise IppError("Truncated IPP response")
+    return status, request_id, groups
+
+
+# --- CLIENT ---
+
+class IppClient:
+    def __init__(self, ip, port=IPP_PORT, path=DEFAULT_PATH, timeout=TIMEOUT):
+        self.ip = ip
+        self.port = port
+        self.path = "/" + (path or "").strip("/")
+        self.timeout = timeout
+        self.printer_uri = f"ipp://{ip}:{port}{self.path}"
+        self._next_id = int.from_bytes(os.urandom(2), "big")
+
+    def request_id(self):
+        self._next_id = (self._next_id + 1) & 0x7FFFFFFF or 1
+        return self._next_id
+
+    def _post(self, body):
+        """POSTs `body` (bytes or an iterable of chunks, sent chunked). Returns the decoded response."""
+        import http.client      # Deferred: costs more than the rest of this module
+        conn = http.client.HTTPConnection(self.ip, self.port, timeout=self.timeout)
+        try:
+            conn.connect()
+        except OSError as e:
+            conn.close()
+            raise Unreachable(f"{self.ip}:{self.port} {e}") from e
+        try:
+            headers = {"Content-Type": "application/ipp"}
+            if isinstance(body, bytes):
+                conn.request("POST", self.path, body, headers)
+            else:
+                conn.request("POST", self.path, body, headers, encode_chunked=True)
+            response = conn.getresponse()
+            data = response.read()
+            if response.status != 200:
+                raise IppError(f"HTTP {response.status} {response.reason}", response.status)
+        finally:
+            conn.close()
+        status, _, groups = decode_response(data)
+        if status >= 0x0400:
+            message = groups.get("operation", {}).get("status-message", "")
+            raise IppError(f"IPP status 0x{status:04x} {message}".strip(), status)
+        return groups
+
+    def print_job(self, path, job_name=None, document_format="application/pdf"):
+        """
+        Print-Job: the request header followed by the file, streamed in
+        chunks (constant memory). Returns {"job_id", "job_uri", "state",
+        "seconds", "bytes"}.
+        """
+        header = encode_request(PRINT_JOB, self.request_id(), [
+            (OPERATION_ATTRIBUTES, operation_attributes(self.printer_uri, [
+                (NAME, "requesting-user-name", os.environ.get("USER", "autoprint")),
+                (NAME, "job-name", job_name or os.path.basename(path)),
+                (MIME_TYPE, "document-format", document_format),
+            ])),
+        ])
+
+        def body():
+            yield header
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK), b""):
+                    yield chunk
+
+        start = time.monotonic()
+        groups = self._post(body())
+        job = groups.get("job", {})
+        if "job-id" not in job:
+            raise IppError("Print-Job response without job-id")
+        return {"job_id": job["job-id"], "job_uri": job.get("job-uri"),
+                "state": job.get("job-state"), "seconds": time.monotonic() - start,
+                "bytes": os.path.getsize(path)}
+
+    def get_job(self, job_id):
+        """Get-Job-Attributes -> {"state", "state_name", "reasons"}."""
+        groups = self._post(encode_request(GET_JOB_ATTRIBUTES, self.request_id(), [
+            (OPERATION_ATTRIBUTES, operation_attributes(self.printer_uri, [
+                (INTEGER, "job-id", job_id),
+                (KEYWORD, "requested-attributes", "job-state"),
+                (KEYWORD, "", "job-state-reasons"),
+            ])),
+        ]))
+        job = groups.get("job", {})
+        state = job.get("job-state")
+        reasons = job.get("job-state-reasons", [])
+        return {"state": state, "state_name": JOB_STATES.get(state, "unknown"),
+                "reasons": reasons if isinstance(reasons, list) else [reasons]}
+
+    def wait(self, job_id, timeout=120, on_state=None):
+        """
+        Polls the job until it reaches a final state or `timeout` passes.
+        Polling starts fast (0.25 s) and backs off to 1 s. `on_state(info)`
+        is called whenever the state changes. Returns (info, seconds).
+        """
+        start = time.monotonic()
+        interval = 0.25
+        last = None
+        while True:
+            info = self.get_job(job_id)
+            if info["state"] != last:
+                last = info["state"]
+                if on_state:
+                    on_state(info)
+            elapsed = time.monotonic() - start
+            if info["state"] in FINAL_STATES or elapsed >= timeout:
+                return info, elapsed
+            time.sleep(min(interval, max(0, timeout - elapsed)))
+            interval = min(1.0, interval * 2)
+
+
+def print_file(ip, path, port=IPP_PORT, resource=None, wait_timeout=120, on_state=None):
+    """
+    Print-Job + completion tracking. Tries `resource`, then ipp/print, then
+    the root path until the printer knows one of them.
+    Returns {"job_id", "state", "state_name", "reasons", "upload", "completion", "bytes"}.
+    """
+    paths = []
+    for p in (resource, DEFAULT_PATH, ""):
+        if p is not None and p.strip("/") not in paths:
+            paths.append(p.strip("/"))
+    for i, p in enumerate(paths):
+        client = IppClient(ip, port, p)
+        try:
+            job = client.print_job(path)
+            break
+        except IppError as e:
+            # 404 / client-error-not-found (0x0406): wrong resource path
+            if i == len(paths) - 1 or e.status not in (404, 0x0406):
+                raise
+    start = time.monotonic()
+    if wait_timeout:
+        try:
+            info, _ = client.wait(job["job_id"], wait_timeout, on_state)
+        except (IppError, OSError) as e:
+            # The job is already accepted: report it as untracked, never resend
+            info = {"state": None, "state_name": f"untracked ({e})", "reasons": []}
+    else:
+        info = {"state": job["state"], "state_name": JOB_STATES.get(job["state"], "unknown"), "reasons": []}
+    return dict(info, job_id=job["job_id"], upload=job["seconds"],
+                completion=job["seconds"] + time.monotonic() - start, bytes=job["bytes"])
+
+
+def is_open(ip, port=IPP_PORT, timeout=1.0):
+    try:
+        with socket.create_connection((ip, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+import contextlib
+from datetime import datetime
+
+# ==========================================
+# STRUCTURED LOG PIPELINE
+# ==========================================
+# log() only puts a record on a queue; one background writer batches the
+# records into ~/autoprint.log as JSON lines and rotates the file by
+# size. This is the one log file shared by autoprint.py and the menu.
+
+LOG_FILE = os.path.expanduser("~/autoprint.log")
+MAX_BYTES = 1024 * 1024         # Rotate above this size
+BACKUPS = 3                     # autoprint.log.1 .. autoprint.log.3
+QUEUE_MAX = 10000               # Records buffered before new ones are dropped
+FLUSH_INTERVAL = 0.5            # Writer wakes at least this often
+BATCH_MAX = 500
+
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def context(**fields):
+    """Adds `fields` (job, stage, ...) to every record logged by this thread inside the block."""
+    previous = getattr(_local, "fields", {})
+    _local.fields = dict(previous, **fields)
+    try:
+        yield
+    finally:
+        _local.fields = previous
+
+
+def make_record(message, level="INFO", **fields):
+    record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "level": level, "msg": str(message)}
+    record.update(getattr(_local, "fields", {}))
+    record.update({k: v for k, v in fields.items() if v is not None})
+    return record
+
+
+class LogPipe:
+    def __init__(self, path=LOG_FILE, max_bytes=MAX_BYTES, backups=BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue = queue.Queue(maxsize=QUEUE_MAX)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._writer, name="log-writer", daemon=True)
+        self.stopping = threading.Event()
+        self.thread.start()
+
+    def emit(self, record):
+        """Never blocks: a full queue drops the record (and counts it)."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    # --- WRITER ---
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _write(self, records):
+        if self.dropped:
+            records.append(make_record(f"{self.dropped} log record(s) dropped (queue full)", "ERROR"))
+            self.dropped = 0
+        data = "".join(json.dumps(r, default=str) + "\n" for r in records)
+        try:
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                size = 0
+            if size and size + len(data) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "a") as f:
+                f.write(data)
+        except OSError:
+            pass
+
+    def _writer(self):
+        while True:
+            try:
+                records = [self.queue.get(timeout=FLUSH_INTERVAL)]
+            except queue.Empty:
+                if self.stopping.is_set():
+                    return
+                continue
+            # Everything that queued up meanwhile goes out in one write
+            while len(records) < BATCH_MAX:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(records)
+            for _ in records:
+                self.queue.task_done()
+
+    def flush(self, timeout=2.0):
+        """Waits (bounded) until everything queued so far is on disk."""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self):
+        self.flush()
+        self.stopping.set()
+        self.thread.join(timeout=2 * FLUSH_INTERVAL)
+
+
+_pipe = None
+_pipe_lock = threading.Lock()
+
+
+def get_pipe():
+    """The process-wide pipe, started on first use and flushed at exit."""
+    global _pipe
+    with _pipe_lock:
+        if _pipe is None:
+            _pipe = LogPipe()
+            atexit.register(_pipe.close)
+        return _pipe
+
+
+def log(message, level="INFO", **fields):
+    get_pipe().emit(make_record(message, level, **fields))
+
+
+# --- READERS ---
+
+def parse(line):
+    """One log line -> record dict. Plain-text lines from old versions become {"msg": ...}."""
+    line = line.rstrip("\n")
+    try:
+        record = json.loads(line)
+        if isinstance(record, dict):
+            return record
+    except ValueError:
+        pass
+    return {"msg": line}
+
+
+def matches(record, level=None, job=None):
+    """Filter for the viewers: exact level, job id prefix."""
+    if level and record.get("level", "").upper() != level.upper():
+        return False
+    if job and not str(record.get("job", "")).startswith(job):
+        return False
+    return True
+
+
+def tail_lines(path, n=20, block=8192):
+    """Last `n` lines, read backwards block by block (cost independent of the file size)."""
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return []
+    with f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.decode(errors="replace").splitlines()
+    return lines[-n:] if n else []
+
+
+def _watch(path, changed):
+    """inotify (via watchdog) wake-ups for `path`; None when watchdog is unavailable."""
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return None
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if path in (event.src_path, getattr(event, "dest_path", None)):
+                changed.set()
+
+    observer = Observer()
+    observer.schedule(Handler(), os.path.dirname(path) or ".", recursive=False)
+    observer.daemon = True
+    observer.start()
+    return observer
+
+
+def follow(path, poll=0.5):
+    """
+    Generator over lines appended to `path` from now on. Sleeps on
+    inotify events instead of polling (falls back to `poll` seconds
+    without watchdog) and reopens the file when it is rotated.
+    """
+    changed = threading.Event()
+    observer = _watch(os.path.abspath(path), changed)
+    # With inotify the timeout is only a safety net against missed events
+    wait = 5.0 if observer else poll
+    f = None
+    first = True
+    partial = ""
+    try:
+        while True:
+            changed.clear()
+            if f is None:
+                try:
+                    f = open(path, "r")
+                except OSError:
+                    changed.wait(wait)
+                    continue
+                if first:
+                    f.seek(0, os.SEEK_END)    # The backlog comes from tail_lines()
+                first = False
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                if not line.endswith("\n"):
+                    partial += line     # Writer is mid-line, finish it next round
+                    break
+                yield partial + line
+                partial = ""
+            try:
+                if os.stat(path).st_ino != os.fstat(f.fileno()).st_ino:
+                    # Rotated: drain done above, continue with the new file from its start
+                    f.close()
+                    f = None
+                    continue
+            except OSError:
+                pass
+            changed.wait(wait)
+    finally:
+        if f is not None:
+            f.close()
+        if observer is not None:
+            observer.stop()
+
+
+def format_record(record, colors=None):
+    """Human-readable line: "12:01:02 [INFO] msg  job=... stage=..."."""
+    level = record.get("level", "")
+    color = (colors or {}).get(level, "")
+    reset = (colors or {}).get("RESET", "")
+    ts = record.get("ts", "")[11:19]
+    extra = " ".join(f"{k}={v}" for k, v in record.items() if k not in ("ts", "level", "msg"))
+    head = f"{ts} {color}[{level}]{reset} " if level else ""
+    return f"{head}{record.get('msg', '')}" + (f"  {extra}" if extra else "")
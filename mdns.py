@@ -0,0 +1,256 @@
+import os
+import select
+import socket
+import struct
+import time
+
+# ==========================================
+# PASSIVE PRINTER DISCOVERY (mDNS / DNS-SD)
+# ==========================================
+# One DNS-SD query for the printer service types, then we just listen.
+# The query is sent from an ephemeral port ("legacy unicast", RFC 6762
+# 6.7), so responders answer us directly and nothing needs port 5353.
+
+MDNS_ADDR = "224.0.0.251"
+MDNS_PORT = 5353
+BROWSE_TIMEOUT = 2.0
+
+# Service type -> protocol name (same names as scan.TARGET_PORTS)
+SERVICES = {
+    "_ipp._tcp.local":            "IPP",
+    "_ipps._tcp.local":           "IPPS",
+    "_pdl-datastream._tcp.local": "RAW",
+}
+
+# DNS record types / classes
+TYPE_A = 1
+TYPE_PTR = 12
+TYPE_TXT = 16
+TYPE_SRV = 33
+CLASS_IN = 1
+UNICAST_RESPONSE = 0x8000   # "QU" bit in the question class
+CACHE_FLUSH = 0x8000        # Same bit in a record class
+
+
+class DnsError(ValueError):
+    """Malformed or truncated DNS message."""
+
+
+# --- ENCODER ---
+
+def encode_name(name):
+    out = bytearray()
+    for label in name.strip(".").split("."):
+        raw = label.encode()
+        if not 0 < len(raw) < 64:
+            raise DnsError(f"Bad label in {name}")
+        out += bytes([len(raw)]) + raw
+    return bytes(out + b"\x00")
+
+
+def encode_query(names, qtype=TYPE_PTR, query_id=0):
+    """One message asking for every name in `names`, unicast replies requested."""
+    header = struct.pack("!6H", query_id, 0, len(names), 0, 0, 0)
+    questions = b"".join(encode_name(n) + struct.pack("!2H", qtype, CLASS_IN | UNICAST_RESPONSE)
+                         for n in names)
+    return header + questions
+
+
+# --- DECODER ---
+
+def decode_name(data, pos):
+    """Returns (name, next_pos), following compression pointers."""
+    labels = []
+    end = None
+    jumps = 0
+    try:
+        while True:
+            length = data[pos]
+            if length & 0xC0 == 0xC0:
+                if end is None:
+                    end = pos + 2
+                pos = ((length & 0x3F) << 8) | data[pos + 1]
+                jumps += 1
+                if jumps > 32:
+                    raise DnsError("Compression loop")
+                continue
+            pos += 1
+            if length == 0:
+                break
+            labels.append(data[pos:pos + length].decode(errors="replace"))
+            pos += length
+    except IndexError:
+        raise DnsError("Truncated name")
+    return ".".join(labels), end if end is not None else pos
+
+
+def decode_txt(rdata):
+    """TXT rdata -> {key: value}. Keys are case-insensitive per DNS-SD."""
+    txt = {}
+    pos = 0
+    while pos < len(rdata):
+        length = rdata[pos]
+        entry = rdata[pos + 1:pos + 1 + length].decode(errors="replace")
+        pos += 1 + length
+        if entry:
+            key, _, value = entry.partition("=")
+            txt.setdefault(key.lower(), value)
+    return txt
+
+
+def decode_message(data):
+    """
+    Parses every resource record of a response (answers, authority and
+    additionals alike - responders put SRV/TXT/A in the additionals).
+    Returns [(name, type, value), ...] where value is a str (PTR/A),
+    (target, port) for SRV or a dict for TXT. Unknown types are skipped.
+    """
+    if len(data) < 12:
+        raise DnsError("Short header")
+    _, flags, qdcount, ancount, nscount, arcount = struct.unpack("!6H", data[:12])
+    if not flags & 0x8000:
+        raise DnsError("Not a response")
+    pos = 12
+    for _ in range(qdcount):
+        _, pos = decode_name(data, pos)
+        pos += 4
+    records = []
+    for _ in range(ancount + nscount + arcount):
+        name, pos = decode_name(data, pos)
+        if pos + 10 > len(data):
+            raise DnsError("Truncated record")
+        rtype, _, _, rdlength = struct.unpack("!2HIH", data[pos:pos + 10])
+        pos += 10
+        rdata = data[pos:pos + rdlength]
+        if len(rdata) < rdlength:
+            raise DnsError("Truncated rdata")
+        if rtype == TYPE_PTR:
+            records.append((name, rtype, decode_name(data, pos)[0]))
+        elif rtype == TYPE_SRV and rdlength >= 6:
+            port = struct.unpack("!H", rdata[4:6])[0]
+            records.append((name, rtype, (decode_name(data, pos + 6)[0], port)))
+        elif rtype == TYPE_TXT:
+            records.append((name, rtype, decode_txt(rdata)))
+        elif rtype == TYPE_A and rdlength == 4:
+            records.append((name, rtype, socket.inet_ntoa(rdata)))
+        pos += rdlength
+    return records
+
+
+# --- RESOLUTION ---
+
+class Browser:
+    """Collects records from every response and resolves them into printers."""
+
+    def __init__(self, services=SERVICES):
+        self.services = {s.lower(): p for s, p in services.items()}
+        self.instances = {}     # instance name -> service type
+        self.srv = {}           # instance name -> (target host, port)
+        self.txt = {}           # instance name -> {key: value}
+        self.hosts = {}         # host name -> IPv4
+        self.sources = {}       # instance name -> address the answer came from
+
+    def feed(self, data, source=None):
+        try:
+            records = decode_message(data)
+        except DnsError:
+            return
+        for name, rtype, value in records:
+            key = name.lower()
+            if rtype == TYPE_PTR and key in self.services:
+                self.instances[value.lower()] = key
+                if source:
+                    self.sources.setdefault(value.lower(), source)
+            elif rtype == TYPE_SRV:
+                self.srv[key] = value
+            elif rtype == TYPE_TXT:
+                self.txt[key] = value
+            elif rtype == TYPE_A:
+                self.hosts[key] = value
+            if source and rtype in (TYPE_SRV, TYPE_TXT):
+                self.sources.setdefault(key, source)
+
+    def unresolved(self):
+        """SRV targets we still have no address for."""
+        return sorted({self.srv[i][0] for i in self.instances
+                       if i in self.srv and self.srv[i][0].lower() not in self.hosts})
+
+    def devices(self):
+        """
+        One device dict per printer (same shape as scan.py's identify()),
+        with the DNS-SD extras "model", "pdl" and "rp". A printer that
+        advertises several services is merged into one entry by IP.
+        """
+        by_ip = {}
+        for instance, service in sorted(self.instances.items()):
+            if instance not in self.srv:
+                continue
+            target, port = self.srv[instance]
+            ip = self.hosts.get(target.lower()) or self.sources.get(instance)
+            if not ip:
+                continue
+            txt = self.txt.get(instance, {})
+            model = txt.get("ty") or txt.get("product", "").strip("()") or None
+            dev = by_ip.setdefault(ip, {
+                "ip": ip, "name": instance[:-len(service) - 1] if instance.endswith(service) else instance,
+                "ports": [], "mac": "", "protocols": [], "source": "mdns",
+            })
+            if port not in dev["ports"]:
+                dev["ports"].append(port)
+            if self.services[service] not in dev["protocols"]:
+                dev["protocols"].append(self.services[service])
+            if model:
+                dev.setdefault("model", model)
+                dev["name"] = dev["model"]
+            if txt.get("pdl"):
+                pdl = dev.setdefault("pdl", [])
+                pdl.extend(f for f in txt["pdl"].split(",") if f and f not in pdl)
+            if "rp" in txt:
+                # Resource path of the IPP queue, e.g. ipp://<ip>:631/ipp/print
+                dev.setdefault("rp", txt["rp"])
+        return sorted(by_ip.values(), key=lambda d: socket.inet_aton(d["ip"]))
+
+
+# --- BROWSE ---
+
+def browse(timeout=BROWSE_TIMEOUT, services=SERVICES, addr=(MDNS_ADDR, MDNS_PORT), interface=None):
+    """
+    Sends one DNS-SD query for `services` and listens for `timeout` seconds.
+    Returns a list of device dicts. `addr` can point at a local responder
+    (e.g. ("127.0.0.1", 5353)); `interface` is the local IP to multicast from.
+    """
+    browser = Browser(services)
+    query_id = int.from_bytes(os.urandom(2), "big")
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.setblocking(False)
+        try:
+            s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 255)
+            if interface:
+                s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+        except OSError:
+            pass
+        try:
+            s.sendto(encode_query(list(services), TYPE_PTR, query_id), addr)
+        except OSError:
+            return []
+
+        asked = set()
+        deadline = time.monotonic() + timeout
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0 or not select.select([s], [], [], left)[0]:
+                break
+            try:
+                data, src = s.recvfrom(9000)
+            except OSError:
+                continue
+            browser.feed(data, src[0])
+            # Responders may leave out the A record: ask for it once
+            missing = [h for h in browser.unresolved() if h not in asked]
+            if missing:
+                asked.update(missing)
+                try:
+                    s.sendto(encode_query(missing, TYPE_A, query_id), addr)
+                except OSError:
+                    pass
+    return browser.devices()
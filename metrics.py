@@ -0,0 +1,183 @@
+import time
+import random
+import threading
+import contextlib
+
+# ==========================================
+# IN-PROCESS METRICS
+# ==========================================
+# Latency histograms (p50/p95/p99 over a bounded sample), counters and
+# queue-depth gauges for every pipeline stage, so a slow print can be
+# pinned on detection, conversion, transfer or the printer itself.
+# Exposed by the preview server as /metrics (Prometheus text) and
+# /metrics.json (read by the menu's Statistics entry).
+
+RESERVOIR = 1024        # Samples kept per histogram (uniform reservoir)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Histogram:
+    """Count, sum and max are exact; quantiles come from a reservoir sample."""
+
+    def __init__(self, size=RESERVOIR):
+        self.size = size
+        self.samples = []
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+        else:
+            # Algorithm R: every observation has the same chance to be kept
+            i = random.randrange(self.count)
+            if i < self.size:
+                self.samples[i] = value
+
+    def snapshot(self):
+        ordered = sorted(self.samples)
+        out = {"count": self.count, "sum": self.sum, "max": self.max}
+        for q in QUANTILES:
+            out[f"p{round(q * 100)}"] = ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}    # key -> number or callable (read at snapshot time)
+        self.started = time.time()
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            key = _key(name, labels)
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    def inc(self, name, n=1, **labels):
+        with self.lock:
+            key = _key(name, labels)
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[_key(name, labels)] = value
+
+    def snapshot(self):
+        """{"uptime", "histograms", "counters", "gauges"}, each a list of {"name", "labels", ...}."""
+        with self.lock:
+            histograms = [dict(h.snapshot(), name=k[0], labels=dict(k[1])) for k, h in self.histograms.items()]
+            counters = [{"name": k[0], "labels": dict(k[1]), "value": v} for k, v in self.counters.items()]
+            gauges = list(self.gauges.items())
+        values = []
+        for (name, labels), value in gauges:
+            try:
+                value = value() if callable(value) else value
+            except Exception:
+                continue
+            values.append({"name": name, "labels": dict(labels), "value": value})
+        return {"uptime": time.time() - self.started, "histograms": sorted(histograms, key=_order),
+                "counters": sorted(counters, key=_order), "gauges": sorted(values, key=_order)}
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.started = time.time()
+
+
+def _order(entry):
+    return entry["name"], sorted(entry["labels"].items())
+
+
+# --- MODULE-LEVEL REGISTRY ---
+
+registry = Registry()
+
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+
+def inc(name, n=1, **labels):
+    registry.inc(name, n, **labels)
+
+
+def gauge(name, value, **labels):
+    """`value` may be a callable, e.g. a queue's depth method."""
+    registry.gauge(name, value, **labels)
+
+
+@contextlib.contextmanager
+def timer(name, **labels):
+    """Observes the block's wall time in seconds, also when it raises."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.monotonic() - start, **labels)
+
+
+def snapshot():
+    return registry.snapshot()
+
+
+# --- EXPORT ---
+
+def _labels(labels, extra=None):
+    items = sorted(labels.items()) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def prometheus_text(snap=None):
+    """Prometheus text exposition format 0.0.4 (histograms as summaries)."""
+    snap = snap or snapshot()
+    lines = ["# TYPE autoprint_uptime_seconds gauge", f"autoprint_uptime_seconds {snap['uptime']:.3f}"]
+    typed = set()
+
+    def header(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for h in snap["histograms"]:
+        header(h["name"], "summary")
+        for q in QUANTILES:
+            lines.append(f"{h['name']}{_labels(h['labels'], ('quantile', q))} {h[f'p{round(q * 100)}']:.6g}")
+        lines.append(f"{h['name']}_sum{_labels(h['labels'])} {h['sum']:.6g}")
+        lines.append(f"{h['name']}_count{_labels(h['labels'])} {h['count']}")
+    for c in snap["counters"]:
+        header(c["name"], "counter")
+        lines.append(f"{c['name']}{_labels(c['labels'])} {c['value']}")
+    for g in snap["gauges"]:
+        header(g["name"], "gauge")
+        lines.append(f"{g['name']}{_labels(g['labels'])} {g['value']}")
+    return "\n".join(lines) + "\n"
+
+
+def format_table(snap):
+    """Plain-text summary for terminals: one line per series."""
+    lines = []
+    for h in snap["histograms"]:
+        label = " ".join(f"{k}={v}" for k, v in h["labels"].items())
+        lines.append(f"{h['name']} {label}".strip().ljust(44) +
+                     f" n={h['count']:<6} p50={h['p50'] * 1000:8.1f}ms p95={h['p95'] * 1000:8.1f}ms "
+                     f"p99={h['p99'] * 1000:8.1f}ms max={h['max'] * 1000:8.1f}ms")
+    for entry in snap["counters"] + snap["gauges"]:
+        label = " ".join(f"{k}={v}" for k, v in entry["labels"].items())
+        lines.append(f"{entry['name']} {label}".strip().ljust(44) + f" {entry['value']}")
+    return lines
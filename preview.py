@@ -0,0 +1,272 @@
+import os
+import re
+import json
+import html
+import time
+import threading
+from datetime import datetime
+from urllib.parse import unquote, quote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import metrics
+
+# ==========================================
+# PREVIEW SERVER
+# ==========================================
+# One long-lived threaded HTTP server for every job: an index of recent
+# jobs, the PDFs themselves (with Range support so viewers can seek in
+# large files) and a JPEG thumbnail per job, generated once and cached.
+# /metrics and /metrics.json expose the daemon's pipeline metrics.
+# Nothing here changes the working directory.
+
+PREVIEW_PORT = 8080
+THUMB_DIR = os.path.expanduser("~/.autoprint_thumbs")
+INDEX_NAME = "jobs.json"
+THUMB_SIZE = (320, 320)
+MAX_JOBS = 100
+CHUNK = 64 * 1024
+
+PDF_NAME_RE = re.compile(r"^[\w.-]+\.pdf$")
+
+
+class JobIndex:
+    """Recent jobs (newest first), persisted next to the thumbnails."""
+
+    def __init__(self, directory, thumb_dir=THUMB_DIR, max_jobs=MAX_JOBS):
+        self.directory = directory
+        self.thumb_dir = thumb_dir
+        self.max_jobs = max_jobs
+        self.path = os.path.join(thumb_dir, INDEX_NAME)
+        self.lock = threading.Lock()
+        self.thumb_lock = threading.Lock()
+        os.makedirs(thumb_dir, exist_ok=True)
+        try:
+            with open(self.path) as f:
+                self.jobs = json.load(f)
+        except (OSError, ValueError):
+            self.jobs = []
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.jobs, f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def add(self, pdf_path, sources):
+        name = os.path.basename(pdf_path)
+        with self.lock:
+            self.jobs = [j for j in self.jobs if j["name"] != name]
+            self.jobs.insert(0, {"name": name, "sources": list(sources), "created": time.time(),
+                                 "status": "converted"})
+            for dropped in self.jobs[self.max_jobs:]:
+                try:
+                    os.remove(self.thumb_path(dropped["name"]))
+                except OSError:
+                    pass
+            del self.jobs[self.max_jobs:]
+            self._save()
+
+    def set_status(self, pdf_path, status):
+        name = os.path.basename(pdf_path)
+        with self.lock:
+            for job in self.jobs:
+                if job["name"] == name:
+                    job["status"] = status
+                    self._save()
+                    break
+
+    def get(self, name):
+        with self.lock:
+            for job in self.jobs:
+                if job["name"] == name:
+                    return dict(job)
+        return None
+
+    def recent(self):
+        with self.lock:
+            return [dict(j) for j in self.jobs]
+
+    # --- THUMBNAILS ---
+
+    def thumb_path(self, name):
+        return os.path.join(self.thumb_dir, f"{name}.jpg")
+
+    def thumbnail(self, name):
+        """
+        Path of the job's thumbnail, generated from its first image on first
+        use. None unless `name` is a job in the index.
+        """
+        if not PDF_NAME_RE.match(name) or os.path.basename(name) != name:
+            return None
+        job = self.get(name)
+        if not job:
+            return None
+        path = self.thumb_path(name)
+        # Never serve anything outside the thumbnail directory
+        if os.path.dirname(os.path.realpath(path)) != os.path.realpath(self.thumb_dir):
+            return None
+        if os.path.exists(path):
+            return path
+        if not job["sources"]:
+            return None
+        with self.thumb_lock:
+            if os.path.exists(path):
+                return path
+            try:
+                from PIL import Image, ImageOps     # Deferred until the first thumbnail
+                img = Image.open(job["sources"][0])
+                img.draft("RGB", THUMB_SIZE)
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail(THUMB_SIZE)
+                tmp = path + ".tmp"
+                img.convert("RGB").save(tmp, "JPEG", quality=80)
+                os.replace(tmp, path)
+            except (OSError, ValueError):
+                return None
+        return path
+
+
+class PreviewHandler(BaseHTTPRequestHandler):
+    server_version = "AutoPrintPreview/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.do_GET(head_only=True)
+
+    def do_GET(self, head_only=False):
+        path = unquote(self.path.split("?", 1)[0])
+        if path in ("/", "/index.html"):
+            return self.send_index(head_only)
+        if path == "/metrics":
+            return self.send_body(metrics.prometheus_text().encode(), "text/plain; version=0.0.4", head_only)
+        if path == "/metrics.json":
+            return self.send_body(json.dumps(metrics.snapshot()).encode(), "application/json", head_only)
+        if path.startswith("/thumb/") and path.endswith(".jpg"):
+            thumb = self.server.jobs.thumbnail(path[len("/thumb/"):-len(".jpg")])
+            if thumb:
+                return self.send_file(thumb, "image/jpeg", head_only)
+            return self.send_error(404)
+        name = path.lstrip("/")
+        # Only PDFs directly in the output directory, nothing else from $HOME
+        if PDF_NAME_RE.match(name):
+            return self.send_file(os.path.join(self.server.directory, name), "application/pdf", head_only)
+        self.send_error(404)
+
+    def send_index(self, head_only):
+        rows = []
+        for job in self.server.jobs.recent():
+            name = html.escape(job["name"])
+            link = quote(job["name"])
+            when = datetime.fromtimestamp(job["created"]).strftime("%d %b %H:%M:%S")
+            try:
+                size = f"{os.path.getsize(os.path.join(self.server.directory, job['name'])) / 1e6:.2f} MB"
+            except OSError:
+                size = "gone"
+            rows.append(f'<tr><td><a href="/{link}"><img src="/thumb/{link}.jpg" alt="" height="96"></a></td>'
+                        f'<td><a href="/{link}">{name}</a></td><td>{when}</td>'
+                        f'<td>{len(job["sources"])}</td><td>{size}</td><td>{html.escape(job["status"])}</td></tr>')
+        body = ("<!doctype html><html><head><meta charset='utf-8'><title>AutoPrint Jobs</title>"
+                "<meta http-equiv='refresh' content='10'></head><body><h1>Recent jobs</h1>"
+                "<table cellpadding='6'><tr><th></th><th>PDF</th><th>Time</th><th>Images</th>"
+                "<th>Size</th><th>Status</th></tr>" + "".join(rows) + "</table></body></html>").encode()
+        self.send_body(body, "text/html; charset=utf-8", head_only)
+
+    def send_body(self, body, content_type, head_only):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+    def send_file(self, path, content_type, head_only):
+        """Whole file or a single byte range (RFC 7233), streamed with sendfile."""
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return self.send_error(404)
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            start, end = 0, size - 1
+            status = 200
+            range_header = self.headers.get("Range")
+            if range_header:
+                match = re.match(r"^bytes=(\d*)-(\d*)$", range_header.strip())
+                if not match or not (match.group(1) or match.group(2)):
+                    return self.send_range_error(size)
+                if match.group(1):
+                    start = int(match.group(1))
+                    if match.group(2):
+                        end = min(int(match.group(2)), size - 1)
+                else:
+                    # Suffix range: the last N bytes
+                    start = max(0, size - int(match.group(2)))
+                if start > end:
+                    return self.send_range_error(size)
+                status = 206
+            length = end - start + 1
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(length))
+            self.send_header("Last-Modified", self.date_time_string(os.fstat(f.fileno()).st_mtime))
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.end_headers()
+            if head_only or length <= 0:
+                return
+            try:
+                self.wfile.flush()
+                self.connection.sendfile(f, offset=start, count=length)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    def send_range_error(self, size):
+        self.send_response(416)
+        self.send_header("Content-Range", f"bytes */{size}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class PreviewServer:
+    """Started once per process; jobs are added as they are converted."""
+
+    def __init__(self, directory, port=PREVIEW_PORT, host="", thumb_dir=THUMB_DIR):
+        self.directory = directory
+        self.port = port
+        self.host = host
+        self.jobs = JobIndex(directory, thumb_dir)
+        self.httpd = None
+        self.thread = None
+
+    def start(self):
+        """Binds and serves in a daemon thread. Raises OSError if the port is taken."""
+        self.httpd = ThreadingHTTPServer((self.host, self.port), PreviewHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.directory = self.directory
+        self.httpd.jobs = self.jobs
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="preview-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def url(self, pdf_path=None):
+        base = f"http://localhost:{self.port}/"
+        return base + quote(os.path.basename(pdf_path)) if pdf_path else base
+
+    def add_job(self, pdf_path, sources):
+        self.jobs.add(pdf_path, sources)
+
+    def set_status(self, pdf_path, status):
+        self.jobs.set_status(pdf_path, status)
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
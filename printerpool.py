@@ -0,0 +1,182 @@
+import os
+import time
+import threading
+
+import snmp
+from retry import BLOCKING_STATUS, backoff
+
+# ==========================================
+# PRINTER POOL (Load-aware routing)
+# ==========================================
+# Jobs go to the least-busy healthy printer instead of the one
+# printer_ip. A printer is healthy unless its cached SNMP status says
+# the device is down (jam, door open, no paper), or it failed a job recently (then it sits out a
+# backoff that grows with every consecutive failure). Only a printer's
+# first status check is waited for; later ones run in the background.
+# Among healthy printers the one with the fewest jobs in flight wins; an
+# idle printer beats one that reports "printing". A pool of one is
+# always tried: there is nothing to fail over to, and the send itself is
+# the best health check.
+#
+# Affinity: a watched folder can prefer some printers. They are tried
+# first; the rest of the pool is the failover.
+#
+# Config:
+#   "printers":         ["192.168.1.50", "192.168.1.51"]  (default: [printer_ip])
+#   "printer_affinity": {"/storage/emulated/0/Bluetooth": ["192.168.1.51"]}
+
+STATUS_TTL = 15         # Seconds an SNMP status stays cached
+SNMP_TIMEOUT = 0.5
+FAIL_BASE = 10          # First time out after a failed job
+FAIL_CAP = 5 * 60
+
+# printer_status() codes that count as busy (not blocking)
+BUSY_STATUS = (4, 5)    # Printing, warming up
+
+
+class PrinterPool:
+    """
+    `members()` returns the current printer IPs and `affinity()` the
+    {folder: [ip, ...]} map; both are read fresh on every choice, so
+    config edits apply to the next job.
+    """
+
+    def __init__(self, members, affinity=None, log=None, status_ttl=STATUS_TTL):
+        self.members = members
+        self.affinity = affinity or (lambda: {})
+        self.log = log or (lambda message, level="INFO", **fields: print(f"[{level}] {message}"))
+        self.status_ttl = status_ttl
+        self.lock = threading.Lock()
+        self.printers = {}          # ip -> state, see _state()
+        self.snmp = snmp.SnmpClient(timeout=SNMP_TIMEOUT, retries=1)
+        self.refresher = None
+
+    def _state(self, ip):
+        if ip not in self.printers:
+            self.printers[ip] = {"in_flight": 0, "sent": 0, "failures": 0, "down_until": 0,
+                                 "status": None, "status_text": None, "checked": 0, "seen": False,
+                                 "last_used": 0}
+        return self.printers[ip]
+
+    # --- STATUS CACHE ---
+
+    def refresh(self, ips=None, force=False):
+        """One SNMP round trip for every printer whose cached status is stale."""
+        now = time.monotonic()
+        with self.lock:
+            ips = list(ips if ips is not None else self.members())
+            stale = [ip for ip in ips if force or now - self._state(ip)["checked"] >= self.status_ttl]
+            for ip in stale:
+                self._state(ip)["checked"] = now    # Concurrent callers do not query it twice
+        if not stale:
+            return
+        values = self.snmp.get_many(stale, snmp.STATUS_OIDS)
+        with self.lock:
+            for ip in stale:
+                state = self._state(ip)
+                state["seen"] = True
+                code, text = snmp.printer_status(values.get(ip))
+                # No SNMP answer says nothing about health: failures still count
+                state["status"] = code if ip in values else None
+                state["status_text"] = text if ip in values else None
+
+    def refresh_later(self, ips):
+        """refresh() on a background thread: a silent printer's SNMP timeout never delays a send."""
+        now = time.monotonic()
+        with self.lock:
+            if not any(now - self._state(ip)["checked"] >= self.status_ttl for ip in ips):
+                return
+            if self.refresher is not None and self.refresher.is_alive():
+                return
+            self.refresher = threading.Thread(target=self.refresh, args=(list(ips),), name="pool-status", daemon=True)
+            self.refresher.start()
+
+    def healthy(self, ip, now=None):
+        state = self._state(ip)
+        if state["status"] in BLOCKING_STATUS:
+            return False
+        return (now or time.monotonic()) >= state["down_until"]
+
+    # --- ROUTING ---
+
+    def preferred(self, source_dir):
+        """Printers the affinity map assigns to `source_dir` (longest matching folder wins)."""
+        if not source_dir:
+            return []
+        source_dir = os.path.abspath(source_dir)
+        best, ips = -1, []
+        for folder, targets in self.affinity().items():
+            folder = os.path.abspath(os.path.expanduser(folder))
+            if (source_dir == folder or source_dir.startswith(folder + os.sep)) and len(folder) > best:
+                best, ips = len(folder), [targets] if isinstance(targets, str) else list(targets)
+        return ips
+
+    def choose(self, source_dir=None, exclude=()):
+        """
+        Least-busy healthy printer, affinity printers first. None when
+        every printer is excluded, or down while there is a choice.
+        """
+        members = list(dict.fromkeys(self.members()))
+        preferred = [ip for ip in self.preferred(source_dir) if ip not in exclude]
+        candidates = [ip for ip in members if ip not in exclude]
+        # An affinity printer outside "printers" is still a valid target
+        candidates += [ip for ip in preferred if ip not in candidates]
+        if not candidates:
+            return None
+        with self.lock:
+            unseen = [ip for ip in candidates if not self._state(ip)["seen"]]
+        if unseen:
+            self.refresh(unseen)
+        self.refresh_later(candidates)
+        now = time.monotonic()
+        with self.lock:
+            healthy = [ip for ip in candidates if self.healthy(ip, now)]
+            if not healthy:
+                return candidates[0] if len(candidates) == 1 and not exclude else None
+            group = [ip for ip in preferred if ip in healthy] or healthy
+
+            def load(ip):
+                state = self._state(ip)
+                return (state["in_flight"], state["status"] in BUSY_STATUS, state["last_used"])
+            return min(group, key=load)
+
+    def acquire(self, ip):
+        with self.lock:
+            state = self._state(ip)
+            state["in_flight"] += 1
+            state["last_used"] = time.monotonic()
+
+    def release(self, ip, ok):
+        """Ends a send. A failure takes the printer out of rotation for a while."""
+        with self.lock:
+            state = self._state(ip)
+            state["in_flight"] = max(0, state["in_flight"] - 1)
+            if ok:
+                state["sent"] += 1
+                state["failures"] = 0
+                state["down_until"] = 0
+                return
+            state["failures"] += 1
+            delay = backoff(state["failures"], FAIL_BASE, FAIL_CAP)
+            state["down_until"] = time.monotonic() + delay
+            state["checked"] = 0    # Status re-read on the next choice
+        self.log(f"Printer {ip} out of rotation for {delay:.0f}s "
+                 f"({state['failures']} failure(s) in a row)", "ERROR")
+
+    # --- REPORTING ---
+
+    def in_flight(self, ip):
+        with self.lock:
+            return self._state(ip)["in_flight"]
+
+    def snapshot(self):
+        """[{"ip", "healthy", "in_flight", "sent", "failures", "status", "down_for"}] for the pool members."""
+        now = time.monotonic()
+        with self.lock:
+            out = []
+            for ip in dict.fromkeys(list(self.members()) + list(self.printers)):
+                state = self._state(ip)
+                out.append({"ip": ip, "healthy": self.healthy(ip, now), "in_flight": state["in_flight"],
+                            "sent": state["sent"], "failures": state["failures"],
+                            "status": state["status_text"], "down_for": max(0, state["down_until"] - now)})
+            return out
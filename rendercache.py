@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+# ==========================================
+# RENDER CACHE & DUPLICATE SUPPRESSION
+# ==========================================
+# PDFs are stored under a key made of the source images' content hashes
+# plus every render parameter, so a reprint of a recent photo is a file
+# copy instead of a conversion. The same content arriving twice within a
+# short window (both watched folders, repeated create events) is dropped.
+
+CACHE_DIR = os.path.expanduser("~/.autoprint_render_cache")
+MAX_BYTES = 200 * 1000 * 1000
+DEDUP_WINDOW = 60       # Seconds in which the same image counts as a duplicate
+CHUNK = 1024 * 1024
+
+
+def hash_file(path):
+    """SHA-256 of the file content, read in chunks (photos can be large)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(hashes, params):
+    """Content hashes (in page order) + render parameters -> cache key."""
+    blob = json.dumps({"images": list(hashes), "params": params}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class RenderCache:
+    """Content-addressed PDF store, evicted least-recently-used by total size."""
+
+    def __init__(self, path=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.pdf")
+
+    def get(self, key, dest):
+        """Copies the cached PDF to `dest`. Returns False on a miss."""
+        cached = self._file(key)
+        with self.lock:
+            try:
+                shutil.copyfile(cached, dest)
+                os.utime(cached)    # mtime doubles as the LRU clock
+                return True
+            except OSError:
+                return False
+
+    def put(self, key, pdf_path):
+        if self.max_bytes <= 0:
+            return
+        tmp = self._file(key) + ".tmp"
+        with self.lock:
+            try:
+                shutil.copyfile(pdf_path, tmp)
+                os.replace(tmp, self._file(key))
+            except OSError:
+                return
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(".pdf"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+                total -= size
+            except OSError:
+                pass
+
+
+class Deduper:
+    """Remembers content hashes for `window` seconds; seen() is True for a repeat."""
+
+    def __init__(self, window=DEDUP_WINDOW):
+        self.window = float(window)
+        self.seen_at = {}
+        self.lock = threading.Lock()
+
+    def seen(self, digest, now=None):
+        now = now or time.monotonic()
+        with self.lock:
+            for old, at in list(self.seen_at.items()):
+                if now - at > self.window:
+                    del self.seen_at[old]
+            if digest in self.seen_at:
+                return True
+            self.seen_at[digest] = now
+            return False
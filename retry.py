@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import random
+import threading
+
+import snmp
+
+# ==========================================
+# FAILED JOB RESUBMISSION
+# ==========================================
+# Watches FAILED_DIR and resubmits its PDFs, oldest first, once the
+# printer answers again. Waiting uses exponential backoff with jitter,
+# and a one-PDU SNMP status check gates every attempt so a jammed or
+# offline printer is not flooded with jobs.
+
+POLL_INTERVAL = 5       # Seconds between looks at FAILED_DIR
+BASE_DELAY = 15         # First backoff after a failed attempt
+MAX_DELAY = 15 * 60
+MAX_ATTEMPTS = 10       # Per job, then it expires
+EXPIRE_AFTER = 24 * 3600
+STATE_NAME = ".retry_state.json"
+EXPIRED_NAME = "expired"
+
+# printer_status() codes that mean "do not send now". Only hrDeviceStatus
+# down(5): hrPrinterStatus other(1) is also what sleeping printers report,
+# and they still take jobs.
+BLOCKING_STATUS = {6: "error (jam / door open / no paper)"}
+
+
+def backoff(failures, base=BASE_DELAY, cap=MAX_DELAY):
+    """Exponential backoff with jitter: somewhere in [d/2, d], d = base * 2^(failures-1)."""
+    delay = min(cap, base * 2 ** max(0, failures - 1))
+    return random.uniform(delay / 2, delay)
+
+
+class RetryScheduler:
+    """
+    `send(pdf_path)` returns True on success. On failure it is expected to
+    move the file back into `failed_dir` (autoprint.send_to_printer does).
+    `printer_ip()` returns the current target, read fresh on every round.
+    """
+
+    def __init__(self, failed_dir, send, printer_ip, outbox, log=None,
+                 max_attempts=MAX_ATTEMPTS, expire_after=EXPIRE_AFTER):
+        self.failed_dir = failed_dir
+        self.send = send
+        self.printer_ip = printer_ip
+        self.outbox = outbox            # Where a job is moved back to before resending
+        self.log = log or (lambda message, level="INFO": print(f"[{level}] {message}"))
+        self.max_attempts = max_attempts
+        self.expire_after = expire_after
+        self.state_file = os.path.join(failed_dir, STATE_NAME)
+        self.expired_dir = os.path.join(failed_dir, EXPIRED_NAME)
+        self.state = self._load()
+        self.lock = threading.RLock()   # state is read by the gauge / control threads
+        self.failures = 0               # Consecutive failed rounds (drives the backoff)
+        self.next_try = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    # --- STATE ---
+
+    def _load(self):
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        tmp = self.state_file + ".tmp"
+        try:
+            with self.lock, open(tmp, "w") as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(tmp, self.state_file)
+        except OSError:
+            pass
+
+    def _names(self):
+        try:
+            return [n for n in os.listdir(self.failed_dir) if n.lower().endswith(".pdf")]
+        except OSError:
+            return []
+
+    def count(self):
+        """Failed PDFs waiting. Read-only, safe from any thread."""
+        return len(self._names())
+
+    def pending(self):
+        """
+        Failed PDFs in their original order (first failure, then name).
+        Syncs the state with the folder, so only the scheduler calls it:
+        a job that is out being resent would be forgotten.
+        """
+        names = self._names()
+        now = time.time()
+        with self.lock:
+            for name in names:
+                if name not in self.state:
+                    try:
+                        first = os.path.getmtime(os.path.join(self.failed_dir, name))
+                    except OSError:
+                        first = now
+                    self.state[name] = {"attempts": 0, "first_failed": first}
+            # Forget jobs that were removed by hand
+            for name in set(self.state) - set(names):
+                del self.state[name]
+            return sorted(names, key=lambda n: (self.state[n]["first_failed"], n))
+
+    # --- GATE ---
+
+    def printer_ready(self, ip):
+        """Cheap pre-check: SNMP status when the printer speaks it, else a 9100 connect."""
+        values = snmp.SnmpClient(timeout=1.0, retries=1).get(ip, snmp.STATUS_OIDS)
+        if values:
+            code, msg = snmp.printer_status(values)
+            if code in BLOCKING_STATUS:
+                self.log(f"Retry held: printer {BLOCKING_STATUS[code]} ({msg})", "INFO")
+                return False
+            return True
+        import scan_engine      # Deferred: pulls in asyncio, which the daemon never needs otherwise
+        return scan_engine.tcp_ping(ip, (9100,), timeout=2.0) is not None
+
+    # --- ROUND ---
+
+    def _expire(self, name, reason):
+        os.makedirs(self.expired_dir, exist_ok=True)
+        try:
+            os.rename(os.path.join(self.failed_dir, name), os.path.join(self.expired_dir, name))
+        except OSError:
+            pass
+        with self.lock:
+            self.state.pop(name, None)
+        self.log(f"Gave up on {name}: {reason}. Moved to {self.expired_dir}", "ERROR")
+
+    def run_once(self, now=None):
+        """One resubmission round. Returns the number of jobs printed."""
+        now = now or time.time()
+        names = []
+        # Expiry does not wait for the printer: a dead printer is when the folder grows
+        for name in self.pending():
+            with self.lock:
+                job = dict(self.state[name])
+            if job["attempts"] >= self.max_attempts:
+                self._expire(name, f"{job['attempts']} attempts")
+            elif now - job["first_failed"] > self.expire_after:
+                self._expire(name, f"older than {self.expire_after // 3600}h")
+            else:
+                names.append(name)
+        if not names:
+            self.failures = 0
+            self._save()
+            return 0
+        if now < self.next_try:
+            return 0
+
+        printed = 0
+        ip = self.printer_ip()
+        if ip and self.printer_ready(ip):
+            for name in names:
+                job = self.state[name]
+                with self.lock:
+                    job["attempts"] += 1
+                self._save()
+                # Back to the outbox, send_to_printer returns it here if it fails again
+                path = os.path.join(self.outbox, name)
+                try:
+                    os.rename(os.path.join(self.failed_dir, name), path)
+                except OSError:
+                    continue
+                self.log(f"Resubmitting {name} (attempt {job['attempts']}/{self.max_attempts})", "INFO")
+                if not self.send(path):
+                    break       # Keep the order: nothing newer goes out before this one
+                with self.lock:
+                    self.state.pop(name, None)
+                printed += 1
+            else:
+                self.failures = 0
+                self._save()
+                return printed
+
+        self.failures += 1
+        delay = backoff(self.failures)
+        self.next_try = now + delay
+        self._save()
+        self.log(f"{self.count()} failed job(s) waiting, next retry in {delay:.0f}s", "INFO")
+        return printed
+
+    # --- THREAD ---
+
+    def _loop(self):
+        while not self.stop_event.wait(POLL_INTERVAL):
+            try:
+                self.run_once()
+            except Exception as e:
+                self.log(f"Retry scheduler error: {e}", "ERROR")
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, name="retry-scheduler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
@@ -1,21 +1,27 @@
 import socket
-import sys
 import os
 import re
-import json
-import ssl
 import subprocess
 import ipaddress
 import platform
-import webbrowser
 import base64
-import ctypes
-from concurrent.futures import ThreadPoolExecutor
+import argparse
+import threading
+import time
+
+import configstore
+import discovery
+import ipp
+import mdns
+import metrics
+import scan_engine
+import snmp
+from devicecache import DeviceCache
 
 # ==========================================
 # CONFIGURATION & CONSTANTS
 # ==========================================
-CONFIG_FILE = os.path.expanduser("~/.autoprint_config.json")
+CONFIG_FILE = configstore.CONFIG_FILE
 
 # Mapping ports to protocol names
 TARGET_PORTS = {
@@ -37,6 +43,7 @@ class Colors:
         # Enable VT100 Emulation on Windows 10/11
         if self.os_type == "Windows":
             try:
+                import ctypes
                 kernel32 = ctypes.windll.kernel32
                 kernel32.SetConsoleMode(kernel32.GetStdHandle(-11), 7)
             except:
@@ -62,6 +69,7 @@ def is_admin():
     """Checks if script has Admin/Root privileges (Required for installation)."""
     try:
         if platform.system() == "Windows":
+            import ctypes
             return ctypes.windll.shell32.IsUserAnAdmin()
         else:
             return os.geteuid() == 0
@@ -77,72 +85,29 @@ class PrinterScanner:
         self.os_type = platform.system()
         self.scan_counter = 0
         self.total_hosts = 0
-
-    def get_local_network(self):
-        """
-        Robustly finds local IP. 
-        Works online (via Google DNS) and offline (via Hostname).
-        """
-        local_ip = None
-        try:
-            # Method 1: Connect to external DNS (Preferred)
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-                s.connect(("8.8.8.8", 80))
-                local_ip = s.getsockname()[0]
-        except:
-            # Method 2: Offline Fallback
-            try:
-                local_ip = socket.gethostbyname(socket.gethostname())
-                if local_ip.startswith("127."): return None
-            except:
-                return None
-
-        if local_ip:
-            # Strictly assume /24 for scan speed (Class C subnet)
-            base = ".".join(local_ip.split(".")[:3]) + ".0/24"
-            return ipaddress.IPv4Network(base, strict=False)
-        return None
+        self.scan_started = 0
+        self.last_progress = 0
+        self.concurrency = scan_engine.MAX_IN_FLIGHT
+        self.show_progress = True
+        self.cache = None
+        self.diff = None
+        self.refresh_thread = None
+        self.background = None          # (found, net) of the background rescan, merged by finish_refresh()
+
+    def get_local_network(self, cidr=None):
+        """Explicit `cidr`, else the Wi-Fi interface's real prefix (see discovery)."""
+        return discovery.get_local_network(cidr)
 
     def is_host_up(self, ip):
-        # Termux/Linux Ping Command
-        # -c 1: Count 1
-        # -W 1: Timeout 1 second
-        cmd = ['ping', '-c', '1', '-W', '1', str(ip)]
-        try:
-            return subprocess.call(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
-        except:
-            return False
-
-    def check_port(self, ip, port):
-        """Standard TCP connect check."""
-        try:
-            with socket.create_connection((ip, port), timeout=0.4):
-                return True
-        except:
-            return False
+        """In-process liveness (TCP SYN/ACK or RST). No ping fork, works without root."""
+        return scan_engine.tcp_ping(ip) is not None
 
     # --- IDENTIFICATION PROTOCOLS ---
 
-    def get_snmp_name(self, ip):
-        """Sends raw SNMP v1 GetRequest for sysDescr (No external libs)."""
-        # OID: 1.3.6.1.2.1.1.1.0
-        packet = (
-            b'\x30\x29\x02\x01\x00\x04\x06\x70\x75\x62\x6c\x69\x63\xa0\x1c'
-            b'\x02\x04\x19\x90\x00\x00\x02\x01\x00\x02\x01\x00\x30\x0e\x30'
-            b'\x0c\x06\x08\x2b\x06\x01\x02\x01\x01\x01\x00\x05\x00'
-        )
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-                s.settimeout(0.8)
-                s.sendto(packet, (ip, 161))
-                response, _ = s.recvfrom(2048)
-                if b'\x2b\x06\x01\x02\x01\x01\x01\x00' in response:
-                    idx = response.find(b'\x2b\x06\x01\x02\x01\x01\x01\x00')
-                    # Skip OID(8) + Type(1) + Len(1) = 10 bytes
-                    return response[idx+10:].decode(errors='ignore').strip()
-        except:
-            pass
-        return None
+    def get_snmp_name(self, ip, timeout=0.8):
+        """SNMP GetRequest for sysDescr (No external libs)."""
+        values = snmp.SnmpClient(timeout=timeout).get(ip, {"sysDescr": snmp.PRINTER_OIDS["sysDescr"]})
+        return (values or {}).get("sysDescr") or None
 
     def get_ipp_name(self, ip):
         """Sends binary IPP POST request to get printer-make-and-model."""
@@ -162,13 +127,13 @@ class PrinterScanner:
     def get_web_title(self, ip, port):
         """Scrapes <title> tag from Web Interface."""
         try:
-            ctx = ssl.create_default_context()
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE # Ignore self-signed certs
-            
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
                 s.settimeout(1.5)
                 if port == 443:
+                    import ssl      # Deferred: only HTTPS admin pages need it
+                    ctx = ssl.create_default_context()
+                    ctx.check_hostname = False
+                    ctx.verify_mode = ssl.CERT_NONE # Ignore self-signed certs
                     with ctx.wrap_socket(s, server_hostname=ip) as ss:
                         ss.connect((ip, port))
                         ss.sendall(f"GET / HTTP/1.1\r\nHost: {ip}\r\n\r\n".encode())
@@ -220,100 +185,246 @@ class PrinterScanner:
             pass
         return f"{mac}{vendor}"
 
-    def scan_host(self, ip):
-        """Worker function: Ping -> Scan Ports -> Identify."""
-        self.scan_counter += 1
-        # This prints "Scanning: 10/254 (192.168.1.10)" on the same line
-        print(f"Scanning: {self.scan_counter}/{self.total_hosts} ({ip})     ", end='\r')        
-        # 1. Ping Check (Optimization)
-        if not self.is_host_up(ip):
-            return None
-
-        # 2. Port Scan
-        open_ports = []
-        for p in TARGET_PORTS:
-            if self.check_port(str(ip), p):
-                open_ports.append(p)
-        
-        if open_ports:
-            # 3. Identify
-            ip_str = str(ip)
-            name = self.get_snmp_name(ip_str)
-            if not name and 631 in open_ports: name = self.get_ipp_name(ip_str)
-            if not name and 9100 in open_ports: name = self.get_pjl_id(ip_str)
-            if not name and 80 in open_ports: name = self.get_web_title(ip_str, 80)
-            if not name and 443 in open_ports: name = self.get_web_title(ip_str, 443)
-            
-            name = name or "Unknown Printer"
-            mac = self.get_mac_vendor(ip_str)
-            
-            # The \n ensures it prints on a fresh line, not on top of the progress bar
+    def identify(self, ip_str, open_ports, rtt=None, snmp_values=None):
+        """Identify a host with open printer ports -> device dict."""
+        if snmp_values is not None:
+            # Already answered the liveness probe, no second round trip
+            name = snmp_values.get("sysDescr")
+        else:
+            # Reuse the liveness RTT: fast hosts do not need the full SNMP wait
+            snmp_timeout = min(0.8, max(0.2, 8 * rtt)) if rtt else 0.8
+            name = self.get_snmp_name(ip_str, snmp_timeout)
+        if not name and 631 in open_ports: name = self.get_ipp_name(ip_str)
+        if not name and 9100 in open_ports: name = self.get_pjl_id(ip_str)
+        if not name and 80 in open_ports: name = self.get_web_title(ip_str, 80)
+        if not name and 443 in open_ports: name = self.get_web_title(ip_str, 443)
+
+        name = name or "Unknown Printer"
+        mac = self.get_mac_vendor(ip_str)
+
+        # The \n ensures it prints on a fresh line, not on top of the progress bar
+        if self.show_progress:
             print(f"\n{GREEN}[FOUND]{NC} {ip_str.ljust(15)} | {CYAN}{name[:35].ljust(35)}{NC} | Ports: {len(open_ports)}")
-            return {"ip": ip_str, "name": name, "ports": open_ports, "mac": mac}
-        return None
+        protocols = [TARGET_PORTS[p] for p in open_ports]
+        if snmp_values:
+            protocols.append("SNMP")
+        dev = {"ip": ip_str, "name": name, "ports": open_ports, "mac": mac, "protocols": protocols}
+        if rtt is not None:
+            dev["rtt_ms"] = round(rtt * 1000, 1)
+        if snmp_values:
+            dev["serial"] = snmp_values.get("serial")
+            dev["supply_level"] = snmp_values.get("supplyLevel")
+        return dev
+
+    def from_cache(self, entry, open_ports, rtt=None):
+        """Known, fresh printer still answering: reuse the cached identity, skip identification."""
+        dev = dict(entry, ports=open_ports)
+        dev.setdefault("mac", "")
+        if rtt is not None:
+            dev["rtt_ms"] = round(rtt * 1000, 1)
+        if self.show_progress:
+            print(f"\n{GREEN}[FOUND]{NC} {dev['ip'].ljust(15)} | {CYAN}{dev['name'][:35].ljust(35)}{NC} | Ports: {len(open_ports)} (cached)")
+        return dev
+
+    def merge_device(self, dev):
+        """Adds `dev` to found_devices, or folds it into the entry with the same IP."""
+        for old in self.found_devices:
+            if old["ip"] != dev["ip"]:
+                continue
+            for key in ("ports", "protocols"):
+                old[key] = old.get(key, []) + [v for v in dev.get(key, []) if v not in old.get(key, [])]
+            for key, value in dev.items():
+                if value and (not old.get(key) or old.get(key) == "Unknown Printer"):
+                    old[key] = value
+            return old
+        self.found_devices.append(dev)
+        return dev
+
+    def browse_mdns(self, net=None, timeout=mdns.BROWSE_TIMEOUT):
+        """Passive discovery: one DNS-SD query, no probes. Returns the devices found."""
+        print(f"{CYAN}Listening for mDNS printer announcements ({timeout:.0f}s)...{NC}")
+        found = []
+        for dev in mdns.browse(timeout, interface=discovery.get_local_ip()):
+            if net is not None and ipaddress.IPv4Address(dev["ip"]) not in net:
+                continue
+            dev["mac"] = self.get_mac_vendor(dev["ip"])
+            print(f"{GREEN}[FOUND]{NC} {dev['ip'].ljust(15)} | {CYAN}{dev['name'][:35].ljust(35)}{NC} | "
+                  f"{', '.join(dev['protocols'])} (mDNS)")
+            found.append(self.merge_device(dev))
+        return found
+
+    def progress(self, ip):
+        self.scan_counter += 1
+        if not self.show_progress:
+            return
+        now = time.monotonic()
+        # Redrawing per host is the bottleneck at /16 scale, cap it at 10/s
+        if now - self.last_progress < 0.1 and self.scan_counter < self.total_hosts:
+            return
+        self.last_progress = now
+        elapsed = max(now - self.scan_started, 1e-6)
+        rate = self.scan_counter / elapsed
+        eta = (self.total_hosts - self.scan_counter) / rate if rate else 0
+        pct = 100 * self.scan_counter / max(self.total_hosts, 1)
+        # This prints "Scanning: 10/254 (4%) | 120 hosts/s | ETA 2s (192.168.1.10)" on the same line
+        print(f"Scanning: {self.scan_counter}/{self.total_hosts} ({pct:.0f}%) | "
+              f"{rate:.0f} hosts/s | ETA {eta:.0f}s ({ip})     ", end='\r')
+
+    def scan(self, hosts, use_async=True, known=None, merge=True):
+        """
+        Streams `hosts` through the shared discovery sweep (async engine,
+        thread fallback) and identifies printers as they answer.
+        `known` ({ip: cache entry}) lets fresh cached printers skip identification.
+        Returns the devices found; merge=False leaves found_devices alone.
+        """
+        known = known or {}
+        found = []
+        from concurrent.futures import ThreadPoolExecutor
+        # Identification is blocking (SNMP/IPP/PJL), run it next to the sweep
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            jobs = []
+            for host in discovery.sweep(hosts, TARGET_PORTS, use_async, self.concurrency):
+                self.progress(host["ip"])
+                if not host["ports"]:
+                    continue
+                entry = known.get(host["ip"])
+                if any(d["ip"] == host["ip"] and d.get("source") == "mdns" for d in self.found_devices):
+                    # Already identified by its own announcement, only the ports are news
+                    found.append({"ip": host["ip"], "ports": host["ports"],
+                                  "protocols": [TARGET_PORTS[p] for p in host["ports"]]})
+                elif entry and self.cache and self.cache.is_fresh(entry):
+                    found.append(self.from_cache(entry, host["ports"], host["rtt"]))
+                else:
+                    jobs.append(pool.submit(self.identify, host["ip"], host["ports"],
+                                            host["rtt"], host["snmp"]))
+            found.extend(job.result() for job in jobs)
+        if merge:
+            for dev in found:
+                self.merge_device(dev)
+            self.found_devices.sort(key=lambda d: ipaddress.IPv4Address(d["ip"]))
+        return found
 
-    # Add this inside class PrinterScanner
     def get_detailed_status(self, ip):
         """
-        Checks printer status via SNMP OID 1.3.6.1.2.1.25.3.2.1.5.1 (hrPrinterStatus).
+        Checks printer status via SNMP hrPrinterStatus + hrDeviceStatus (one PDU).
         Returns: (Code, Description_String)
         Codes: 3=Idle(Ready), 4=Printing, 5=Warmup, 6=Error(Jam/Open)
         """
-        # SNMP Packet for hrPrinterStatus (OID ending in .25.3.2.1.5.1)
-        packet = (
-            b'\x30\x29\x02\x01\x00\x04\x06\x70\x75\x62\x6c\x69\x63\xa0\x1c'
-            b'\x02\x04\x19\x95\x00\x00\x02\x01\x00\x02\x01\x00\x30\x0e\x30'
-            b'\x0c\x06\x08\x2b\x06\x01\x02\x01\x19\x03\x02\x01\x05\x01\x05\x00'
-        )
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-                s.settimeout(1.0)
-                s.sendto(packet, (ip, 161))
-                response, _ = s.recvfrom(1024)
-                
-                # Parse the last byte which contains the status integer
-                # SNMP Integer type is 0x02, followed by length 0x01, followed by Value
-                if b'\x02\x01' in response[-3:]:
-                    status_code = response[-1]
-                    
-                    if status_code == 3: return (3, "Idle (Ready)")
-                    if status_code == 4: return (4, "Printing / Processing")
-                    if status_code == 5: return (5, "Warming Up")
-                    if status_code == 1: return (1, "Offline / Other")
-                    if status_code == 2: return (2, "Unknown")
-                    if status_code > 5:  return (6, "⚠️ PRINTER ERROR (Jam/Door Open/No Paper)")
-                    
-        except:
-            return (0, "No Status (SNMP Unreachable)")
-        
-        return (0, "Unknown Status")
+        values = snmp.SnmpClient(timeout=1.0).get(ip, snmp.STATUS_OIDS)
+        return snmp.printer_status(values)
 
-    def run(self):
-        net = self.get_local_network()
+    def run(self, use_async=True, use_cache=True, background=False, cidr=None,
+            use_mdns=False, active=True):
+        """
+        Known printers from the device cache are probed first and returned at
+        once; the rest of the address space is scanned afterwards (in a
+        background thread with `background=True`) and the cache diff is
+        stored in self.diff. Nothing cached answering means there is nothing
+        to show early, so the scan then stays in the foreground.
+
+        `use_mdns` listens for DNS-SD announcements before any probing and
+        merges the active results into them; `active=False` stops there.
+        """
+        net = self.get_local_network(cidr)
         if not net:
             print(f"{RED}[ERROR] No Wifi.{NC}")
             return
+        if net.num_addresses > scan_engine.MAX_SCAN_ADDRESSES:
+            print(f"{RED}[ERROR] {net} is too large. Scan at most a /16.{NC}")
+            return
 
-        # 1. Convert to list to get Total Count
-        hosts = list(net.hosts())
-        self.total_hosts = len(hosts)
+        self.cache = DeviceCache() if use_cache else None
+        if use_mdns:
+            found = self.browse_mdns(net)
+            if not active:
+                if self.cache is not None:
+                    # Nothing was probed, so nothing can be declared gone
+                    self.diff = self.cache.merge(found, scope={d["ip"] for d in found})
+                    self.cache.save()
+                    print_diff(self.diff)
+                return
+
+        # 1. Hosts are generated lazily, only the count is computed up front
+        self.total_hosts = len(scan_engine.Hosts(net))
         self.scan_counter = 0
+        self.scan_started = time.monotonic()
+        if self.total_hosts > 4096 and self.concurrency == scan_engine.MAX_IN_FLIGHT:
+            # Large networks: widen the socket budget as far as the fd limit allows
+            self.concurrency = scan_engine.socket_budget(4 * scan_engine.MAX_IN_FLIGHT)
 
         print(f"\n{BOLD}Scanning Network: {YELLOW}{net}{NC}")
-        print(f"{CYAN}Total Hosts to Scan: {self.total_hosts}{NC}\n")
-        
-        # 2. ThreadPool with LOW workers for Termux stability
-        with ThreadPoolExecutor(max_workers=15) as executor:
-            results = executor.map(self.scan_host, hosts)
-            for r in results:
-                if r: self.found_devices.append(r)
-        
-        # Clean up the progress line
-        print(" " * 50, end='\r')
+        print(f"{CYAN}Total Hosts to Scan: {self.total_hosts} ({self.concurrency} sockets in flight){NC}\n")
+
+        # 2. Known printers first
+        known = self.cache.by_ip(net) if self.cache else {}
+        if known:
+            print(f"{CYAN}Checking {len(known)} known printer(s) first...{NC}")
+            self.scan(list(known), use_async, known)
+
+        # 3. Everything else
+        rest = scan_engine.Hosts(net, exclude=known)
+        if background and self.found_devices:
+            # The known printers are recorded now, the rest by finish_refresh()
+            self.save_cache(net, scope=set(known))
+            # Silent, and kept apart from the list the user is picking from
+            self.show_progress = False
+            self.refresh_thread = threading.Thread(target=self.scan_background, args=(rest, use_async, net),
+                                                   daemon=True)
+            self.refresh_thread.start()
+        else:
+            self.refresh(rest, use_async, net)
+
+    def refresh(self, hosts, use_async, net):
+        """Scans the remaining address space and updates the device cache."""
+        self.scan(hosts, use_async)
+        if self.show_progress:
+            # Clean up the progress line, then report throughput
+            elapsed = time.monotonic() - self.scan_started
+            print(" " * 80, end='\r')
+            print(f"{CYAN}Scanned {self.scan_counter} hosts in {elapsed:.1f}s "
+                  f"({self.scan_counter / max(elapsed, 1e-6):.0f} hosts/s){NC}")
+            for h in metrics.snapshot()["histograms"]:
+                if h["name"] == "autoprint_probe_rtt_seconds":
+                    print(f"{CYAN}Probe RTT ({h['labels']['engine']}): p50 {h['p50'] * 1000:.1f} ms, "
+                          f"p95 {h['p95'] * 1000:.1f} ms, p99 {h['p99'] * 1000:.1f} ms over {h['count']} hosts{NC}")
+        self.save_cache(net)
+
+    def scan_background(self, hosts, use_async, net):
+        self.background = (self.scan(hosts, use_async, merge=False), net)
+
+    def finish_refresh(self):
+        """Waits for the background rescan, then merges its devices and updates the cache."""
+        if self.refresh_thread is None:
+            return
+        self.refresh_thread.join()
+        self.refresh_thread = None
+        found, net = self.background
+        self.background = None
+        for dev in found:
+            self.merge_device(dev)
+        self.found_devices.sort(key=lambda d: ipaddress.IPv4Address(d["ip"]))
+        self.save_cache(net)
+
+    def save_cache(self, net, scope=None):
+        """Records found_devices; cached devices in `scope` (default: all of `net`) that did not answer are gone."""
+        if self.cache is not None:
+            self.diff = self.cache.merge(self.found_devices, scope=net if scope is None else scope)
+            self.cache.save()
+            print_diff(self.diff)
 
 # ==========================================
 # ACTION FUNCTIONS
-def print_universal_test_page(scanner_instance, ip):
+def print_diff(diff):
+    """Summary of what changed since the last scan."""
+    for dev in diff["added"]:
+        print(f"{GREEN}[+] NEW{NC}     {dev['ip'].ljust(15)} | {dev.get('name', '')}")
+    for old, new in diff["changed"]:
+        what = ", ".join(k for k in ("ip", "mac", "name", "ports") if old.get(k) != new.get(k))
+        print(f"{YELLOW}[~] CHANGED{NC} {new['ip'].ljust(15)} | {new.get('name', '')} ({what})")
+    for dev in diff["removed"]:
+        print(f"{RED}[-] GONE{NC}    {dev['ip'].ljust(15)} | {dev.get('name', '')}")
+
+def print_universal_test_page(scanner_instance, ip, ports=(9100,), resource=None):
     print(f"\n{BOLD}--- Starting PDF Print Job on {ip} ---{NC}")
 
     # STEP 1: Pre-Flight Check
@@ -350,7 +461,33 @@ def print_universal_test_page(scanner_instance, ip):
         print(f"{RED}[FAIL]{NC} PDF Generation error.")
         return
 
-    # STEP 3: Send via Port 9100 (Most M-series support PDF via 9100)
+    # STEP 3: IPP when the printer speaks it (real job id + completion), else Port 9100
+    if 631 in ports:
+        print(f"{YELLOW}[STEP 3]{NC} Sending PDF via IPP Print-Job...")
+        tmp = os.path.join(os.path.expanduser("~"), ".autoprint_testpage.pdf")
+        with open(tmp, "wb") as f:
+            f.write(pdf_data)
+
+        def on_state(info):
+            reasons = ", ".join(r for r in info["reasons"] if r != "none")
+            print(f"{CYAN}[JOB]{NC} {info['state_name']}" + (f" ({reasons})" if reasons else ""))
+
+        try:
+            result = ipp.print_file(ip, tmp, resource=resource, wait_timeout=120, on_state=on_state)
+        except (ipp.IppError, OSError) as e:
+            print(f"{RED}[FAIL]{NC} {e}")
+            return
+        finally:
+            os.remove(tmp)
+
+        # STEP 4: Verification (the printer tells us, no guessing)
+        if result["state"] == ipp.COMPLETED:
+            print(f"{GREEN}[SUCCESS]{NC} Job {result['job_id']} completed in {result['completion']:.1f}s "
+                  f"(upload {result['upload']:.2f}s).")
+        else:
+            print(f"{MAGENTA}[STATUS]{NC} Job {result['job_id']}: {result['state_name']} after {result['completion']:.1f}s")
+        return
+
     print(f"{YELLOW}[STEP 3]{NC} Sending PDF Binary to Port 9100...", end=' ')
     
     try:
@@ -361,12 +498,14 @@ def print_universal_test_page(scanner_instance, ip):
     except Exception as e:
         print(f"{RED}[FAIL]{NC} {e}")
 
-    # STEP 4: Verification
-    print(f"{YELLOW}[STEP 4]{NC} Waiting 5s for processing...")
-    import time
-    time.sleep(5)
-    
+    # STEP 4: Verification - raw 9100 has no job id, watch the printer state instead
+    print(f"{YELLOW}[STEP 4]{NC} Watching printer status (up to 10s)...")
+    deadline = time.monotonic() + 10
     new_code, new_msg = scanner_instance.get_detailed_status(ip)
+    while new_code not in (4, 6) and time.monotonic() < deadline:
+        time.sleep(0.5)
+        new_code, new_msg = scanner_instance.get_detailed_status(ip)
+    
     if new_code == 4:
         print(f"{GREEN}[SUCCESS]{NC} Printer accepted the PDF and is printing!")
     else:
@@ -423,66 +562,119 @@ def install_device_os(dev):
 # MAIN INTERFACE
 # ==========================================
 def main():
+    parser = argparse.ArgumentParser(description="Find and manage network printers.")
+    parser.add_argument("--threads", action="store_true",
+                        help="use the legacy thread-pool scanner instead of the async engine")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="ignore the device cache and scan everything from scratch")
+    parser.add_argument("--cidr", help="network to scan, e.g. 10.20.0.0/22 (default: the Wi-Fi interface's own prefix)")
+    parser.add_argument("--mdns", action="store_true",
+                        help="list printers announcing themselves over mDNS/DNS-SD first, then probe the rest")
+    parser.add_argument("--mdns-only", action="store_true",
+                        help="passive discovery only: one DNS-SD query, no probing")
+    parser.add_argument("--concurrency", type=int,
+                        help=f"sockets in flight (default: {scan_engine.MAX_IN_FLIGHT}, more for networks above /20)")
+    args = parser.parse_args()
+
     scanner = PrinterScanner()
-    scanner.run()
+    if args.concurrency:
+        scanner.concurrency = scan_engine.socket_budget(args.concurrency)
+    try:
+        scanner.run(use_async=not args.threads, use_cache=not args.no_cache,
+                    background=True, cidr=args.cidr,
+                    use_mdns=args.mdns or args.mdns_only, active=not args.mdns_only)
+    except ValueError as e:
+        print(f"{RED}[ERROR] Invalid --cidr: {e}{NC}")
+        return
 
     if not scanner.found_devices:
         print(f"\n{YELLOW}No printers found on this network.{NC}")
         return
 
-    print(f"\n{BOLD}--- Available Devices ---{NC}")
-    for i, dev in enumerate(scanner.found_devices, 1):
-        print(f"{YELLOW}{i}.{NC} {dev['name']}")
-        print(f"   IP: {CYAN}{dev['ip']}{NC} | MAC: {dev['mac']}")
-        print(f"   Open Ports: {dev['ports']}")
+    shown = []
+
+    def show_devices():
+        # The numbers refer to this list, whatever the background scan finds meanwhile
+        shown[:] = scanner.found_devices
+        print(f"\n{BOLD}--- Available Devices ---{NC}")
+        for i, dev in enumerate(shown, 1):
+            print(f"{YELLOW}{i}.{NC} {dev['name']}")
+            print(f"   IP: {CYAN}{dev['ip']}{NC} | MAC: {dev['mac']}")
+            print(f"   Open Ports: {dev['ports']}")
+            if dev.get("pdl"):
+                print(f"   Formats: {', '.join(dev['pdl'])}")
+        if scanner.refresh_thread and scanner.refresh_thread.is_alive():
+            print(f"{CYAN}[INFO]{NC} Known printers shown. Full rescan running in background ('r' to wait for it).")
+
+    show_devices()
 
     # Selection Loop
+    target = None
     while True:
         try:
             sel = input(f"\n{BOLD}Select Device # (or 'q' to quit): {NC}").strip()
-            if sel.lower() == 'q': return
+            if sel.lower() == 'q': break
+            if sel.lower() == 'r' and scanner.refresh_thread:
+                scanner.finish_refresh()
+                show_devices()
+                continue
             idx = int(sel) - 1
-            if 0 <= idx < len(scanner.found_devices):
-                target = scanner.found_devices[idx]
+            if 0 <= idx < len(shown):
+                target = shown[idx]
                 break
         except ValueError:
             pass
         print("Invalid selection.")
 
     # Action Loop
-    while True:
+    while target:
         print(f"\n{BOLD}Target: {target['name']}{NC}")
-        print("1. Print Test Page (Port 9100)")
+        print("1. Print Test Page (IPP / Port 9100)")
         print("2. Open Web Admin (Browser)")
         print("3. Install to OS (Requires Admin)")
         print("4. Save Config JSON")
-        print("5. Exit")
+        print("5. Add to Printer Pool")
+        print("6. Exit")
         
         choice = input("Choose Action: ").strip()
         
         if choice == "1":
-            if 9100 in target['ports']:
-                print_universal_test_page(scanner, target['ip'])
+            if 631 in target['ports'] or 9100 in target['ports']:
+                print_universal_test_page(scanner, target['ip'], target['ports'], target.get('rp'))
             else:
-                print(f"{RED}Port 9100 is closed. Cannot send raw test page.{NC}")
+                print(f"{RED}Ports 631 and 9100 are closed. Cannot send a test page.{NC}")
         
         elif choice == "2":
             proto = "https" if 443 in target['ports'] else "http"
             url = f"{proto}://{target['ip']}"
             print(f"{BLUE}[BROWSER]{NC} Opening {url}...")
+            import webbrowser
             webbrowser.open(url)
             
         elif choice == "3":
             install_device_os(target)
             
         elif choice == "4":
-            with open(CONFIG_FILE, "w") as f:
-                json.dump(target, f, indent=4)
-            print(f"{BLUE}[SAVED]{NC} Configuration saved to {CONFIG_FILE}")
+            # Merged into the existing config: AutoPrint's own settings stay
+            configstore.update(printer_ip=target["ip"], printer=target)
+            print(f"{BLUE}[SAVED]{NC} Printer {target['ip']} saved to {CONFIG_FILE}")
             
         elif choice == "5":
+            # AutoPrint spreads jobs over every pool printer
+            pool = list(configstore.get("printers") or [ip for ip in [configstore.get("printer_ip")] if ip])
+            if target["ip"] not in pool:
+                pool.append(target["ip"])
+            configstore.update(printers=pool, printer_ip=configstore.get("printer_ip") or target["ip"])
+            print(f"{BLUE}[SAVED]{NC} Printer pool: {', '.join(pool)}")
+
+        elif choice == "6":
             break
 
+    # The rescan's results only reach the device cache once it is merged
+    if scanner.refresh_thread:
+        print(f"{CYAN}[INFO]{NC} Finishing the background rescan to update the device cache...")
+        scanner.finish_refresh()
+
 if __name__ == "__main__":
     try:
         main()
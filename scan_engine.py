@@ -0,0 +1,319 @@
+import asyncio
+import errno
+import ipaddress
+import selectors
+import socket
+import time
+
+import snmp
+
+# ==========================================
+# ASYNC SCAN ENGINE
+# ==========================================
+# Every (host, port) pair is a non-blocking connect on one event loop,
+# so a quiet /24 costs roughly one connect timeout instead of
+# hosts x ports x timeout.
+
+DEFAULT_PORTS = (9100, 631, 515, 80, 443)
+
+MAX_IN_FLIGHT = 256     # Default global socket budget
+MAX_SCAN_ADDRESSES = 65536  # Largest network we sweep (/16)
+CONNECT_TIMEOUT = 0.6   # Per connect attempt
+HOST_DEADLINE = 1.5     # Hard cap for all ports of one host
+
+OPEN = "open"           # SYN/ACK - service listening
+CLOSED = "closed"       # RST - host is up, port closed
+
+# Liveness: a host counts as up on the first answer of any kind -
+# SYN/ACK, RST or a UDP reply. No ping subprocess, no root.
+LIVENESS_PORTS = (9100, 631, 80)
+LIVENESS_TIMEOUT = 0.8
+UDP_PROBE_PORTS = (161, 631)
+MIN_SETTLE = 0.2        # Once up, remaining ports get max(4 x RTT, this)
+
+
+class Hosts:
+    """
+    Lazy, re-iterable host range: `network` minus `exclude`. Addresses are
+    generated on the fly, so a /16 costs the same memory as a /24.
+    """
+
+    def __init__(self, network, exclude=()):
+        self.network = network
+        self.exclude = set(exclude)
+
+    def __iter__(self):
+        for ip in self.network.hosts():
+            if str(ip) not in self.exclude:
+                yield ip
+
+    def __len__(self):
+        total = self.network.num_addresses
+        if self.network.prefixlen < 31:
+            total -= 2      # network + broadcast
+        return total - sum(1 for ip in self.exclude if ipaddress.ip_address(ip) in self.network)
+
+
+def socket_budget(requested=MAX_IN_FLIGHT):
+    """Clamps the in-flight socket count to half the process fd limit."""
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY:
+            return max(16, min(requested, soft // 2))
+    except (ImportError, ValueError, OSError):
+        pass
+    return requested
+
+
+async def probe_port(ip, port, timeout=CONNECT_TIMEOUT):
+    """
+    Non-blocking TCP connect. Returns OPEN, CLOSED or None (no answer).
+    With timeout=None the caller enforces the deadline by cancelling,
+    which saves a wait_for task per connect on big sweeps.
+    """
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        if timeout is None:
+            await loop.sock_connect(sock, (ip, port))
+        else:
+            await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout)
+        return OPEN
+    except ConnectionRefusedError:
+        return CLOSED
+    except (asyncio.TimeoutError, OSError):
+        return None
+    finally:
+        sock.close()
+
+
+class UdpProber(asyncio.DatagramProtocol):
+    """
+    One UDP socket shared by every host. The probe is a single SNMP
+    GetRequest for all of snmp.PRINTER_OIDS, so the liveness answer already
+    carries the identification data. SNMP replies are matched by
+    request-id, anything else (e.g. on 631) by source IP.
+    """
+
+    def __init__(self, client=None):
+        self.transport = None
+        self.client = client or snmp.SnmpClient()
+        self.by_rid = {}
+        self.by_ip = {}
+
+    @classmethod
+    async def open(cls):
+        loop = asyncio.get_running_loop()
+        _, proto = await loop.create_datagram_endpoint(cls, local_addr=("0.0.0.0", 0))
+        return proto
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            rid, _, _, varbinds = snmp.decode_response(data)
+            waiter = self.by_rid.get(rid)
+            values = snmp.name_values(varbinds, snmp.PRINTER_OIDS)
+        except (snmp.BerError, ValueError):
+            waiter = self.by_ip.get(addr[0])
+            values = {}
+        if waiter and not waiter.done() and self.by_ip.get(addr[0]) is waiter:
+            waiter.set_result(values)
+
+    def error_received(self, exc):
+        pass
+
+    def probe(self, ip, ports=UDP_PROBE_PORTS):
+        """Sends the probe to every UDP port; the future resolves with the SNMP values ({} if none)."""
+        waiter = asyncio.get_running_loop().create_future()
+        rid = self.client.request_id()
+        waiter.rid = rid
+        self.by_rid[rid] = waiter
+        self.by_ip[ip] = waiter
+        packet = snmp.encode_get(snmp.PRINTER_OIDS.values(), rid, self.client.community)
+        for port in ports:
+            try:
+                self.transport.sendto(packet, (ip, port))
+            except OSError:
+                pass
+        return waiter
+
+    def forget(self, ip):
+        waiter = self.by_ip.pop(ip, None)
+        if waiter is not None:
+            self.by_rid.pop(waiter.rid, None)
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+
+
+async def probe_host(ip, ports, budget, udp=None, timeout=None,
+                     deadline=HOST_DEADLINE, liveness_timeout=LIVENESS_TIMEOUT,
+                     full=True):
+    """
+    Probes one host: TCP connects to `ports` plus an optional shared UDP probe.
+
+    The first answer of any kind marks the host up and fixes its RTT. With
+    `full=True` the remaining ports then get max(4 x RTT, MIN_SETTLE) to
+    answer; otherwise probing stops at the first answer (pure liveness).
+    `timeout` optionally caps each connect; by default the two windows do.
+    Returns {"ip", "alive", "rtt", "ports", "snmp"}.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def guarded(port):
+        async with budget:
+            return await probe_port(ip, port, timeout)
+
+    tasks = {asyncio.ensure_future(guarded(port)): port for port in ports}
+    states = {}
+    rtt = None
+    waiting = set(tasks)
+    udp_reply = None
+    if udp is not None:
+        udp_reply = udp.probe(ip)
+        waiting.add(udp_reply)
+    try:
+        # Stage 1: liveness - wait for the first answer
+        while waiting and rtt is None:
+            left = start + liveness_timeout - loop.time()
+            if left <= 0:
+                break
+            done, waiting = await asyncio.wait(waiting, timeout=left,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task in tasks:
+                    states[tasks[task]] = task.result()
+                    answered = task.result() is not None
+                else:
+                    answered = True
+                if answered and rtt is None:
+                    rtt = loop.time() - start
+
+        # Stage 2: let the rest of the ports settle within an RTT-scaled window
+        pending = [t for t in waiting if t in tasks or (full and t is udp_reply)]
+        if rtt is not None and full and pending:
+            settle = min(start + deadline, loop.time() + max(4 * rtt, MIN_SETTLE)) - loop.time()
+            done, _ = await asyncio.wait(pending, timeout=max(0, settle))
+            for task in done:
+                if task in tasks:
+                    states[tasks[task]] = task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        if udp is not None:
+            udp.forget(ip)
+
+    return {
+        "ip": ip,
+        "alive": rtt is not None,
+        "rtt": rtt,
+        "ports": [p for p in ports if states.get(p) == OPEN],
+        "snmp": udp_reply.result() if udp_reply is not None and udp_reply.done() else None,
+    }
+
+
+async def _stream(hosts, worker, window):
+    """Runs `worker(ip)` over a bounded window of hosts, yielding results as they finish."""
+    hosts = iter(hosts)
+    running = set()
+    try:
+        while True:
+            while len(running) < window:
+                ip = next(hosts, None)
+                if ip is None:
+                    break
+                running.add(asyncio.ensure_future(worker(str(ip))))
+            if not running:
+                return
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # Early exit (break / aclose) must not leave sockets behind
+        for task in running:
+            task.cancel()
+
+
+async def sweep(hosts, ports=DEFAULT_PORTS, concurrency=MAX_IN_FLIGHT,
+                timeout=None, host_deadline=HOST_DEADLINE, use_udp=True):
+    """
+    Async generator: yields a probe_host() result for every host as soon as
+    it finishes. `hosts` is consumed lazily and only a bounded window of
+    hosts is in flight, so memory does not grow with the network size.
+    `use_udp=False` skips the SNMP probe (port-only scans).
+    """
+    ports = list(ports)
+    budget = asyncio.Semaphore(concurrency)
+    # Keep roughly twice the budget queued so sockets never sit idle
+    window = max(1, (2 * concurrency) // len(ports))
+    udp = await UdpProber.open() if use_udp else None
+    try:
+        async def one(ip):
+            return await probe_host(ip, ports, budget, udp, timeout, host_deadline)
+
+        async for result in _stream(hosts, one, window):
+            yield result
+    finally:
+        if udp is not None:
+            udp.close()
+
+
+async def liveness(hosts, ports=LIVENESS_PORTS, concurrency=MAX_IN_FLIGHT,
+                   timeout=LIVENESS_TIMEOUT):
+    """Async generator: yields (ip, rtt) per host, rtt is None when the host is down."""
+    ports = list(ports)
+    budget = asyncio.Semaphore(concurrency)
+    window = max(1, concurrency // len(ports))
+    udp = await UdpProber.open()
+    try:
+        async def one(ip):
+            return await probe_host(ip, ports, budget, udp, deadline=timeout,
+                                    liveness_timeout=timeout, full=False)
+
+        async for result in _stream(hosts, one, window):
+            yield result["ip"], result["rtt"]
+    finally:
+        udp.close()
+
+
+def tcp_ping(ip, ports=LIVENESS_PORTS, timeout=LIVENESS_TIMEOUT):
+    """
+    Blocking liveness check for the thread path: non-blocking connects to
+    `ports` multiplexed with a selector. SYN/ACK or RST both mean "up".
+    Returns the RTT in seconds or None.
+    """
+    sel = selectors.DefaultSelector()
+    socks = []
+    start = time.monotonic()
+    try:
+        for port in ports:
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.setblocking(False)
+            socks.append(s)
+            err = s.connect_ex((str(ip), port))
+            if err in (0, errno.ECONNREFUSED):
+                return time.monotonic() - start
+            if err in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+                sel.register(s, selectors.EVENT_WRITE)
+        while sel.get_map():
+            left = start + timeout - time.monotonic()
+            if left <= 0:
+                break
+            for key, _ in sel.select(left):
+                err = key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err in (0, errno.ECONNREFUSED):
+                    return time.monotonic() - start
+                sel.unregister(key.fileobj)
+    except OSError:
+        pass
+    finally:
+        sel.close()
+        for s in socks:
+            s.close()
+    return None
@@ -1,7 +1,7 @@
 import socket
-import json
-import os
-from concurrent.futures import ThreadPoolExecutor
+
+import discovery
+
 # ANSI color codes
 RED     = '\033[91m'
 GREEN   = '\033[92m'
@@ -14,51 +14,31 @@ BOLD    = '\033[1m'
 UNDERLINE = '\033[4m'
 NC      = '\033[0m'  # No Color / Reset
 
-CONFIG_FILE = os.path.expanduser("~/.autoprint_config.json")
 ALERT_MESSAGE = ">>> AutoPrint configuration attempt <<<\n"
 
 def get_local_ip():
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        local_ip = s.getsockname()[0]
-        s.close()
-        return local_ip
-    except Exception as e:
-        print(f"{RED}[ERROR] Could not detect local IP: {e}{NC}")
-        return None
-
-def is_printer(ip, port=9100, timeout=1):
-    try:
-        with socket.create_connection((ip, port), timeout=timeout) as sock:
-            return ip
-    except:
-        return None
-
-def scan_printers(base_ip):
+    local_ip = discovery.get_local_ip()
+    if not local_ip:
+        print(f"{RED}[ERROR] Could not detect local IP.{NC}")
+    return local_ip
+
+def report_diff(diff):
+    for dev in diff["added"]:
+        print(f"{GREEN}[NEW]{NC} {YELLOW}{dev['ip']}{NC} was not seen before")
+    for dev in diff["removed"]:
+        print(f"{RED}[GONE]{NC} {YELLOW}{dev['ip']}{NC} no longer answers")
+
+def scan_printers(base_ip, stop=None):
     print(f"\n{CYAN}[Scanning subnet {YELLOW}{base_ip}.0/24{CYAN} for printers on port {YELLOW}9100{CYAN}...]{NC}")
-    ips = [f"{base_ip}.{i}" for i in range(1, 255)]
     found = []
-
-    with ThreadPoolExecutor(max_workers=100) as executor:
-        results = executor.map(is_printer, ips)
-        for ip in results:
-            if ip:
-                print(f"{GREEN}[FOUND]{NC} Printer detected on: {YELLOW}{ip}{NC}")
-                found.append(ip)
+    # Known printers are probed first; `stop` can end the scan early
+    for dev in discovery.discover(f"{base_ip}.0/24", stop=stop, snmp=False, record=True, on_diff=report_diff):
+        print(f"{GREEN}[FOUND]{NC} Printer detected on: {YELLOW}{dev['ip']}{NC}")
+        found.append(dev["ip"])
     return found
 
 def save_printer_ip(ip):
-    config = {}
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r") as f:
-            try:
-                config = json.load(f)
-            except json.JSONDecodeError:
-                pass
-    config["printer_ip"] = ip
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(config, f, indent=4)
+    discovery.save_printer_ip(ip)
     print(f"{BLUE}[SAVED]{NC} Printer IP saved to config: {CYAN}{ip}{NC}")
 
 def choose_printer(printers):
@@ -102,6 +82,16 @@ def main():
         return
 
     base_ip = ".".join(local_ip.split(".")[:3])
+
+    # Fast path: the saved printer is probed first and ends the scan when it answers
+    saved = discovery.get_saved_printer_ip()
+    if saved and saved.startswith(base_ip + "."):
+        # Other cached printers may answer before it: the stopped scan is only a partial list
+        if saved in scan_printers(base_ip, stop=discovery.match(ip=saved)):
+            keep = input(f"{GREEN}Printer still reachable at {CYAN}{saved}{GREEN}. Keep it? (Y/n): {NC}").strip()
+            if keep.lower() != 'n':
+                print(f"{BLUE}[SAVED]{NC} Keeping printer: {CYAN}{saved}{NC}")
+                return
     printers = scan_printers(base_ip)
 
     if not printers:
@@ -0,0 +1,285 @@
+import os
+import functools
+import select
+import socket
+import time
+
+# ==========================================
+# MINIMAL SNMP v1/v2c CLIENT (No external libs)
+# ==========================================
+# One UDP socket talks to a whole subnet: every host gets its own
+# request-id and replies are matched on it, so N hosts x M OIDs is one
+# round trip per host.
+
+SNMP_PORT = 161
+COMMUNITY = "public"
+VERSION_1 = 0
+VERSION_2C = 1
+
+# BER / SNMP tags
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OBJECT_ID = 0x06
+SEQUENCE = 0x30
+IP_ADDRESS = 0x40
+COUNTER32 = 0x41
+GAUGE32 = 0x42
+TIMETICKS = 0x43
+OPAQUE = 0x44
+COUNTER64 = 0x46
+NO_SUCH_OBJECT = 0x80
+NO_SUCH_INSTANCE = 0x81
+END_OF_MIB_VIEW = 0x82
+GET_REQUEST = 0xA0
+GET_RESPONSE = 0xA2
+
+NO_SUCH_NAME = 2        # v1 error-status
+
+# What we ask every printer for, in one PDU
+PRINTER_OIDS = {
+    "sysDescr":        "1.3.6.1.2.1.1.1.0",
+    "hrPrinterStatus": "1.3.6.1.2.1.25.3.5.1.1.1",
+    "hrDeviceStatus":  "1.3.6.1.2.1.25.3.2.1.5.1",
+    "supplyLevel":     "1.3.6.1.2.1.43.11.1.1.9.1.1",   # prtMarkerSuppliesLevel
+    "serial":          "1.3.6.1.2.1.43.5.1.1.17.1",     # prtGeneralSerialNumber
+}
+STATUS_OIDS = {k: PRINTER_OIDS[k] for k in ("hrPrinterStatus", "hrDeviceStatus")}
+
+
+class BerError(ValueError):
+    """Malformed or truncated BER data."""
+
+
+# --- ENCODER ---
+
+def encode_length(n):
+    if n < 0x80:
+        return bytes([n])
+    body = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    return bytes([0x80 | len(body)]) + body
+
+
+def encode_tlv(tag, payload):
+    return bytes([tag]) + encode_length(len(payload)) + payload
+
+
+def encode_int(value, tag=INTEGER):
+    length = max(1, (value.bit_length() + 8) // 8)   # +1 bit for the sign
+    return encode_tlv(tag, value.to_bytes(length, "big", signed=True))
+
+
+@functools.lru_cache(maxsize=256)
+def encode_oid(oid):
+    parts = [int(p) for p in oid.strip(".").split(".")]
+    if len(parts) < 2:
+        raise BerError(f"OID too short: {oid}")
+    body = bytearray([40 * parts[0] + parts[1]])
+    for part in parts[2:]:
+        chunk = [part & 0x7F]
+        part >>= 7
+        while part:
+            chunk.append(0x80 | (part & 0x7F))
+            part >>= 7
+        body.extend(reversed(chunk))
+    return encode_tlv(OBJECT_ID, bytes(body))
+
+
+def encode_get(oids, request_id, community=COMMUNITY, version=VERSION_2C):
+    """GetRequest for several OIDs in one PDU."""
+    varbinds = b"".join(encode_tlv(SEQUENCE, encode_oid(oid) + encode_tlv(NULL, b"")) for oid in oids)
+    pdu = encode_tlv(GET_REQUEST,
+                     encode_int(request_id) + encode_int(0) + encode_int(0) +
+                     encode_tlv(SEQUENCE, varbinds))
+    return encode_tlv(SEQUENCE, encode_int(version) +
+                      encode_tlv(OCTET_STRING, community.encode()) + pdu)
+
+
+# --- DECODER ---
+
+def decode_tlv(data, pos=0):
+    """Returns (tag, value_bytes, next_pos)."""
+    try:
+        tag = data[pos]
+        length = data[pos + 1]
+        pos += 2
+        if length & 0x80:
+            n = length & 0x7F
+            if n == 0 or n > 4:
+                raise BerError("Unsupported length form")
+            length = int.from_bytes(data[pos:pos + n], "big")
+            pos += n
+    except IndexError:
+        raise BerError("Truncated header")
+    end = pos + length
+    if end > len(data):
+        raise BerError("Truncated value")
+    return tag, data[pos:end], end
+
+
+def decode_sequence(data):
+    """Splits the body of a constructed value into (tag, value) pairs."""
+    items = []
+    pos = 0
+    while pos < len(data):
+        tag, value, pos = decode_tlv(data, pos)
+        items.append((tag, value))
+    return items
+
+
+def decode_oid(data):
+    if not data:
+        raise BerError("Empty OID")
+    parts = [str(min(data[0] // 40, 2)), str(data[0] - 40 * min(data[0] // 40, 2))]
+    value = 0
+    for byte in data[1:]:
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            parts.append(str(value))
+            value = 0
+    return ".".join(parts)
+
+
+def decode_value(tag, data):
+    """BER value -> Python value. Missing objects decode to None."""
+    if tag == INTEGER:
+        return int.from_bytes(data, "big", signed=True)
+    if tag in (COUNTER32, GAUGE32, TIMETICKS, COUNTER64):
+        return int.from_bytes(data, "big")
+    if tag == OCTET_STRING:
+        return data.decode(errors="ignore").strip("\x00 \r\n")
+    if tag == OBJECT_ID:
+        return decode_oid(data)
+    if tag == IP_ADDRESS:
+        return ".".join(str(b) for b in data)
+    if tag in (NULL, NO_SUCH_OBJECT, NO_SUCH_INSTANCE, END_OF_MIB_VIEW):
+        return None
+    return data
+
+
+def decode_response(data):
+    """
+    Parses a GetResponse message.
+    Returns (request_id, error_status, error_index, [(oid, value), ...]).
+    """
+    tag, body, _ = decode_tlv(data)
+    if tag != SEQUENCE:
+        raise BerError("Not an SNMP message")
+    items = decode_sequence(body)
+    if len(items) < 3 or items[2][0] != GET_RESPONSE:
+        raise BerError("Not a GetResponse")
+    fields = decode_sequence(items[2][1])
+    if len(fields) < 4:
+        raise BerError("Short PDU")
+    request_id = decode_value(*fields[0])
+    error_status = decode_value(*fields[1])
+    error_index = decode_value(*fields[2])
+    varbinds = []
+    for _, vb in decode_sequence(fields[3][1]):
+        (oid_tag, oid), (value_tag, value) = decode_sequence(vb)[:2]
+        varbinds.append((decode_oid(oid), decode_value(value_tag, value)))
+    return request_id, error_status, error_index, varbinds
+
+
+def name_values(varbinds, oids):
+    """Maps decoded varbinds back to the names used in `oids` ({name: oid})."""
+    by_oid = {oid: name for name, oid in oids.items()}
+    return {by_oid[oid]: value for oid, value in varbinds if oid in by_oid}
+
+
+# --- STATUS INTERPRETATION ---
+
+def printer_status(values):
+    """
+    hrPrinterStatus / hrDeviceStatus -> (Code, Description_String)
+    Codes: 3=Idle(Ready), 4=Printing, 5=Warmup, 6=Error(Jam/Open)
+    """
+    if not values:
+        return (0, "No Status (SNMP Unreachable)")
+    device = values.get("hrDeviceStatus")
+    status = values.get("hrPrinterStatus")
+    # hrDeviceStatus: 1=unknown 2=running 3=warning 4=testing 5=down
+    if device == 5:
+        return (6, "⚠️ PRINTER ERROR (Jam/Door Open/No Paper)")
+    if status == 3: return (3, "Idle (Ready)")
+    if status == 4: return (4, "Printing / Processing")
+    if status == 5: return (5, "Warming Up")
+    if status == 1: return (1, "Offline / Other")
+    if status == 2: return (2, "Unknown")
+    return (0, "Unknown Status")
+
+
+# --- CLIENT ---
+
+class SnmpClient:
+    """Batched GetRequests from a single UDP socket, replies matched by request-id."""
+
+    def __init__(self, community=COMMUNITY, timeout=1.0, retries=1, port=SNMP_PORT):
+        self.community = community
+        self.timeout = timeout
+        self.retries = retries
+        self.port = port
+        self._next_id = int.from_bytes(os.urandom(3), "big")
+
+    def request_id(self):
+        self._next_id = (self._next_id + 1) & 0x7FFFFFFF
+        return self._next_id
+
+    def get_many(self, hosts, oids=PRINTER_OIDS):
+        """
+        Sends one GetRequest per host (all `oids` in a single PDU).
+        Returns {ip: {name: value}} for every host that answered.
+
+        v2c is tried first (per-varbind noSuchObject). Hosts that stay silent
+        are retried as v1; a v1 noSuchName drops the offending OID and retries.
+        """
+        pending = {str(ip): dict(oids) for ip in hosts}
+        results = {}
+        versions = [VERSION_2C] * self.retries + [VERSION_1]
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.setblocking(False)
+            for version in versions:
+                if not pending:
+                    break
+                inflight = {}
+                for ip, wanted in pending.items():
+                    rid = self.request_id()
+                    inflight[rid] = ip
+                    try:
+                        s.sendto(encode_get(wanted.values(), rid, self.community, version), (ip, self.port))
+                    except OSError:
+                        pass
+                deadline = time.monotonic() + self.timeout
+                while inflight:
+                    left = deadline - time.monotonic()
+                    if left <= 0 or not select.select([s], [], [], left)[0]:
+                        break
+                    try:
+                        data, addr = s.recvfrom(65535)
+                        rid, err, idx, varbinds = decode_response(data)
+                    except (OSError, BerError, ValueError):
+                        continue
+                    ip = inflight.get(rid)
+                    if ip is None or addr[0] != ip:
+                        continue
+                    del inflight[rid]
+                    wanted = pending[ip]
+                    if err == NO_SUCH_NAME and 0 < idx <= len(wanted):
+                        # v1 fails the whole PDU for one missing OID: drop it, ask again
+                        del wanted[list(wanted)[idx - 1]]
+                        if wanted:
+                            rid = self.request_id()
+                            try:
+                                s.sendto(encode_get(wanted.values(), rid, self.community, version), (ip, self.port))
+                            except OSError:
+                                del pending[ip]     # Unreachable now: no answer for this host
+                                continue
+                            inflight[rid] = ip
+                            continue
+                    results[ip] = name_values(varbinds, wanted)
+                    del pending[ip]
+        return results
+
+    def get(self, ip, oids=PRINTER_OIDS):
+        """Single-host convenience wrapper. Returns {name: value} or None."""
+        return self.get_many([ip], oids).get(str(ip))
@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import queue
+import itertools
+import threading
+
+# ==========================================
+# DURABLE SPOOL QUEUE
+# ==========================================
+# Every detected photo becomes a small JSON job file on disk before any
+# work is done. Stage workers (convert -> send) pick jobs up from there,
+# so a burst of photos never blocks the file watcher and a crash or
+# restart resumes from whatever is still in the spool.
+
+SPOOL_DIR = os.path.expanduser("~/autoprint_spool")
+MAX_DEPTH = 64          # Jobs on disk before put() starts blocking
+
+CONVERT = "convert"
+SEND = "send"
+STAGES = (CONVERT, SEND)
+
+
+def describe(job):
+    srcs = job["srcs"]
+    return os.path.basename(srcs[0]) if len(srcs) == 1 else f"{len(srcs)} images"
+
+
+class Spool:
+    """
+    Bounded on-disk job queue with a worker pool per stage.
+
+    A job is one or more source images (a coalesced burst) that end up in
+    one PDF. `convert(job)` returns the PDF path (None = drop the job) and
+    `send(pdf_path, job)` delivers it. Jobs are processed at least once:
+    a job interrupted mid-send is sent again after a restart.
+    """
+
+    def __init__(self, convert, send, path=SPOOL_DIR, convert_workers=1, send_workers=1,
+                 max_depth=MAX_DEPTH, log=None):
+        self.stage_funcs = {CONVERT: convert, SEND: send}
+        self.path = path
+        self.workers = {CONVERT: max(1, int(convert_workers)), SEND: max(1, int(send_workers))}
+        self.max_depth = max(1, int(max_depth))
+        self.log = log or (lambda message, level="INFO", **fields: print(f"[{level}] {message}"))
+        self.queues = {stage: queue.Queue() for stage in STAGES}
+        self.jobs = {}                  # id -> job, everything still in the spool
+        self.stopping = threading.Event()
+        self.running = threading.Event()    # Cleared while paused
+        self.running.set()
+        self.active = {}                # worker name -> job it is working on
+        self.cond = threading.Condition()
+        self.threads = []
+        self.seq = itertools.count()
+        os.makedirs(self.path, exist_ok=True)
+
+    # --- JOB FILES ---
+
+    def _job_file(self, job_id):
+        return os.path.join(self.path, f"{job_id}.json")
+
+    def _write(self, job):
+        """Atomic write: a crash leaves either the old or the new state, never half a file."""
+        job["updated"] = time.time()
+        tmp = self._job_file(job["id"]) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp, self._job_file(job["id"]))
+
+    def _remove(self, job):
+        try:
+            os.remove(self._job_file(job["id"]))
+        except OSError:
+            pass
+        with self.cond:
+            self.jobs.pop(job["id"], None)
+            self.cond.notify_all()
+
+    def resume(self):
+        """Re-queues every job left in the spool by a previous run, oldest first."""
+        resumed = 0
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.path, name)) as f:
+                    job = json.load(f)
+                if "srcs" not in job:
+                    job["srcs"] = [job.pop("src")]
+                stage = job["stage"] if job.get("stage") in STAGES else CONVERT
+            except (OSError, ValueError, KeyError, TypeError):
+                self.log(f"Dropping unreadable spool file: {name}", "ERROR")
+                os.remove(os.path.join(self.path, name))
+                continue
+            with self.cond:
+                self.jobs[job["id"]] = job
+            self.queues[stage].put(job)
+            resumed += 1
+        if resumed:
+            self.log(f"Resumed {resumed} job(s) from spool", "INFO")
+        return resumed
+
+    # --- PRODUCER ---
+
+    def put(self, srcs, params=None, timeout=None):
+        """
+        Spools a new job for `srcs` (one path or a list) and returns its id.
+        Blocks while the spool holds max_depth jobs (backpressure); returns
+        None if `timeout` runs out.
+        """
+        if isinstance(srcs, str):
+            srcs = [srcs]
+        with self.cond:
+            if not self.cond.wait_for(lambda: len(self.jobs) < self.max_depth, timeout):
+                return None
+            job_id = f"{time.time_ns():020d}-{next(self.seq):04d}"
+            job = {"id": job_id, "srcs": list(srcs), "params": params or {}, "stage": CONVERT,
+                   "pdf": None, "created": time.time()}
+            self.jobs[job_id] = job
+        try:
+            self._write(job)
+        except OSError as e:
+            self.log(f"Spool write failed, processing in memory only: {e}", "ERROR")
+        self.queues[CONVERT].put(job)
+        self.log(f"Queued {describe(job)} | {self.describe_depth()}", "INFO", job=job_id, stage="spool")
+        return job_id
+
+    # --- DEPTH ---
+
+    def depth(self):
+        """{"convert": n, "send": n, "total": n} - waiting plus in progress per stage."""
+        with self.cond:
+            counts = {stage: 0 for stage in STAGES}
+            for job in self.jobs.values():
+                counts[job["stage"]] += 1
+            counts["total"] = len(self.jobs)
+        return counts
+
+    def describe_depth(self):
+        d = self.depth()
+        return f"queue: {d['total']} (convert {d[CONVERT]}, send {d[SEND]})"
+
+    # --- WORKERS ---
+
+    def start(self):
+        self.resume()
+        for stage in STAGES:
+            for i in range(self.workers[stage]):
+                t = threading.Thread(target=self._worker, args=(stage,), name=f"spool-{stage}-{i}", daemon=True)
+                t.start()
+                self.threads.append(t)
+        return self
+
+    def _worker(self, stage):
+        name = threading.current_thread().name
+        while True:
+            job = self.queues[stage].get()
+            # Paused: the job stays spooled and waits here (stop() unblocks it)
+            self.running.wait()
+            if job is None or self.stopping.is_set():
+                return
+            with self.cond:
+                self.active[name] = {"id": job["id"], "stage": stage, "job": describe(job), "started": time.time()}
+            try:
+                if stage == CONVERT:
+                    self._convert(job)
+                else:
+                    self._send(job)
+            except Exception as e:
+                self.log(f"{stage} failed for {describe(job)}: {e}", "ERROR", job=job["id"], stage=stage)
+                self._remove(job)
+            finally:
+                with self.cond:
+                    self.active.pop(name, None)
+
+    # --- CONTROL ---
+
+    def pause(self):
+        """Workers finish their current job, then wait. New jobs are still spooled."""
+        self.running.clear()
+
+    def unpause(self):
+        self.running.set()
+
+    @property
+    def paused(self):
+        return not self.running.is_set()
+
+    def current(self):
+        """Jobs being worked on right now: [{"id", "stage", "job", "started"}]."""
+        with self.cond:
+            return sorted(self.active.values(), key=lambda a: a["started"])
+
+    def _convert(self, job):
+        pdf = self.stage_funcs[CONVERT](job)
+        if not pdf:
+            self._remove(job)
+            return
+        with self.cond:
+            job["stage"] = SEND
+            job["pdf"] = pdf
+        try:
+            self._write(job)
+        except OSError:
+            pass
+        self.queues[SEND].put(job)
+
+    def _send(self, job):
+        self.stage_funcs[SEND](job["pdf"], job)
+        self._remove(job)
+        if not self.jobs:
+            self.log("Spool drained", "INFO")
+
+    def wait_idle(self, timeout=None):
+        """Blocks until every spooled job is finished. Returns False on timeout."""
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.jobs, timeout)
+
+    def stop(self):
+        """Stops the workers after their current job; unfinished jobs stay spooled."""
+        self.stopping.set()
+        self.running.set()
+        for stage in STAGES:
+            for _ in range(self.workers[stage]):
+                self.queues[stage].put(None)
+        for t in self.threads:
+            t.join()
+        self.threads = []
+
+
+class Coalescer:
+    """
+    Groups items that arrive within `window` seconds of each other and
+    hands each group to `flush(items)` from a timer thread. A group is
+    flushed early once it holds `max_items`. window=0 flushes every item
+    on its own.
+    """
+
+    def __init__(self, flush, window=0, max_items=30):
+        self.flush_func = flush
+        self.window = float(window)
+        self.max_items = max(1, int(max_items))
+        self.items = []
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def add(self, item):
+        with self.lock:
+            self.items.append(item)
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if self.window > 0 and len(self.items) < self.max_items:
+                # Quiet period restarts with every new item
+                self.timer = threading.Timer(self.window, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+                return
+        self.flush()
+
+    def flush(self):
+        """Hands over whatever is collected right now (also used on shutdown)."""
+        with self.lock:
+            items, self.items = self.items, []
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if items:
+            self.flush_func(items)
@@ -0,0 +1,192 @@
+import os
+import time
+import select
+import socket
+import threading
+
+# ==========================================
+# RAW (9100) PRINT TRANSPORT
+# ==========================================
+# One serialized channel per printer. Files are streamed from disk
+# (socket.sendfile, chunked writes as fallback) instead of being read
+# into memory, and the connection is kept open for back-to-back jobs.
+# Every job is framed with PJL UEL so the printer can tell jobs apart
+# on a shared connection.
+
+RAW_PORT = 9100
+CONNECT_TIMEOUT = 5
+IO_TIMEOUT = 30         # A stalled printer (paper out) gets this long per write
+IDLE_CLOSE = 5          # JetDirect serves one client at a time: do not hog it
+RETRIES = 2             # Reconnect attempts per job, only before any of it was written
+CHUNK = 64 * 1024
+
+UEL = b"\x1b%-12345X"   # PJL Universal Exit Language - job separator
+
+
+class PrinterChannel:
+    """Serialized connection to one printer. Use channel_for() to share it."""
+
+    def __init__(self, ip, port=RAW_PORT):
+        self.ip = ip
+        self.port = port
+        self.sock = None
+        self.lock = threading.Lock()
+        self.last_used = 0
+        self.jobs = 0
+        self.bytes_sent = 0
+        self.reconnects = 0
+        self.streaming = False      # File data of the current job has gone out
+
+    # --- CONNECTION ---
+
+    def _connect(self):
+        sock = socket.create_connection((self.ip, self.port), timeout=CONNECT_TIMEOUT)
+        sock.settimeout(IO_TIMEOUT)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Notice a printer that vanished mid-job well before IO_TIMEOUT
+        for opt, value in (("TCP_KEEPIDLE", 5), ("TCP_KEEPINTVL", 2), ("TCP_KEEPCNT", 3)):
+            if hasattr(socket, opt):
+                try:
+                    sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, opt), value)
+                except OSError:
+                    pass
+        self.sock = sock
+
+    def _usable(self):
+        """False if the printer closed our idle connection (EOF or error pending)."""
+        if self.sock is None:
+            return False
+        try:
+            while select.select([self.sock], [], [], 0)[0]:
+                # Printers may send PJL status back: drain it, EOF means closed
+                if not self.sock.recv(4096, socket.MSG_DONTWAIT):
+                    return False
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def close_if_idle(self, now=None):
+        if self.lock.acquire(blocking=False):
+            try:
+                if self.sock is not None and (now or time.monotonic()) - self.last_used > IDLE_CLOSE:
+                    self.close()
+            finally:
+                self.lock.release()
+
+    # --- STREAMING ---
+
+    def _stream(self, f, size, start):
+        """Writes one UEL-framed job. Returns time-to-first-byte."""
+        self.sock.sendall(UEL)
+        first = f.read(CHUNK)
+        self.streaming = True
+        self.sock.sendall(first)
+        ttfb = time.monotonic() - start
+        if len(first) < size:
+            try:
+                self.sock.sendfile(f, offset=len(first))
+            except (AttributeError, NotImplementedError):
+                # No zero-copy path: plain chunked writes, still constant memory
+                for chunk in iter(lambda: f.read(CHUNK), b""):
+                    self.sock.sendall(chunk)
+        self.sock.sendall(UEL)
+        return ttfb
+
+    def send_file(self, path):
+        """
+        Streams `path` to the printer, reconnecting up to RETRIES times
+        while none of the file was written (a dead kept-alive connection).
+        A failure after that raises at once: the printer may print what it
+        got, so resending is left to the retry queue.
+        Returns stats {"bytes", "seconds", "ttfb", "rate", "reconnects"};
+        raises OSError on failure.
+        """
+        size = os.path.getsize(path)
+        with self.lock:
+            start = time.monotonic()
+            reconnects = 0
+            for attempt in range(RETRIES + 1):
+                self.streaming = False
+                try:
+                    if not self._usable():
+                        if self.sock is not None or attempt:
+                            reconnects += 1
+                        self.close()
+                        self._connect()
+                    with open(path, "rb") as f:
+                        ttfb = self._stream(f, size, start)
+                    break
+                except OSError:
+                    self.close()
+                    if self.streaming or attempt == RETRIES:
+                        raise
+                    time.sleep(0.5 * (attempt + 1))
+            elapsed = time.monotonic() - start
+            self.last_used = time.monotonic()
+            self.jobs += 1
+            self.bytes_sent += size
+            self.reconnects += reconnects
+        _start_reaper()
+        return {"bytes": size, "seconds": elapsed, "ttfb": ttfb,
+                "rate": size / max(elapsed, 1e-6), "reconnects": reconnects}
+
+
+# --- CHANNEL REGISTRY ---
+
+_channels = {}
+_registry_lock = threading.Lock()
+_reaper = None
+
+
+def channel_for(ip, port=RAW_PORT):
+    with _registry_lock:
+        channel = _channels.get((ip, port))
+        if channel is None:
+            channel = _channels[(ip, port)] = PrinterChannel(ip, port)
+        return channel
+
+
+def _reap():
+    while True:
+        time.sleep(1)
+        with _registry_lock:
+            channels = list(_channels.values())
+        now = time.monotonic()
+        for channel in channels:
+            channel.close_if_idle(now)
+
+
+def _start_reaper():
+    """Background thread closing channels idle for more than IDLE_CLOSE."""
+    global _reaper
+    with _registry_lock:
+        if _reaper is None:
+            _reaper = threading.Thread(target=_reap, name="transport-reaper", daemon=True)
+            _reaper.start()
+
+
+def close_all():
+    with _registry_lock:
+        channels = list(_channels.values())
+    for channel in channels:
+        with channel.lock:
+            channel.close()
+
+
+def send_file(ip, path, port=RAW_PORT):
+    """Convenience wrapper: stream `path` over the shared channel for `ip`."""
+    return channel_for(ip, port).send_file(path)
+
+
+def format_stats(stats):
+    """"1.4 MB in 0.9s (1.6 MB/s, TTFB 12 ms)" for log lines."""
+    return (f"{stats['bytes'] / 1e6:.1f} MB in {stats['seconds']:.1f}s "
+            f"({stats['rate'] / 1e6:.1f} MB/s, TTFB {stats['ttfb'] * 1000:.0f} ms)")